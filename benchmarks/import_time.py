@@ -0,0 +1,124 @@
+'''
+Cold start benchmark of the function app.
+
+Every run starts a fresh interpreter with -X importtime and measures
+  - the cumulative import time of the module (create_tenant by default),
+  - the wall time from interpreter start until the HTTP handler has rejected
+    a request without parameters (the fastest possible cold request).
+
+Usage (from the repository root):
+    python benchmarks/import_time.py [--module create_tenant] [--runs 5] [--top 15] [--json]
+'''
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+COLD_REQUEST_CODE = '''
+import azure.functions as func
+import {module}
+req = func.HttpRequest(method='GET', url='/api/{module}', body=b'', params={{}})
+{module}.main(req)
+'''
+
+
+def parse_import_time(stderr):
+    '''
+    Map every imported module to its (self, cumulative) import time in microseconds
+    '''
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            modules[module] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_import(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    )
+    return parse_import_time(result.stderr)
+
+
+def measure_cold_request(module):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', COLD_REQUEST_CODE.format(module=module)],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start
+
+
+def summarize(values_ms):
+    return {
+        'median_ms': round(statistics.median(values_ms), 1),
+        'min_ms': round(min(values_ms), 1),
+        'max_ms': round(max(values_ms), 1)
+    }
+
+
+def run(module, runs, top):
+    import_ms = []
+    modules_by_run = []
+    for _ in range(runs):
+        modules = measure_import(module)
+        modules_by_run.append(modules)
+        import_ms.append(modules[module][1] / 1000)
+    cold_request_ms = [measure_cold_request(module) * 1000 for _ in range(runs)]
+
+    # the slowest top level dependencies by the median of their cumulative import time
+    cumulative = {}
+    for modules in modules_by_run:
+        for name, (_, cumulative_us) in modules.items():
+            cumulative.setdefault(name, []).append(cumulative_us / 1000)
+    slowest = sorted(
+        ((name, statistics.median(values)) for name, values in cumulative.items() if name != module),
+        key=lambda item: item[1],
+        reverse=True
+    )[:top]
+    return {
+        'module': module,
+        'runs': runs,
+        'python': sys.version.split()[0],
+        'import': summarize(import_ms),
+        'cold_request': summarize(cold_request_ms),
+        'slowest_imports_ms': {name: round(value, 1) for name, value in slowest}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='create_tenant')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = run(args.module, args.runs, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['module']} (python {report['python']}, {report['runs']} runs)")
+    for name in ('import', 'cold_request'):
+        stats = report[name]
+        print(
+            f"  {name:<14} median {stats['median_ms']:>8} ms"
+            f"  min {stats['min_ms']:>8} ms  max {stats['max_ms']:>8} ms"
+        )
+    print('  slowest imports (cumulative, median):')
+    for name, value in report['slowest_imports_ms'].items():
+        print(f"    {value:>8} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
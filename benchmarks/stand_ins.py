@@ -0,0 +1,686 @@
+'''
+Local stand-ins for the services the function app talks to, used by the benchmarks.
+
+  - GoodData: a local HTTP server answering the entities and layout API the app calls,
+    so the SDK, its connection pool and the throttling run for real; every request
+    sleeps for the configured latency on top of the local round-trip
+  - Blob storage: an in-memory container behind BlobServiceClient.from_connection_string,
+    listing pages of LIST_PAGE_SIZE blobs and downloads cost one round-trip each
+  - Postgres: a throwaway schema in a local database when a DSN is given, otherwise
+    an in-memory fake answering the metadata_storage queries
+
+install() starts the GoodData server, patches the other client factories and sets
+the environment of the app, it has to be called before any client of the app is created.
+'''
+import collections
+import datetime
+import hashlib
+import http.server
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from types import SimpleNamespace
+
+import yaml
+
+# Azure returns at most 5000 blobs per listing page
+LIST_PAGE_SIZE = 5000
+DEFAULT_DATAPRODUCT = 'bench_dp'
+DEFAULT_DATAPRODUCT_VERSION = 'v1'
+DEFAULT_STORAGE_PATH = 'dataproducts/bench_dp/v1'
+
+ENVIRON = {
+    'gooddata_host': 'http://gooddata.local',
+    'gooddata_token': 'bench',
+    'dataproduct_repository_container_name': 'bench',
+    'dataproduct_repository_connection_string': (
+        'DefaultEndpointsProtocol=https;AccountName=bench;AccountKey=YmVuY2g=;EndpointSuffix=core.windows.net'
+    ),
+    'datasource_password': 'bench',
+    'metadata_storage_host': 'localhost',
+    'metadata_storage_port': '5432',
+    'metadata_storage_user': 'bench',
+    'metadata_storage_db_name': 'bench',
+    'metadata_storage_schema': 'bench',
+    'metadata_storage_password': 'bench',
+}
+
+
+class Latency:
+    '''
+    Simulated round-trip time of the fake services, counts the calls per operation
+    '''
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    def round_trip(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+        if self.seconds:
+            time.sleep(self.seconds)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+
+LATENCY = Latency()
+
+
+# ---- GoodData
+
+# /api/v1/entities/<collection>[/<id>], also the collections nested in a workspace
+ENTITY_PATH = re.compile(
+    r'^/api/v1/entities/(?:workspaces/(?P<workspace_id>[^/]+)/)?(?P<collection>[A-Za-z]+)(?:/(?P<id>[^/]+))?$'
+)
+LAYOUT_PATH = re.compile(r'^/api/v1/layout/(?P<collection>[A-Za-z]+)/[^/]+/(?P<layout>[A-Za-z]+)$')
+# attributes the API accepts but never returns
+WRITE_ONLY_ATTRIBUTES = ('password', 'token')
+
+
+class FakeOrganization:
+    '''
+    The entities of the organization, keyed by (workspace_id, collection) and id
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entities = collections.defaultdict(dict)
+        self._throttled = collections.deque()
+
+    def reset(self):
+        with self.lock:
+            self.entities.clear()
+            self._throttled.clear()
+
+    def throttle_next(self, count, retry_after=0):
+        '''
+        Answer the next count requests with 429 Too Many Requests and Retry-After
+        '''
+        with self.lock:
+            self._throttled.extend([retry_after] * count)
+
+    def take_throttled(self):
+        with self.lock:
+            return self._throttled.popleft() if self._throttled else None
+
+    def get(self, collection, entity_id, workspace_id=None):
+        with self.lock:
+            return self.entities[(workspace_id, collection)].get(entity_id)
+
+    def entity(self, method, path, body, workspace_id, collection, id):
+        with self.lock:
+            entities = self.entities[(workspace_id, collection)]
+            if id is None and method == 'GET':
+                return 200, {'data': [self._out(data) for data in entities.values()], 'links': {'self': path}}
+            if id is None and method == 'POST':
+                entity_id = body['data']['id']
+                if entity_id in entities:
+                    return 409, {'title': 'Conflict', 'detail': f'{collection}/{entity_id} already exists'}
+                entities[entity_id] = body['data']
+                return 201, {'data': self._out(body['data']), 'links': {'self': f'{path}/{entity_id}'}}
+            if id not in entities:
+                return 404, {'title': 'Not Found', 'detail': path}
+            if method == 'GET':
+                return 200, {'data': self._out(entities[id]), 'links': {'self': path}}
+            if method == 'PUT':
+                entities[id] = body['data']
+                return 200, {'data': self._out(body['data']), 'links': {'self': path}}
+            if method == 'DELETE':
+                del entities[id]
+                return 204, None
+        return 405, {'title': 'Method Not Allowed', 'detail': path}
+
+    @staticmethod
+    def _out(data):
+        attributes = {
+            name: value for name, value in data.get('attributes', {}).items()
+            if name not in WRITE_ONLY_ATTRIBUTES
+        }
+        return {**data, 'attributes': attributes}
+
+
+class GoodDataHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    The entities and layout endpoints of the GoodData API the app calls
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        # parsing the body checks the serialization of the SDK
+        body = json.loads(self.rfile.read(length)) if length else None
+        path = urllib.parse.urlsplit(self.path).path
+        entity_path = ENTITY_PATH.match(path)
+        layout_path = LAYOUT_PATH.match(path)
+        if entity_path:
+            operation = f'{method} {entity_path["collection"]}'
+        elif layout_path:
+            operation = f'{method} layout.{layout_path["layout"]}'
+        else:
+            operation = f'{method} {path}'
+        LATENCY.round_trip(f'gooddata.{operation}')
+
+        organization = self.server.organization
+        retry_after = organization.take_throttled()
+        if retry_after is not None:
+            self._send(429, {'title': 'Too Many Requests'}, {'Retry-After': str(retry_after)})
+        elif entity_path:
+            self._send(*organization.entity(method, path, body, **entity_path.groupdict()))
+        elif layout_path and method == 'PUT':
+            self._send(204)
+        else:
+            self._send(404, {'title': 'Not Found', 'detail': path})
+
+    def _send(self, status, document=None, headers=None):
+        payload = json.dumps(document).encode() if document is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/vnd.gooddata.api+json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeGoodDataServer:
+    '''
+    A local HTTP server in a daemon thread, the GoodData host of the app points at it
+    '''
+    def __init__(self):
+        self.organization = FakeOrganization()
+        self._server = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        if self._server is None:
+            self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), GoodDataHandler)
+            self._server.daemon_threads = True
+            self._server.organization = self.organization
+            threading.Thread(target=self._server.serve_forever, name='gooddata_stand_in', daemon=True).start()
+        return self.url
+
+
+GOODDATA = FakeGoodDataServer()
+
+
+# ---- Blob storage
+
+class FakeBlobProperties(SimpleNamespace):
+    pass
+
+
+class FakeDownloader:
+    def __init__(self, data):
+        self._data = data
+        self.size = len(data)
+
+    def readall(self):
+        return self._data
+
+    def readinto(self, stream):
+        stream.write(self._data)
+        return len(self._data)
+
+    def chunks(self):
+        yield self._data
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self._container = container
+        self.blob_name = name
+
+    def download_blob(self, **kwargs):
+        LATENCY.round_trip('blob.download')
+        return FakeDownloader(self._container.get(self.blob_name))
+
+    def get_blob_properties(self, **kwargs):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        LATENCY.round_trip('blob.get_properties')
+        with self._container.lock:
+            blob = self._container.blobs.get(self.blob_name)
+        if blob is None:
+            raise ResourceNotFoundError(f'{self.blob_name} not found')
+        return blob.properties
+
+    def upload_blob(self, data, overwrite=False, content_settings=None, **kwargs):
+        self._container.upload_blob(
+            self.blob_name, data, overwrite=overwrite, content_settings=content_settings
+        )
+
+
+class FakeContainerClient:
+    '''
+    In-memory container, blob names are kept sorted like the service lists them
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.blobs = {}
+
+    def put(self, name, data, content_md5=None):
+        properties = FakeBlobProperties(
+            name=name,
+            size=len(data),
+            etag=f'"{uuid.uuid4().hex}"',
+            last_modified=datetime.datetime.now(datetime.timezone.utc),
+            content_settings=SimpleNamespace(
+                content_md5=bytearray(content_md5 or hashlib.md5(data).digest())
+            )
+        )
+        with self.lock:
+            self.blobs[name] = SimpleNamespace(data=data, properties=properties)
+
+    def get(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        with self.lock:
+            blob = self.blobs.get(name)
+        if blob is None:
+            raise ResourceNotFoundError(f'{name} not found')
+        return blob.data
+
+    def _listed(self, name_starts_with):
+        with self.lock:
+            names = sorted(name for name in self.blobs if name.startswith(name_starts_with or ''))
+            return [self.blobs[name].properties for name in names]
+
+    def list_blobs(self, name_starts_with=None, **kwargs):
+        blobs = self._listed(name_starts_with)
+        for start in range(0, max(1, len(blobs)), LIST_PAGE_SIZE):
+            LATENCY.round_trip('blob.list')
+            yield from blobs[start:start + LIST_PAGE_SIZE]
+
+    def walk_blobs(self, name_starts_with='', delimiter='/', **kwargs):
+        from azure.storage.blob import BlobPrefix
+
+        items = []
+        prefixes = set()
+        for blob in self._listed(name_starts_with):
+            rest = blob.name[len(name_starts_with):]
+            if delimiter in rest:
+                prefix = name_starts_with + rest.split(delimiter)[0] + delimiter
+                if prefix not in prefixes:
+                    prefixes.add(prefix)
+                    item = BlobPrefix.__new__(BlobPrefix)
+                    item.name = prefix
+                    items.append(item)
+            else:
+                items.append(blob)
+        for start in range(0, max(1, len(items)), LIST_PAGE_SIZE):
+            LATENCY.round_trip('blob.list')
+            yield from items[start:start + LIST_PAGE_SIZE]
+
+    def get_blob_client(self, blob):
+        return FakeBlobClient(self, blob)
+
+    def upload_blob(self, name, data, overwrite=False, content_settings=None, **kwargs):
+        from azure.core.exceptions import ResourceExistsError
+
+        LATENCY.round_trip('blob.upload')
+        with self.lock:
+            exists = name in self.blobs
+        if exists and not overwrite:
+            raise ResourceExistsError(f'{name} already exists')
+        data = data.read() if hasattr(data, 'read') else bytes(data)
+        content_md5 = content_settings.content_md5 if content_settings is not None else None
+        self.put(name, data, content_md5=content_md5)
+
+    def delete_blob(self, blob, **kwargs):
+        LATENCY.round_trip('blob.delete')
+        with self.lock:
+            self.blobs.pop(blob, None)
+
+    def delete_blobs(self, *blobs, **kwargs):
+        if len(blobs) > 256:
+            raise ValueError(f'A batch holds at most 256 blobs, got {len(blobs)}')
+        LATENCY.round_trip('blob.delete_batch')
+        with self.lock:
+            deleted = [self.blobs.pop(blob if isinstance(blob, str) else blob.name, None) for blob in blobs]
+        # the response of every sub-request, like raise_on_any_failure=False
+        return iter([SimpleNamespace(status_code=404 if data is None else 202, headers={}) for data in deleted])
+
+
+class FakeBlobServiceClient:
+    CONTAINER = FakeContainerClient()
+    primary_hostname = 'bench.blob.core.windows.net'
+
+    def get_container_client(self, container):
+        return self.CONTAINER
+
+
+def get_container():
+    return FakeBlobServiceClient.CONTAINER
+
+
+# ---- Declarative dataproduct
+
+def make_dataproduct_files(datasets=20, attributes=10, facts=5, metrics=50):
+    '''
+    The files (relative path -> content) of a synthetic declarative dataproduct
+    '''
+    files = {}
+    for i in range(datasets):
+        table_id = f'table_{i}'
+        columns = (
+            [{'name': f'a{j}', 'dataType': 'STRING', 'isPrimaryKey': j == 0} for j in range(attributes)]
+            + [{'name': f'f{j}', 'dataType': 'NUMERIC', 'isPrimaryKey': False} for j in range(facts)]
+        )
+        files[f'pdm/{table_id}.yaml'] = {
+            'id': table_id, 'type': 'TABLE', 'path': ['bench', table_id], 'columns': columns
+        }
+        files[f'ldm/datasets/dataset_{i}.yaml'] = {
+            'id': f'dataset_{i}',
+            'title': f'Dataset {i}',
+            'grain': [{'id': f'dataset_{i}.a0', 'type': 'attribute'}],
+            'references': [],
+            'attributes': [
+                {
+                    'id': f'dataset_{i}.a{j}',
+                    'title': f'A{j}',
+                    'sourceColumn': f'a{j}',
+                    'labels': [],
+                    'tags': [f'Dataset {i}']
+                } for j in range(attributes)
+            ],
+            'facts': [
+                {
+                    'id': f'dataset_{i}.f{j}',
+                    'title': f'F{j}',
+                    'sourceColumn': f'f{j}',
+                    'tags': [f'Dataset {i}']
+                } for j in range(facts)
+            ],
+            'dataSourceTableId': {'id': table_id, 'type': 'dataSource', 'dataSourceId': 'bench'},
+            'tags': [f'Dataset {i}']
+        }
+    for i in range(metrics):
+        files[f'analytics_model/metrics/metric_{i}.yaml'] = {
+            'id': f'metric_{i}',
+            'title': f'Metric {i}',
+            'content': {'format': '#,##0', 'maql': f'SELECT SUM({{fact/dataset_{i % max(1, datasets)}.f0}})'}
+        }
+    return {path: yaml.safe_dump(content).encode('utf-8') for path, content in files.items()}
+
+
+def write_files(files, root):
+    for path, data in files.items():
+        file_path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as file:
+            file.write(data)
+
+
+def seed_dataproduct(storage_path=DEFAULT_STORAGE_PATH, **layout):
+    container = get_container()
+    for path, data in make_dataproduct_files(**layout).items():
+        container.put(f'{storage_path}/{path}', data)
+
+
+def seed_blobs(prefix, count, dirs=100, size=64):
+    '''
+    count small blobs spread over dirs directories under prefix
+    '''
+    container = get_container()
+    data = b'x' * size
+    for i in range(count):
+        container.put(f'{prefix}/dir_{i % dirs}/blob_{i}.yaml', data)
+
+
+# ---- Postgres
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+METADATA_SCHEMA_DDL = '''
+    CREATE TABLE tenant (id VARCHAR PRIMARY KEY, name VARCHAR);
+    CREATE TABLE data_product_catalog (
+        id VARCHAR, version VARCHAR, name VARCHAR, storage_path VARCHAR, PRIMARY KEY (id, version)
+    );
+    CREATE TABLE tenant_data_source (
+        tenant_id VARCHAR, data_product_id VARCHAR, data_product_version VARCHAR,
+        host VARCHAR, database VARCHAR, port INTEGER, schema VARCHAR, username VARCHAR
+    );
+    CREATE TABLE execution_log (
+        scenario_type VARCHAR, scenario_task VARCHAR, process_step_id DOUBLE PRECISION,
+        execution_timestamp TIMESTAMPTZ, tenant_id VARCHAR, result VARCHAR
+    );
+'''
+
+
+class FakeMetadataDb:
+    '''
+    In-memory metadata_storage, it answers the queries of MetadataStorage by their shape
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tenants = {}
+        self.dataproducts = {}
+        self.provisioning_state = {}
+        self.execution_log = []
+        self.advisory_locks = {}
+
+    def add_tenant(self, tenant, dataproduct, dataproduct_version, storage_path):
+        with self.lock:
+            self.tenants[tenant] = f'Tenant {tenant}'
+            self.dataproducts[(dataproduct, dataproduct_version)] = storage_path
+
+    def query(self, sql, params):
+        sql = ' '.join(sql.split()).lower()
+        if sql.startswith('select pg_advisory_'):
+            # waits outside self.lock, like a blocked session the others can still query around
+            with self.lock:
+                advisory_lock = self.advisory_locks.setdefault(params[0], threading.Lock())
+            if sql.startswith('select pg_advisory_lock('):
+                advisory_lock.acquire()
+            else:
+                advisory_lock.release()
+            return ['pg_advisory_lock'], [('',)]
+        with self.lock:
+            if 'from unnest(' in sql:
+                return self._provisioning_metadata(params)
+            if sql.startswith('select scenario_task, fingerprint'):
+                return ['scenario_task', 'fingerprint'], [
+                    (key[3], fingerprint) for key, fingerprint in self.provisioning_state.items()
+                    if key[:3] == tuple(params)
+                ]
+            if sql.startswith('insert into provisioning_state'):
+                self.provisioning_state[tuple(params[:4])] = params[4]
+            elif sql.startswith('delete from provisioning_state'):
+                for key in [key for key in self.provisioning_state if key[:2] == tuple(params)]:
+                    del self.provisioning_state[key]
+            elif sql.startswith('copy execution_log'):
+                self.execution_log.extend(params.decode('utf-8').splitlines())
+            elif sql.startswith('select'):
+                return ['?column?'], [(1,)]
+        return None
+
+    def _provisioning_metadata(self, params):
+        columns = [
+            'tenant_id', 'data_product_id', 'data_product_version', 'datasource_found',
+            'host', 'db_name', 'port', 'schema', 'username', 'dataproduct_found',
+            'dataproduct_name', 'storage_path', 'tenant_found', 'tenant_name'
+        ]
+        rows = []
+        for tenant, dataproduct, version in zip(*params):
+            storage_path = self.dataproducts.get((dataproduct, version))
+            found = tenant in self.tenants and storage_path is not None
+            rows.append((
+                tenant, dataproduct, version, found, 'localhost', 'bench', 5432, 'bench', 'bench',
+                storage_path is not None, dataproduct, storage_path, tenant in self.tenants,
+                self.tenants.get(tenant)
+            ))
+        return columns, rows
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params=None):
+        LATENCY.round_trip('postgres.execute')
+        sql = sql.decode('utf-8') if isinstance(sql, bytes) else sql
+        result = self.connection.db.query(sql, params)
+        self.description, self._rows = None, []
+        if result is not None:
+            columns, rows = result
+            self.description = [SimpleNamespace(name=column) for column in columns]
+            self._rows = [list(row) for row in rows]
+
+    def mogrify(self, sql, params):
+        sql = sql.decode('utf-8') if isinstance(sql, bytes) else sql
+        return (sql % tuple(repr(param) for param in params)).encode('utf-8')
+
+    def copy_expert(self, sql, file, size=8192):
+        LATENCY.round_trip('postgres.copy')
+        data = b''.join(iter(lambda: file.read(size), b''))
+        self.connection.db.query(sql, data)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+class FakeConnection:
+    encoding = 'UTF8'
+
+    def __init__(self, db):
+        self.db = db
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def set_isolation_level(self, level):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+FAKE_DB = FakeMetadataDb()
+
+
+class LocalPostgres:
+    '''
+    Throwaway schema with the metadata tables in a local database, dropped by drop()
+    '''
+    def __init__(self, dsn):
+        import psycopg2
+        from psycopg2.extensions import parse_dsn
+
+        self.dsn = dsn
+        self.params = parse_dsn(dsn)
+        self.schema = f'bench_{os.getpid()}_{uuid.uuid4().hex[:8]}'
+        self._conn = psycopg2.connect(dsn)
+        self._conn.autocommit = True
+        with self._conn.cursor() as cur:
+            cur.execute(f'CREATE SCHEMA {self.schema}')
+            cur.execute(f'SET SEARCH_PATH TO {self.schema}')
+            cur.execute(METADATA_SCHEMA_DDL)
+            # the schema of a deployment, every migration applied in order
+            for name in sorted(os.listdir(MIGRATIONS_DIR)):
+                with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as file:
+                    cur.execute(file.read())
+
+    @property
+    def environ(self):
+        return {
+            'metadata_storage_host': self.params.get('host', 'localhost'),
+            'metadata_storage_port': self.params.get('port', '5432'),
+            'metadata_storage_user': self.params.get('user', os.getenv('USER', 'postgres')),
+            'metadata_storage_db_name': self.params.get('dbname', 'postgres'),
+            'metadata_storage_schema': self.schema,
+            'metadata_storage_password': self.params.get('password', ''),
+        }
+
+    def add_tenant(self, tenant, dataproduct, dataproduct_version, storage_path):
+        with self._conn.cursor() as cur:
+            cur.execute(
+                'INSERT INTO tenant VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                (tenant, f'Tenant {tenant}')
+            )
+            cur.execute(
+                'INSERT INTO data_product_catalog VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING',
+                (dataproduct, dataproduct_version, dataproduct, storage_path)
+            )
+            cur.execute(
+                'INSERT INTO tenant_data_source VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+                (tenant, dataproduct, dataproduct_version, 'localhost', 'bench', 5432, 'bench', 'bench')
+            )
+
+    def drop(self):
+        with self._conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA {self.schema} CASCADE')
+        self._conn.close()
+
+
+def install(latency_ms=0.0, postgres_dsn=None, cache_dir=None):
+    '''
+    Route the clients of the app to the stand-ins, returns the metadata database
+    (LocalPostgres or FakeMetadataDb) tenants are added to
+    '''
+    import azure.storage.blob
+    import psycopg2
+
+    LATENCY.seconds = latency_ms / 1000
+    os.environ.update(ENVIRON)
+    if cache_dir:
+        os.environ['dataproduct_cache_dir'] = cache_dir
+    os.environ['gooddata_host'] = GOODDATA.start()
+    azure.storage.blob.BlobServiceClient.from_connection_string = classmethod(
+        lambda cls, *args, **kwargs: FakeBlobServiceClient()
+    )
+    if postgres_dsn:
+        db = LocalPostgres(postgres_dsn)
+        os.environ.update(db.environ)
+        return db
+    psycopg2.connect = lambda *args, **kwargs: FakeConnection(FAKE_DB)
+    return FAKE_DB
+
+
+def reset_app_state():
+    '''
+    Forget the process-wide caches of the app, so a measurement starts cold
+    '''
+    from shared_code import gooddata, metadata_storage, postgres, throttling
+
+    gooddata._SDKS.clear()
+    GOODDATA.organization.reset()
+    throttling._THROTTLES.clear()
+    gooddata._MODEL_CACHE.clear()
+    metadata_storage.invalidate_metadata_cache()
+    postgres.close_pools()
+
@@ -0,0 +1,323 @@
+'''
+Benchmark suite of the function app against local stand-ins of GoodData, Blob and Postgres.
+
+Micro-benchmarks, measured without simulated latency (the app's own cost):
+  - blob.ls_dirs, blob.index and blob.download over --blobs blobs
+  - fce_config: FceConfig construction and property access
+  - gooddata.remap_ldm and gooddata.put_declarative_ldm of a --datasets dataset model
+End-to-end, every call to a stand-in sleeps for --latency-ms:
+  - ProvisionTenant.main latency and throughput at --concurrency concurrent tenants
+
+The report is JSON, pass a previous report as --baseline to compare two commits.
+
+Usage (from the repository root):
+    python benchmarks/suite.py [--only micro|e2e] [--latency-ms 20] [--concurrency 1,10,100]
+        [--postgres-dsn DSN] [--output report.json] [--baseline report.json] [--json]
+'''
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import stand_ins  # noqa: E402  (benchmarks/ is on sys.path when run as a script)
+
+# results where higher is better, all other results are durations
+HIGHER_IS_BETTER = ('tenants_per_second',)
+
+
+def summarize(values_ms):
+    values_ms = sorted(values_ms)
+    return {
+        'count': len(values_ms),
+        'median_ms': round(statistics.median(values_ms), 3),
+        'p95_ms': round(values_ms[min(len(values_ms) - 1, int(len(values_ms) * 0.95))], 3),
+        'min_ms': round(values_ms[0], 3),
+        'max_ms': round(values_ms[-1], 3)
+    }
+
+
+def measure(func, repeat, setup=None):
+    '''
+    Duration of repeat calls of func in milliseconds, setup runs untimed before every call
+    '''
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return summarize(durations)
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def tenant_args(tenant, **kwargs):
+    return SimpleNamespace(
+        dataproduct=stand_ins.DEFAULT_DATAPRODUCT,
+        dataproduct_version=stand_ins.DEFAULT_DATAPRODUCT_VERSION,
+        tenant=tenant,
+        **kwargs
+    )
+
+
+def bench_blob(blobs, repeat, work_dir):
+    from shared_code.azure_blob_storage import DirectoryClient
+
+    prefix = 'bench/listing'
+    stand_ins.seed_blobs(prefix, blobs)
+    client = DirectoryClient(
+        stand_ins.ENVIRON['dataproduct_repository_connection_string'],
+        stand_ins.ENVIRON['dataproduct_repository_container_name']
+    )
+    index = client.index(prefix)
+    dest = os.path.join(work_dir, 'download')
+    return {
+        'blob.ls_dirs': measure(lambda: client.ls_dirs(prefix), repeat),
+        'blob.ls_dirs_recursive': measure(lambda: client.ls_dirs(prefix, recursive=True), repeat),
+        'blob.index': measure(lambda: client.index(prefix), repeat),
+        'blob.ls_files_indexed': measure(
+            lambda: client.ls_files(prefix, recursive=True, index=index), repeat
+        ),
+        'blob.download': measure(
+            lambda: client.download(prefix, dest, index=index),
+            max(1, repeat // 10),
+            setup=lambda: shutil.rmtree(dest, ignore_errors=True)
+        )
+    }
+
+
+def bench_fce_config(repeat):
+    from shared_code.fce_config import FceConfig
+
+    def construct_and_access():
+        fcc = FceConfig(tenant_args('bench_tenant'))
+        return fcc.parent_workspace_id, fcc.default_usergroups, fcc.workspace_permissions
+
+    fcc = FceConfig(tenant_args('bench_tenant'))
+    construct_and_access()
+    return {
+        'fce_config.construct_and_access': measure(construct_and_access, repeat),
+        'fce_config.cached_access': measure(
+            lambda: (fcc.default_usergroups, fcc.workspace_permissions, fcc.gooddata_config), repeat
+        )
+    }
+
+
+def bench_ldm(datasets, repeat, work_dir):
+    from shared_code.tenant_scenario import get_clients
+    from shared_code.gooddata import remap_ldm_data_source
+
+    src_dir = Path(work_dir, 'ldm')
+    stand_ins.write_files(stand_ins.make_dataproduct_files(datasets=datasets), src_dir)
+    gdata = get_clients(logging.getLogger(__name__)).gdata
+    ldm = gdata.sdk.catalog_workspace_content.load_ldm_from_disk(path=src_dir)
+    cache_key = ('bench', 'v1', 'fingerprint')
+    # the model is loaded from disk by the first put only, the model cache serves the rest
+    gdata.put_declarative_ldm(src_dir, 'bench_ws', 'bench_datasource', cache_key=cache_key)
+    return {
+        'gooddata.load_ldm_from_disk': measure(
+            lambda: gdata.sdk.catalog_workspace_content.load_ldm_from_disk(path=src_dir),
+            max(1, repeat // 10)
+        ),
+        'gooddata.remap_ldm': measure(lambda: remap_ldm_data_source(ldm, 'bench_datasource'), repeat),
+        'gooddata.put_declarative_ldm': measure(
+            lambda: gdata.put_declarative_ldm(src_dir, 'bench_ws', 'bench_datasource', cache_key=cache_key),
+            repeat
+        )
+    }
+
+
+def run_tenants(tenants, concurrency, clients):
+    from shared_code.provision_tenant_analytics import ProvisionTenant
+
+    def provision(tenant):
+        start = time.perf_counter()
+        ProvisionTenant(tenant_args(tenant), clients=clients).main()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(provision, tenants))
+    return latencies, time.perf_counter() - start
+
+
+def bench_e2e(db, concurrency_levels, rounds, run_id):
+    from shared_code.tenant_scenario import get_clients
+
+    stand_ins.seed_dataproduct()
+    results = {}
+    clients = get_clients(logging.getLogger(__name__))
+    # the first tenant populates the dataproduct and model caches of the process
+    cold_tenant = f'bench_{run_id}_cold'
+    db.add_tenant(cold_tenant, stand_ins.DEFAULT_DATAPRODUCT, stand_ins.DEFAULT_DATAPRODUCT_VERSION,
+                  stand_ins.DEFAULT_STORAGE_PATH)
+    stand_ins.LATENCY.reset()
+    cold_ms, _ = run_tenants([cold_tenant], 1, clients)
+    results['e2e.provision_tenant.cold'] = {
+        **summarize(cold_ms), 'calls': dict(stand_ins.LATENCY.calls)
+    }
+    for concurrency in concurrency_levels:
+        latencies = []
+        wall_seconds = 0.0
+        stand_ins.LATENCY.reset()
+        for round_index in range(rounds):
+            # fresh tenants every round, provisioning_state would skip the steps of known ones
+            tenants = [f'bench_{run_id}_c{concurrency}_r{round_index}_{i}' for i in range(concurrency)]
+            for tenant in tenants:
+                db.add_tenant(tenant, stand_ins.DEFAULT_DATAPRODUCT,
+                              stand_ins.DEFAULT_DATAPRODUCT_VERSION, stand_ins.DEFAULT_STORAGE_PATH)
+            round_latencies, round_seconds = run_tenants(tenants, concurrency, clients)
+            latencies.extend(round_latencies)
+            wall_seconds += round_seconds
+        calls = sum(stand_ins.LATENCY.calls.values())
+        results[f'e2e.provision_tenant.concurrency_{concurrency}'] = {
+            **summarize(latencies),
+            'tenants_per_second': round(len(latencies) / wall_seconds, 2),
+            'calls_per_tenant': round(calls / len(latencies), 1)
+        }
+    return results
+
+
+def compare(results, baseline):
+    '''
+    Relative change of every result against the baseline report, positive is a regression
+    '''
+    changes = {}
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('median_ms', 'p95_ms') + HIGHER_IS_BETTER:
+            if result.get(metric) and previous.get(metric):
+                change = result[metric] / previous[metric] - 1
+                if metric in HIGHER_IS_BETTER:
+                    change = -change
+                changes[f'{name}.{metric}'] = round(change * 100, 1)
+    return changes
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    db = stand_ins.install(
+        latency_ms=0, postgres_dsn=args.postgres_dsn, cache_dir=os.path.join(work_dir, 'cache')
+    )
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if args.only in (None, 'micro'):
+                results.update(bench_blob(args.blobs, args.repeat, work_dir))
+                results.update(bench_fce_config(args.repeat * 10))
+                results.update(bench_ldm(args.datasets, args.repeat, work_dir))
+            if args.only in (None, 'e2e'):
+                stand_ins.reset_app_state()
+                stand_ins.LATENCY.seconds = args.latency_ms / 1000
+                results.update(bench_e2e(db, args.concurrency, args.rounds, run_id=os.getpid()))
+    finally:
+        from shared_code import execution_log_buffer
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            execution_log_buffer.flush_all()
+        if hasattr(db, 'drop'):
+            db.drop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    report = {
+        'git_commit': get_git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'config': {
+            'latency_ms': args.latency_ms,
+            'blobs': args.blobs,
+            'datasets': args.datasets,
+            'repeat': args.repeat,
+            'concurrency': args.concurrency,
+            'rounds': args.rounds,
+            'postgres': 'local' if args.postgres_dsn else 'fake'
+        },
+        'results': results
+    }
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        report['baseline_commit'] = baseline.get('git_commit')
+        report['change_percent'] = compare(results, baseline)
+    return report
+
+
+def print_report(report):
+    config = report['config']
+    print(
+        f"commit {report['git_commit']} (python {report['python']}, latency {config['latency_ms']} ms,"
+        f" postgres {config['postgres']})"
+    )
+    for name, result in report['results'].items():
+        line = (
+            f"  {name:<42} median {result['median_ms']:>10} ms  p95 {result['p95_ms']:>10} ms"
+        )
+        if 'tenants_per_second' in result:
+            line += f"  {result['tenants_per_second']:>8} tenants/s"
+        print(line)
+    if 'change_percent' in report:
+        print(f"  change against {report['baseline_commit']} (positive is a regression):")
+        for name, change in report['change_percent'].items():
+            print(f"    {change:>+8} %  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', choices=('micro', 'e2e'))
+    parser.add_argument('--latency-ms', type=float, default=20, help='simulated round-trip of e2e calls')
+    parser.add_argument('--blobs', type=int, default=10000)
+    parser.add_argument('--datasets', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument(
+        '--concurrency', type=lambda value: [int(level) for level in value.split(',')], default=[1, 10, 100]
+    )
+    parser.add_argument('--rounds', type=int, default=1, help='batches of tenants per concurrency level')
+    parser.add_argument(
+        '--postgres-dsn', default=os.getenv('BENCHMARK_POSTGRES_DSN'),
+        help='local database for a throwaway metadata schema, an in-memory fake without it'
+    )
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report of a previous run to compare with')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='keep the logs of the app')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,57 @@
+import json
 import logging
-import tempfile
 from types import SimpleNamespace
 
 import azure.functions as func
 
-from .code.provision_tenant_analytics import ProvisionTenant
+from shared_code import instrumentation
+from shared_code.bulk import get_flag, get_max_workers, parse_tenants
+from shared_code.bulk_provision import BulkProvisionTenant
+from shared_code.http_trigger import TRUE_VALUES, accepted, get_job_queue
+from shared_code.provision_tenant_analytics import ProvisionTenant
+from shared_code.warmup import warm_up
+
+
+def bulk_main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        body = req.get_json()
+        tenants = parse_tenants(body)
+        max_workers = get_max_workers(body)
+        force = get_flag(body, 'force')
+        run_async = get_flag(body, 'async')
+    except (TypeError, ValueError) as ex:
+        return func.HttpResponse(
+            f"Invalid bulk request: {ex}",
+            status_code=400
+        )
+    if run_async:
+        job_id = instrumentation.new_correlation_id()
+        get_job_queue().submit(
+            'bulk_create_tenant',
+            lambda: BulkProvisionTenant(
+                tenants, max_workers=max_workers, force=force, correlation_id=job_id
+            ).main(),
+            job_id=job_id
+        )
+        return accepted(req, job_id)
+    summary = BulkProvisionTenant(tenants, max_workers=max_workers, force=force).main()
+    return func.HttpResponse(
+        json.dumps(summary),
+        mimetype='application/json',
+        status_code=200
+    )
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Python HTTP trigger function processed a request.')
 
+    if req.params.get('warmup', '').lower() in TRUE_VALUES:
+        warm_up()
+        return func.HttpResponse("Warm-up finished")
+
+    if req.method == 'POST' and req.get_body():
+        return bulk_main(req)
+
     dataproduct = req.params.get('dataproduct')
     dataproduct_version = req.params.get('dataproduct_version')
     tenant = req.params.get('tenant')
@@ -19,11 +61,23 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         args.dataproduct = dataproduct
         args.dataproduct_version = dataproduct_version
         args.tenant = tenant
-        with tempfile.TemporaryDirectory() as temp_dir:
-            ProvisionTenant(args, temp_dir).main()
+        args.force = req.params.get('force', '').lower() in TRUE_VALUES
+        if req.params.get('async', '').lower() in TRUE_VALUES:
+            # the job id is the correlation id of the execution_log entries
+            args.correlation_id = instrumentation.new_correlation_id()
+            get_job_queue().submit(
+                'create_tenant',
+                lambda: ProvisionTenant(args).main(),
+                job_id=args.correlation_id
+            )
+            return accepted(req, args.correlation_id)
+        ProvisionTenant(args).main()
         return func.HttpResponse(f"{args=}\n\nThe execution finished successfully")
     else:
         return func.HttpResponse(
-             "Pass dataproduct=&dataproduct_version=&tenant= in the query string to trigger provisioning.",
+             "Pass dataproduct=&dataproduct_version=&tenant= in the query string to trigger provisioning,"
+             " or POST a JSON list of tenants to trigger bulk provisioning."
+             " Add async=1 (or \"async\": true in the JSON body) to get a job id"
+             " and poll provisioning_status?job_id= instead of waiting.",
              status_code=200
         )
@@ -0,0 +1,75 @@
+import json
+import logging
+from types import SimpleNamespace
+
+import azure.functions as func
+
+from shared_code import instrumentation
+from shared_code.bulk import get_flag, get_max_workers, parse_tenants
+from shared_code.http_trigger import TRUE_VALUES, accepted, get_job_queue
+
+from .code.bulk_delete import BulkDeleteTenant
+from .code.delete_tenant_analytics import DeleteTenant
+
+
+def bulk_main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        body = req.get_json()
+        tenants = parse_tenants(body)
+        max_workers = get_max_workers(body)
+        run_async = get_flag(body, 'async')
+    except (TypeError, ValueError) as ex:
+        return func.HttpResponse(
+            f"Invalid bulk request: {ex}",
+            status_code=400
+        )
+    if run_async:
+        job_id = instrumentation.new_correlation_id()
+        get_job_queue().submit(
+            'bulk_delete_tenant',
+            lambda: BulkDeleteTenant(tenants, max_workers=max_workers, correlation_id=job_id).main(),
+            job_id=job_id
+        )
+        return accepted(req, job_id)
+    summary = BulkDeleteTenant(tenants, max_workers=max_workers).main()
+    return func.HttpResponse(
+        json.dumps(summary),
+        mimetype='application/json',
+        status_code=200
+    )
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Python HTTP trigger function processed a request.')
+
+    if req.method == 'POST' and req.get_body():
+        return bulk_main(req)
+
+    dataproduct = req.params.get('dataproduct')
+    dataproduct_version = req.params.get('dataproduct_version')
+    tenant = req.params.get('tenant')
+
+    if dataproduct and dataproduct_version and tenant:
+        args = SimpleNamespace()
+        args.dataproduct = dataproduct
+        args.dataproduct_version = dataproduct_version
+        args.tenant = tenant
+        if req.params.get('async', '').lower() in TRUE_VALUES:
+            # the job id is the correlation id of the execution_log entries
+            args.correlation_id = instrumentation.new_correlation_id()
+            get_job_queue().submit(
+                'delete_tenant',
+                lambda: DeleteTenant(args).main(),
+                job_id=args.correlation_id
+            )
+            return accepted(req, args.correlation_id)
+        DeleteTenant(args).main()
+        return func.HttpResponse(f"{args=}\n\nThe execution finished successfully")
+    else:
+        return func.HttpResponse(
+             "Pass dataproduct=&dataproduct_version=&tenant= in the query string to delete a tenant,"
+             " or POST a JSON list of tenants to delete them in bulk."
+             " Add async=1 (or \"async\": true in the JSON body) to get a job id"
+             " and poll provisioning_status?job_id= instead of waiting.",
+             status_code=200
+        )
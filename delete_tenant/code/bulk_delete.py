@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from shared_code import app_config, bulk, execution_log_buffer, logger
+from shared_code.bulk import TENANT_PARAMS, get_missing_params
+from shared_code.tenant_scenario import get_clients
+
+from .delete_tenant_analytics import SCENARIO, DeleteTenant
+
+
+class BulkDeleteTenant:
+    def __init__(
+        self,
+        tenants: List[Dict],
+        max_workers: Optional[int] = None,
+        correlation_id: Optional[str] = None
+    ) -> None:
+        self.logger = logger.get_logger(SCENARIO)
+        self.tenants = tenants
+        self.max_workers = max_workers or app_config.get_bulk_max_workers()
+        # shared by the execution_log entries of all tenants of the batch when given
+        self.correlation_id = correlation_id
+        self.clients = get_clients(self.logger)
+
+    def delete(self, tenant: Dict) -> None:
+        missing_params = get_missing_params(tenant)
+        if missing_params:
+            raise ValueError(f"{missing_params=}")
+        args = SimpleNamespace(**{param: tenant[param] for param in TENANT_PARAMS})
+        args.correlation_id = self.correlation_id
+        # the execution_log entries of the whole batch are flushed together
+        DeleteTenant(args, clients=self.clients, flush_execution_log=False).main()
+
+    def main(self) -> Dict:
+        try:
+            results = bulk.run_bulk(
+                items=self.tenants,
+                worker=lambda index, tenant: self.delete(tenant),
+                max_workers=self.max_workers,
+                logger=self.logger
+            )
+        finally:
+            execution_log_buffer.flush_all()
+        results = [
+            {**{param: tenant.get(param) for param in TENANT_PARAMS}, **result}
+            if isinstance(tenant, dict) else result
+            for tenant, result in zip(self.tenants, results)
+        ]
+        summary = bulk.summarize(results)
+        self.logger.info(
+            f"Bulk deletion finished (total={summary['total']}, failed={summary['failed']})"
+        )
+        return summary
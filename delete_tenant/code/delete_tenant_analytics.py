@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+from typing import List, Optional
+
+from shared_code import app_config, fce_config, metadata_storage
+from shared_code.step_scheduler import Step, StepScheduler
+from shared_code.tenant_scenario import TenantScenario
+
+SCENARIO = "DeleteTenant"
+
+REQUIRED_ENVIRON = {
+    **app_config.REQUIRED_ENVIRON_METADATA_STORAGE,
+    **app_config.REQUIRED_ENVIRON_GOODDATA,
+    **app_config.REQUIRED_ENVIRON_DATAPRODUCT_REPOSITORY
+}
+
+
+class DeleteTenant(TenantScenario):
+    '''
+    Remove everything ProvisionTenant created for a tenant, every step tolerates
+    objects which do not exist, so a failed teardown can be re-run
+    '''
+    def __init__(
+        self, args, clients: Optional[SimpleNamespace] = None, flush_execution_log: bool = True
+    ) -> None:
+        super().__init__(
+            args,
+            fce_config.FceConfig(args, scenario=SCENARIO, required_environ=REQUIRED_ENVIRON),
+            clients,
+            flush_execution_log
+        )
+
+    @metadata_storage.execution_log
+    def clear_provisioning_state(self) -> None:
+        # cleared first, a partially deleted tenant must never be skipped by the next provisioning
+        self.metadata_storage.clear_provisioning_state()
+        metadata_storage.invalidate_metadata_cache(
+            tenant=self.fcc.tenant, dataproduct=self.fcc.dataproduct
+        )
+
+    @metadata_storage.execution_log
+    def remove_workspace_data_filter(self) -> None:
+        self.gdata.remove_workspace_data_filters(workspace_id=self.fcc.child_workspace_id)
+
+    @metadata_storage.execution_log
+    def delete_child_workspace(self) -> None:
+        self.gdata.delete_workspace(workspace_id=self.fcc.child_workspace_id)
+
+    @metadata_storage.execution_log
+    def delete_parent_workspace(self) -> None:
+        self.gdata.delete_workspace(workspace_id=self.fcc.parent_workspace_id)
+
+    @metadata_storage.execution_log
+    def delete_datasource(self) -> None:
+        self.gdata.delete_data_source(datasource_id=self.fcc.datasource_id)
+
+    @metadata_storage.execution_log
+    def delete_user_groups(self) -> None:
+        for usergroup in self.fcc.default_usergroups:
+            self.gdata.delete_user_group(user_group_id=usergroup.id)
+
+    @metadata_storage.execution_log
+    def delete_tenant_artifacts(self) -> Optional[str]:
+        storage_path = app_config.get_tenant_artifacts_path(
+            data_product_id=self.fcc.dataproduct,
+            tenant_id=self.fcc.tenant
+        )
+        if storage_path is None:
+            self.fcc.logger.info('No tenant artifacts path configured')
+            return metadata_storage.STEP_SKIPPED
+        self.dataproduct_repository.delete(storage_path)
+        return None
+
+    def steps(self) -> List[Step]:
+        steps = [
+            Step('clear_provisioning_state', self.clear_provisioning_state,
+                 provides=['provisioning_state']),
+            Step('delete_tenant_artifacts', self.delete_tenant_artifacts,
+                 requires=['provisioning_state'],
+                 provides=['tenant_artifacts']),
+        ]
+        if self.fcc.shared_parent:
+            # the parent workspace and the datasource are shared with the other tenants
+            return steps + [
+                Step('remove_workspace_data_filter', self.remove_workspace_data_filter,
+                     requires=['provisioning_state'],
+                     provides=['workspace_data_filter']),
+                Step('delete_child_workspace', self.delete_child_workspace,
+                     requires=['workspace_data_filter'],
+                     provides=['child_workspace']),
+                Step('delete_user_groups', self.delete_user_groups,
+                     requires=['child_workspace'],
+                     provides=['user_groups']),
+            ]
+        return steps + [
+            Step('delete_child_workspace', self.delete_child_workspace,
+                 requires=['provisioning_state'],
+                 provides=['child_workspace']),
+            Step('delete_parent_workspace', self.delete_parent_workspace,
+                 requires=['child_workspace'],
+                 provides=['parent_workspace']),
+            Step('delete_datasource', self.delete_datasource,
+                 requires=['parent_workspace'],
+                 provides=['datasource']),
+            Step('delete_user_groups', self.delete_user_groups,
+                 requires=['parent_workspace'],
+                 provides=['user_groups']),
+        ]
+
+    @metadata_storage.execution_log
+    def delete_tenant(self) -> None:
+        # logged after all the steps as DELETE_TASK, its entry marks the end of the invocation
+        StepScheduler(
+            self.steps(),
+            max_workers=app_config.get_step_max_workers(),
+            logger=self.fcc.logger
+        ).run()
+
+    def run(self) -> None:
+        self.delete_tenant()
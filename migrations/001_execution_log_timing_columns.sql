@@ -0,0 +1,5 @@
+-- execution_log entries carry the duration of the step and the correlation id of the invocation
+-- (written by shared_code/execution_log_buffer.py), apply before deploying the functions
+ALTER TABLE execution_log
+  ADD COLUMN IF NOT EXISTS duration_ms DOUBLE PRECISION,
+  ADD COLUMN IF NOT EXISTS correlation_id VARCHAR;
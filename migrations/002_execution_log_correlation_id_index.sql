@@ -0,0 +1,4 @@
+-- MetadataStorage.get_execution_log (provisioning status, rollout resume) looks entries up by
+-- correlation_id. CONCURRENTLY does not block the writers, it must run outside of a transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS execution_log_correlation_id_idx
+    ON execution_log (correlation_id);
@@ -0,0 +1,79 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+import azure.functions as func
+
+from shared_code import app_config, job_queue, logger, metadata_storage
+from shared_code.tenant_scenario import DELETE_TASK, PROVISION_TASK
+
+SCENARIO = 'ProvisioningStatus'
+STEP_OK_RESULTS = ('ok', metadata_storage.STEP_SKIPPED)
+# the execution_log tasks marking the end of a tenant invocation
+FINAL_TASKS = (PROVISION_TASK, DELETE_TASK)
+
+
+def get_tenant_progress(entries: List[Dict]) -> Dict:
+    '''
+    Per-step progress of every tenant of the job from its execution_log entries
+    '''
+    tenants: Dict[str, Dict] = {}
+    for entry in entries:
+        tenant = tenants.setdefault(
+            entry['tenant_id'], {'status': job_queue.JOB_RUNNING, 'steps': []}
+        )
+        failed = entry['result'] not in STEP_OK_RESULTS
+        step = {
+            'step': entry['scenario_task'],
+            'result': 'failed' if failed else entry['result'],
+            'error': entry['result'] if failed else None,
+            'execution_timestamp': entry['execution_timestamp'].isoformat(),
+            'duration_ms': entry['duration_ms']
+        }
+        if entry['scenario_task'] in FINAL_TASKS:
+            tenant['status'] = job_queue.JOB_FAILED if failed else job_queue.JOB_SUCCEEDED
+        else:
+            tenant['steps'].append(step)
+    return tenants
+
+
+def get_job_status(job: Optional[Dict], tenants: Dict) -> str:
+    if job is not None:
+        return job['status']
+    statuses = {tenant['status'] for tenant in tenants.values()}
+    if job_queue.JOB_RUNNING in statuses:
+        return job_queue.JOB_RUNNING
+    if job_queue.JOB_FAILED in statuses:
+        return job_queue.JOB_FAILED
+    return job_queue.JOB_SUCCEEDED
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Python HTTP trigger function processed a request.')
+
+    job_id = req.params.get('job_id')
+    if not job_id:
+        return func.HttpResponse("Pass job_id= in the query string.", status_code=400)
+
+    log = logger.get_logger(SCENARIO)
+    storage = metadata_storage.MetadataStorage(
+        app_config.get_metadata_storage_config(tenant=None, scenario=SCENARIO, logger=log)
+    )
+    # the job record is only known to the instance which queued the job,
+    # the execution_log entries are visible from every instance once flushed
+    job = job_queue.get_job(job_id)
+    tenants = get_tenant_progress(storage.get_execution_log(job_id))
+    if job is None and not tenants:
+        return func.HttpResponse(f"Unknown job ({job_id=}) or it has not started yet.", status_code=404)
+
+    status = {
+        'job_id': job_id,
+        'status': get_job_status(job, tenants),
+        'job': job,
+        'tenants': tenants
+    }
+    return func.HttpResponse(
+        json.dumps(status, default=str),
+        mimetype='application/json',
+        status_code=200
+    )
@@ -0,0 +1,71 @@
+import logging
+from typing import Any
+
+import azure.functions as func
+
+from shared_code import app_config, instrumentation, job_queue
+from shared_code.http_trigger import accepted, get_job_queue
+
+from .code.rollout_dataproduct import Rollout
+
+# the JSON types of the options and their smallest accepted values
+ROLLOUT_OPTIONS = {
+    'max_workers': (int, 1),
+    'canary_count': (int, 0),
+    'max_error_rate': (float, 0),
+    'min_failures': (int, 0)
+}
+
+
+def get_option(body: dict, option: str) -> Any:
+    option_type, minimum = ROLLOUT_OPTIONS[option]
+    value = body[option]
+    # bool is an int, a float option also takes a JSON integer
+    accepted_types, kind = ((int, float), 'a number') if option_type is float else ((int,), 'an integer')
+    if isinstance(value, bool) or not isinstance(value, accepted_types) or value < minimum:
+        raise ValueError(f"{option} must be {kind} of at least {minimum}, got {value!r}")
+    return option_type(value)
+
+
+def parse_rollout(body) -> dict:
+    if not isinstance(body, dict):
+        raise ValueError('The request body must be a JSON object')
+    missing_params = [param for param in ('dataproduct', 'dataproduct_version') if not body.get(param)]
+    if missing_params:
+        raise ValueError(f"{missing_params=}")
+    for param in ('tenants', 'canary_tenants'):
+        if body.get(param) is not None and not isinstance(body[param], list):
+            raise ValueError(f"{param} must be a list of tenant ids")
+    options = app_config.get_rollout_config()
+    for option in ROLLOUT_OPTIONS:
+        if body.get(option) is not None:
+            setattr(options, option, get_option(body, option))
+    return {
+        'dataproduct': body['dataproduct'],
+        'dataproduct_version': body['dataproduct_version'],
+        'from_version': body.get('from_version'),
+        'tenants': body.get('tenants'),
+        'canary_tenants': body.get('canary_tenants'),
+        'options': options,
+        'rollout_id': body.get('rollout_id') or instrumentation.new_correlation_id()
+    }
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Python HTTP trigger function processed a request.')
+
+    try:
+        params = parse_rollout(req.get_json())
+        rollout = Rollout(**params)
+    except ValueError as ex:
+        return func.HttpResponse(f"Invalid rollout request: {ex}", status_code=400)
+
+    job = job_queue.get_job(rollout.rollout_id)
+    if job is not None and job['status'] in (job_queue.JOB_QUEUED, job_queue.JOB_RUNNING):
+        return func.HttpResponse(
+            f"The rollout is already {job['status']} (rollout_id={rollout.rollout_id})",
+            status_code=409
+        )
+    # a rollout takes far longer than an HTTP request, pass its rollout_id again to resume it
+    get_job_queue().submit('rollout', rollout.main, job_id=rollout.rollout_id)
+    return accepted(req, rollout.rollout_id)
@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set, Tuple
+
+from shared_code import (app_config, bulk, execution_log_buffer,
+                         instrumentation, logger, metadata_storage)
+from shared_code.bulk_provision import BulkProvisionTenant
+from shared_code.exceptions import RolloutStoppedError
+from shared_code.tenant_scenario import PROVISION_TASK
+
+SCENARIO = "Rollout"
+
+
+def get_completed_tenants(entries: List[Dict]) -> Set[str]:
+    '''
+    Tenants whose provisioning finished successfully, from the execution_log entries of the rollout
+    '''
+    completed = set()
+    for entry in entries:
+        if entry['scenario_task'] != PROVISION_TASK:
+            continue
+        # the entries are ordered, the last attempt of a tenant counts
+        if entry['result'] == 'ok':
+            completed.add(entry['tenant_id'])
+        else:
+            completed.discard(entry['tenant_id'])
+    return completed
+
+
+class Rollout:
+    '''
+    Upgrade the tenants of a dataproduct to dataproduct_version by provisioning them again,
+    the changed steps (the datasource and the models) are redeployed and the rest is skipped.
+    The canary tenants go first and the rollout stops when any of them fails, the others
+    run max_workers at a time and the rollout stops when too many of them fail.
+    The rollout id is the correlation id of the execution_log entries of all its tenants,
+    a rollout started again with the same id skips the tenants already upgraded.
+    '''
+    def __init__(
+        self,
+        dataproduct: str,
+        dataproduct_version: str,
+        from_version: Optional[str] = None,
+        tenants: Optional[List[str]] = None,
+        canary_tenants: Optional[List[str]] = None,
+        options: Optional[SimpleNamespace] = None,
+        rollout_id: Optional[str] = None
+    ) -> None:
+        topology = app_config.get_workspace_topology_config().topology
+        if topology == app_config.WORKSPACE_TOPOLOGY_SHARED:
+            # the child workspaces would have to move to the parent of the new version
+            raise ValueError(f"Rollouts do not support the {topology=}, a workspace cannot change its parent")
+        self.logger = logger.get_logger(SCENARIO)
+        self.dataproduct = dataproduct
+        self.dataproduct_version = dataproduct_version
+        self.from_version = from_version
+        self.tenants = tenants
+        self.canary_tenants = canary_tenants
+        self.options = options or app_config.get_rollout_config()
+        self.rollout_id = rollout_id or instrumentation.new_correlation_id()
+        self.metadata_storage = metadata_storage.MetadataStorage(
+            app_config.get_metadata_storage_config(
+                tenant=None, scenario=SCENARIO, logger=self.logger, dataproduct=dataproduct
+            )
+        )
+
+    def select_tenants(self) -> List[str]:
+        if self.tenants is not None:
+            return list(dict.fromkeys(self.tenants))
+        return self.metadata_storage.get_dataproduct_tenants(
+            dataproduct=self.dataproduct,
+            dataproduct_version=self.dataproduct_version,
+            from_version=self.from_version
+        )
+
+    def order_tenants(self, tenants: List[str]) -> Tuple[List[str], List[str]]:
+        '''
+        Split the tenants into the canaries and the rest, keeping their order
+        '''
+        if self.canary_tenants is not None:
+            canary_set = set(self.canary_tenants)
+            unknown = canary_set - set(tenants)
+            if unknown:
+                self.logger.warning(f"Canary tenants are not rolled out ({unknown=})")
+        else:
+            canary_set = set(tenants[:self.options.canary_count])
+        canaries = [tenant for tenant in tenants if tenant in canary_set]
+        return canaries, [tenant for tenant in tenants if tenant not in canary_set]
+
+    def stop_on_canary_failure(self, results: List[Dict]) -> Optional[str]:
+        failed = sum(1 for result in results if result['status'] == bulk.RESULT_FAILED)
+        return f"{failed} canary tenants failed" if failed else None
+
+    def stop_on_error_rate(self, results: List[Dict]) -> Optional[str]:
+        failed = sum(1 for result in results if result['status'] == bulk.RESULT_FAILED)
+        error_rate = failed / len(results)
+        if failed >= self.options.min_failures and error_rate > self.options.max_error_rate:
+            return f"{failed} of {len(results)} tenants failed ({error_rate=:.3f})"
+        return None
+
+    def _run(self, provisioner: BulkProvisionTenant, tenants: List[str], stop) -> List[Dict]:
+        results = bulk.run_bulk_until(
+            items=tenants,
+            worker=lambda index, tenant: provisioner.provision(self._tenant(tenant)),
+            max_workers=self.options.max_workers,
+            logger=self.logger,
+            stop=stop
+        )
+        return [{'tenant': tenant, **result} for tenant, result in zip(tenants, results)]
+
+    def _tenant(self, tenant: str) -> Dict:
+        return {
+            'dataproduct': self.dataproduct,
+            'dataproduct_version': self.dataproduct_version,
+            'tenant': tenant
+        }
+
+    def main(self) -> Dict:
+        with instrumentation.correlation_scope(self.rollout_id):
+            tenants = self.select_tenants()
+            completed = get_completed_tenants(self.metadata_storage.get_execution_log(self.rollout_id))
+            remaining = [tenant for tenant in tenants if tenant not in completed]
+            canaries, others = self.order_tenants(remaining)
+            self.logger.info(
+                f"Rolling out (rollout_id={self.rollout_id}, dataproduct={self.dataproduct},"
+                f" dataproduct_version={self.dataproduct_version}, tenants={len(tenants)},"
+                f" completed={len(tenants) - len(remaining)}, canaries={len(canaries)})"
+            )
+            provisioner = BulkProvisionTenant(
+                [self._tenant(tenant) for tenant in remaining],
+                max_workers=self.options.max_workers,
+                correlation_id=self.rollout_id
+            )
+            try:
+                provisioner.prefetch_metadata()
+                provisioner.create_user_groups()
+                results = self._run(provisioner, canaries, self.stop_on_canary_failure)
+                if self.stop_on_canary_failure(results) is None:
+                    results += self._run(provisioner, others, self.stop_on_error_rate)
+                else:
+                    results += [
+                        {'tenant': tenant, 'status': bulk.RESULT_NOT_RUN, 'error': 'canary failed'}
+                        for tenant in others
+                    ]
+            finally:
+                execution_log_buffer.flush_all()
+
+        summary = {
+            'rollout_id': self.rollout_id,
+            'dataproduct': self.dataproduct,
+            'dataproduct_version': self.dataproduct_version,
+            'already_completed': len(tenants) - len(remaining),
+            **bulk.summarize(results)
+        }
+        self.logger.info(
+            f"Rollout finished (rollout_id={self.rollout_id}, total={summary['total']},"
+            f" failed={summary['failed']}, not_run={summary.get('not_run', 0)})"
+        )
+        if summary.get('not_run'):
+            # the failed tenants of a finished rollout are in the summary like in bulk provisioning
+            raise RolloutStoppedError(
+                f"rollout_id={self.rollout_id}, succeeded={summary['succeeded']},"
+                f" failed={summary['failed']}, not_run={summary.get('not_run', 0)}",
+                result=summary
+            )
+        return summary
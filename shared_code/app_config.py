@@ -1,11 +1,19 @@
 import os
 from types import SimpleNamespace
-from typing import Dict
+from typing import Any, Callable, Dict, Optional
 
 DATASOURCE_ID_TMPL = "{data_product_id}_{tenant_id}"
 PARENT_WORKSPACE_ID_TMPL = "{data_product_id}_{tenant_id}_parent"
 CHILD_WORKSPACE_ID_TMPL = "{data_product_id}_{tenant_id}_child"
 USERGROUP_ID_TMPL = "{data_product_id}_{tenant_id}_{usergroup}"
+# the shared workspace topology deploys one parent workspace and datasource per dataproduct version
+SHARED_PARENT_WORKSPACE_ID_TMPL = "{data_product_id}_{data_product_version}_parent"
+SHARED_DATASOURCE_ID_TMPL = "{data_product_id}_{data_product_version}"
+WORKSPACE_DATA_FILTER_ID_TMPL = "{parent_workspace_id}_{column_name}"
+
+WORKSPACE_TOPOLOGY_TENANT = 'tenant'
+WORKSPACE_TOPOLOGY_SHARED = 'shared'
+WORKSPACE_TOPOLOGIES = (WORKSPACE_TOPOLOGY_TENANT, WORKSPACE_TOPOLOGY_SHARED)
 
 REQUIRED_ENVIRON_METADATA_STORAGE = {
     'metadata_storage_host': 'host',
@@ -24,6 +32,74 @@ REQUIRED_ENVIRON_DATAPRODUCT_REPOSITORY = {
     'dataproduct_repository_connection_string': 'connection_string'
 }
 
+OPTIONAL_ENVIRON_METADATA_STORAGE = {
+    'metadata_storage_log_buffer_size': ('log_buffer_size', 100, int),
+    'metadata_storage_log_buffer_max_entries': ('log_buffer_max_entries', 10000, int),
+    'metadata_storage_log_flush_interval_seconds': ('log_flush_interval_seconds', 2, float)
+}
+OPTIONAL_ENVIRON_METADATA_STORAGE_POOL = {
+    'metadata_storage_pool_min_size': ('min_size', 1, int),
+    'metadata_storage_pool_max_size': ('max_size', 10, int),
+    'metadata_storage_pool_max_idle_seconds': ('max_idle_seconds', 300, float),
+    'metadata_storage_pool_health_check_after_seconds': ('health_check_after_seconds', 30, float),
+    'metadata_storage_pool_timeout_seconds': ('timeout_seconds', 30, float)
+}
+
+OPTIONAL_ENVIRON_GOODDATA = {
+    'gooddata_http_pool_size': ('http_pool_size', 32, int)
+}
+# client-side limits of the requests per host, the concurrency adapts between min and max
+# and the requests are paced to rate per second, burst of them may be sent at once
+OPTIONAL_ENVIRON_GOODDATA_THROTTLING = {
+    'gooddata_throttle_rate': ('rate', 100.0, float),
+    'gooddata_throttle_burst': ('burst', 100, int),
+    'gooddata_throttle_max_concurrency': ('max_concurrency', 32, int),
+    'gooddata_throttle_min_concurrency': ('min_concurrency', 2, int),
+    'gooddata_throttle_max_attempts': ('max_attempts', 5, int),
+    'gooddata_throttle_backoff_base_seconds': ('backoff_base_seconds', 0.5, float),
+    'gooddata_throttle_backoff_max_seconds': ('backoff_max_seconds', 30.0, float)
+}
+OPTIONAL_ENVIRON_DATAPRODUCT_REPOSITORY = {
+    'dataproduct_repository_max_workers': ('max_workers', 8, int),
+    'dataproduct_cache_dir': ('cache_dir', None, str),
+    'dataproduct_cache_max_size_mb': ('cache_max_size_mb', 1024, int)
+}
+OPTIONAL_ENVIRON_DATAPRODUCT_REPOSITORY_THROTTLING = {
+    'dataproduct_repository_throttle_rate': ('rate', 1000.0, float),
+    'dataproduct_repository_throttle_burst': ('burst', 200, int),
+    'dataproduct_repository_throttle_max_concurrency': ('max_concurrency', 64, int),
+    'dataproduct_repository_throttle_min_concurrency': ('min_concurrency', 4, int),
+    'dataproduct_repository_throttle_max_attempts': ('max_attempts', 5, int),
+    'dataproduct_repository_throttle_backoff_base_seconds': ('backoff_base_seconds', 0.2, float),
+    'dataproduct_repository_throttle_backoff_max_seconds': ('backoff_max_seconds', 10.0, float)
+}
+
+OPTIONAL_ENVIRON_WORKSPACE_TOPOLOGY = {
+    'workspace_topology': ('topology', WORKSPACE_TOPOLOGY_TENANT, str),
+    'workspace_data_filter_column': ('data_filter_column', 'tenant_id', str)
+}
+
+OPTIONAL_ENVIRON_ROLLOUT = {
+    'rollout_max_workers': ('max_workers', 32, int),
+    'rollout_canary_count': ('canary_count', 1, int),
+    'rollout_max_error_rate': ('max_error_rate', 0.05, float),
+    'rollout_min_failures': ('min_failures', 3, int)
+}
+
+BULK_MAX_WORKERS_ENVIRON = 'bulk_max_workers'
+BULK_MAX_WORKERS_DEFAULT = 8
+STEP_MAX_WORKERS_ENVIRON = 'step_max_workers'
+STEP_MAX_WORKERS_DEFAULT = 4
+JOB_QUEUE_MAX_WORKERS_ENVIRON = 'job_queue_max_workers'
+JOB_QUEUE_MAX_WORKERS_DEFAULT = 4
+# the caches are shared by every tenant of the process, they are sized once when it starts
+METADATA_CACHE_TTL_SECONDS_ENVIRON = 'metadata_storage_cache_ttl_seconds'
+METADATA_CACHE_TTL_SECONDS_DEFAULT = 60
+MODEL_CACHE_SIZE_ENVIRON = 'gooddata_model_cache_size'
+MODEL_CACHE_SIZE_DEFAULT = 16
+# optional, e.g. "tenants/{data_product_id}/{tenant_id}", the tenant's blobs under it are deleted with the tenant
+TENANT_ARTIFACTS_PATH_TMPL_ENVIRON = 'tenant_artifacts_path_tmpl'
+
 def get_child_workspace_id(data_product_id: str, tenant_id: str) -> str:
     return CHILD_WORKSPACE_ID_TMPL.format(
         data_product_id=data_product_id,
@@ -48,19 +124,82 @@ def get_usergroup_id(data_product_id: str, tenant_id: str, usergroup: str) -> st
         tenant_id=tenant_id,usergroup=usergroup
     )
 
+def get_shared_parent_workspace_id(data_product_id: str, data_product_version: str) -> str:
+    return SHARED_PARENT_WORKSPACE_ID_TMPL.format(
+        data_product_id=data_product_id,
+        data_product_version=data_product_version
+    )
+
+def get_shared_datasource_id(data_product_id: str, data_product_version: str) -> str:
+    return SHARED_DATASOURCE_ID_TMPL.format(
+        data_product_id=data_product_id,
+        data_product_version=data_product_version
+    )
+
+def get_workspace_data_filter_id(parent_workspace_id: str, column_name: str) -> str:
+    return WORKSPACE_DATA_FILTER_ID_TMPL.format(
+        parent_workspace_id=parent_workspace_id,
+        column_name=column_name
+    )
+
+def get_tenant_artifacts_path(data_product_id: str, tenant_id: str) -> Optional[str]:
+    tmpl = os.getenv(TENANT_ARTIFACTS_PATH_TMPL_ENVIRON)
+    if not tmpl:
+        return None
+    return tmpl.format(data_product_id=data_product_id, tenant_id=tenant_id)
+
 def get_environ_in_local_names(translatin_map: Dict) -> SimpleNamespace:
     local_environ = {}
     for external_name, internal_name in translatin_map.items():
         local_environ[internal_name] = os.getenv(external_name)
     return SimpleNamespace(**local_environ)
 
-def get_metadata_storage_config(tenant: str, scenario: str, logger) -> SimpleNamespace:
+def get_optional_environ_in_local_names(translation_map: Dict) -> SimpleNamespace:
+    local_environ = {}
+    for external_name, (internal_name, default, cast) in translation_map.items():
+        local_environ[internal_name] = get_optional_environ(external_name, default, cast)
+    return SimpleNamespace(**local_environ)
+
+def get_optional_environ(name: str, default: Any, cast: Callable = str) -> Any:
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return cast(value)
+
+def get_bulk_max_workers() -> int:
+    return get_optional_environ(BULK_MAX_WORKERS_ENVIRON, BULK_MAX_WORKERS_DEFAULT, int)
+
+def get_step_max_workers() -> int:
+    return get_optional_environ(STEP_MAX_WORKERS_ENVIRON, STEP_MAX_WORKERS_DEFAULT, int)
+
+def get_job_queue_max_workers() -> int:
+    return get_optional_environ(JOB_QUEUE_MAX_WORKERS_ENVIRON, JOB_QUEUE_MAX_WORKERS_DEFAULT, int)
+
+def get_metadata_cache_ttl_seconds() -> float:
+    return get_optional_environ(METADATA_CACHE_TTL_SECONDS_ENVIRON, METADATA_CACHE_TTL_SECONDS_DEFAULT, float)
+
+def get_model_cache_size() -> int:
+    return get_optional_environ(MODEL_CACHE_SIZE_ENVIRON, MODEL_CACHE_SIZE_DEFAULT, int)
+
+def get_workspace_topology_config() -> SimpleNamespace:
+    return get_optional_environ_in_local_names(OPTIONAL_ENVIRON_WORKSPACE_TOPOLOGY)
+
+def get_rollout_config() -> SimpleNamespace:
+    return get_optional_environ_in_local_names(OPTIONAL_ENVIRON_ROLLOUT)
+
+def get_metadata_storage_config(
+    tenant: str, scenario: str, logger, dataproduct: str = None, force: bool = False
+) -> SimpleNamespace:
     cnf = SimpleNamespace()
     cnf.db_config = get_environ_in_local_names(REQUIRED_ENVIRON_METADATA_STORAGE)
     public_params = ['host','port','user','db_name','schema']
     cnf.db_config_masked =  {k:v for k,v in cnf.db_config.__dict__.items() if k in public_params}
+    cnf.pool_config = get_optional_environ_in_local_names(OPTIONAL_ENVIRON_METADATA_STORAGE_POOL)
+    cnf.options = get_optional_environ_in_local_names(OPTIONAL_ENVIRON_METADATA_STORAGE)
     cnf.tenant = tenant
+    cnf.dataproduct = dataproduct
     cnf.scenario = scenario
+    cnf.force = force
     cnf.logger = logger
     return cnf
 
@@ -69,6 +208,8 @@ def get_gooddata_config(logger) -> SimpleNamespace:
     cnf.config = get_environ_in_local_names(REQUIRED_ENVIRON_GOODDATA)
     public_params = ['host']
     cnf.config_masked =  {k:v for k,v in cnf.config.__dict__.items() if k in public_params}
+    cnf.options = get_optional_environ_in_local_names(OPTIONAL_ENVIRON_GOODDATA)
+    cnf.throttling = get_optional_environ_in_local_names(OPTIONAL_ENVIRON_GOODDATA_THROTTLING)
     cnf.logger = logger
     return cnf
 
@@ -77,5 +218,7 @@ def get_dataproduct_repository_config(logger) -> SimpleNamespace:
     cnf.config = get_environ_in_local_names(REQUIRED_ENVIRON_DATAPRODUCT_REPOSITORY)
     public_params = ['container_name']
     cnf.config_masked =  {k:v for k,v in cnf.config.__dict__.items() if k in public_params}
+    cnf.options = get_optional_environ_in_local_names(OPTIONAL_ENVIRON_DATAPRODUCT_REPOSITORY)
+    cnf.throttling = get_optional_environ_in_local_names(OPTIONAL_ENVIRON_DATAPRODUCT_REPOSITORY_THROTTLING)
     cnf.logger = logger
     return cnf
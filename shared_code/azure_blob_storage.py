@@ -1,52 +1,271 @@
+import hashlib
+import io
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import Logger
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
-from azure.storage.blob import BlobServiceClient
+from shared_code import instrumentation, throttling
+from shared_code.exceptions import BlobBatchDeleteError, BlobDownloadError, BlobUploadError
+
+# upper bound of the data held in memory per downloaded blob
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# larger files are uploaded as blocks of UPLOAD_BLOCK_SIZE, up to max_block_concurrency at a time
+UPLOAD_SINGLE_PUT_SIZE = 8 * 1024 * 1024
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+MD5_READ_SIZE = 1024 * 1024
+# the blob batch API accepts at most 256 sub-requests
+DELETE_BATCH_SIZE = 256
+# the statuses of a deleted sub-request, a blob which is gone already counts as deleted
+DELETED_STATUSES = (202, 404)
+DEFAULT_MAX_WORKERS = 8
+# well below the 20000 requests per second of a storage account, which is shared by
+# the instances, a 503 ServerBusy also lowers the concurrency
+DEFAULT_THROTTLING_OPTIONS = SimpleNamespace(
+    rate=1000.0,
+    burst=200,
+    max_concurrency=64,
+    min_concurrency=4,
+    max_attempts=5,
+    backoff_base_seconds=0.2,
+    backoff_max_seconds=10.0
+)
+
+T = TypeVar('T')
+
+
+def _as_dir(path: str) -> str:
+    return path if path == '' or path.endswith('/') else path + '/'
+
+
+def get_file_md5(path: str) -> bytes:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(MD5_READ_SIZE), b''):
+            md5.update(chunk)
+    return md5.digest()
+
+
+class ChunkReader(io.RawIOBase):
+    '''
+    Read-only file object over the chunks of a blob download, one chunk is held at a time
+    '''
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b'')
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._offset >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk, self._offset = memoryview(chunk), 0
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+
+class BlobIndex:
+    '''
+    Prefix tree of the blobs listed under a root path, every node is a directory
+    holding its subdirectories and the properties of its files
+    '''
+    def __init__(self, root: str, blobs: Iterable[Any]):
+        self.root = _as_dir(root)
+        self._tree = self._new_node()
+        for blob in blobs:
+            node = self._tree
+            *dirs, name = blob.name[len(self.root):].split('/')
+            for directory in dirs:
+                node = node['dirs'].setdefault(directory, self._new_node())
+            node['files'][name] = blob
+
+    @staticmethod
+    def _new_node() -> Dict:
+        return {'dirs': {}, 'files': {}}
+
+    def _node(self, path: str) -> Optional[Dict]:
+        path = _as_dir(path)
+        if not path.startswith(self.root):
+            raise ValueError(f"{path=} is outside of the indexed {self.root=}")
+        node = self._tree
+        for directory in filter(None, path[len(self.root):].split('/')):
+            node = node['dirs'].get(directory)
+            if node is None:
+                return None
+        return node
+
+    def _walk(self, node: Dict, relative_dir: str) -> Iterator[Tuple[str, Dict]]:
+        yield relative_dir, node
+        for name, child in node['dirs'].items():
+            yield from self._walk(child, f"{relative_dir}{name}/")
+
+    def files(self, path: str, recursive: bool = False) -> List[str]:
+        node = self._node(path)
+        if node is None:
+            return []
+        if not recursive:
+            return list(node['files'])
+        return [
+            relative_dir + name
+            for relative_dir, child in self._walk(node, '')
+            for name in child['files']
+        ]
+
+    def dirs(self, path: str, recursive: bool = False) -> List[str]:
+        node = self._node(path)
+        if node is None:
+            return []
+        if not recursive:
+            return list(node['dirs'])
+        return [relative_dir.rstrip('/') for relative_dir, _ in self._walk(node, '')][1:]
+
+    def blobs(self, path: str) -> List[Any]:
+        node = self._node(path)
+        if node is None:
+            return []
+        return [blob for _, child in self._walk(node, '') for blob in child['files'].values()]
 
 
 class DirectoryClient:
-    def __init__(self, connection_string: str, container_name: str):
-        service_client = BlobServiceClient.from_connection_string(connection_string)
+    def __init__(
+        self,
+        connection_string: str,
+        container_name: str,
+        logger: Optional[Logger] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        throttling_options: Optional[SimpleNamespace] = None
+    ):
+        # imported on first use, azure.storage.blob is slow to import on a cold start
+        from azure.storage.blob import BlobServiceClient
+
+        service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            max_single_get_size=DOWNLOAD_CHUNK_SIZE,
+            max_chunk_get_size=DOWNLOAD_CHUNK_SIZE,
+            max_single_put_size=UPLOAD_SINGLE_PUT_SIZE,
+            max_block_size=UPLOAD_BLOCK_SIZE,
+            # the requests are retried by the throttle of the account host, see throttling.py
+            retry_total=0
+        )
         self.client = service_client.get_container_client(container_name)
+        self.throttle = throttling.get_throttle(
+            service_client.primary_hostname, throttling_options or DEFAULT_THROTTLING_OPTIONS
+        )
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_workers = max_workers
 
-    def upload(self, source, dest):
+    def upload(self, source, dest, max_workers=None):
         '''
         Upload a file or directory to a path inside the container
         '''
         if (os.path.isdir(source)):
-            self.upload_dir(source, dest)
-        else:
-            self.upload_file(source, dest)
+            return self.upload_dir(source, dest, max_workers=max_workers)
+        return self.upload_file(source, dest)
 
-    def upload_file(self, source, dest):
+    @instrumentation.timed('blob.upload')
+    @throttling.throttled(idempotent=lambda self, source, dest, overwrite=False, *args, **kwargs: overwrite)
+    def upload_file(self, source, dest, overwrite=False, content_md5=None, max_block_concurrency=1):
         '''
-        Upload a single file to a path inside the container
+        Upload a single file to a path inside the container, files larger than
+        UPLOAD_SINGLE_PUT_SIZE are sent as blocks of UPLOAD_BLOCK_SIZE
         '''
-        print(f'Uploading {source} to {dest}')
+        from azure.storage.blob import ContentSettings
+
+        self.logger.info(f'Uploading {source} to {dest}')
+        # the content md5 of a blob uploaded in blocks is only known when it is set explicitly
+        content_settings = ContentSettings(content_md5=content_md5) if content_md5 else None
         with open(source, 'rb') as data:
-            self.client.upload_blob(name=dest, data=data)
+            self.client.upload_blob(
+                name=dest,
+                data=data,
+                overwrite=overwrite,
+                content_settings=content_settings,
+                max_concurrency=max_block_concurrency
+            )
 
-    def upload_dir(self, source, dest):
+    def upload_dir(self, source, dest, max_workers=None, skip_unchanged=True):
         '''
         Upload a directory to a path inside the container
         '''
         prefix = '' if dest == '' else dest + '/'
         prefix += os.path.basename(source) + '/'
-        for root, dirs, files in os.walk(source):
-            for name in files:
+        files = []
+        for root, dirs, names in os.walk(source):
+            for name in names:
                 dir_part = os.path.relpath(root, source)
                 dir_part = '' if dir_part == '.' else dir_part + '/'
-                file_path = os.path.join(root, name)
-                blob_path = prefix + dir_part + name
-                self.upload_file(file_path, blob_path)
+                files.append((os.path.join(root, name), prefix + dir_part + name))
+        index = self.index(prefix) if skip_unchanged else None
+        return self.upload_files(files, max_workers=max_workers, index=index)
 
-    def download(self, source, dest):
+    def upload_files(self, files: List[Tuple[str, str]], max_workers=None, index=None):
+        '''
+        Upload (source, dest) pairs concurrently and overwrite the existing blobs. With an index
+        of the destination, a file whose md5 matches the content_md5 of its blob is skipped.
+        All files are attempted before the failed ones are reported, returns a summary.
         '''
-        Download a file or directory to a path on the local filesystem
+        existing = {}
+        if index is not None:
+            existing = {blob.name: blob for blob in index.blobs(index.root)}
+        max_workers = max(1, min(max_workers or self.max_workers, len(files) or 1))
+        summary = {
+            'files': len(files), 'uploaded': 0, 'skipped': 0, 'failed': 0,
+            'bytes_sent': 0, 'bytes_skipped': 0
+        }
+        failed = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                instrumentation.submit(executor, self._upload_if_changed, source, dest, existing.get(dest)): source
+                for source, dest in files
+            }
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    uploaded, size = future.result()
+                except Exception as ex:
+                    self.logger.error(f'Uploading {source} failed: {ex.__class__.__name__}: {ex}')
+                    failed.append(source)
+                    continue
+                if uploaded:
+                    summary['uploaded'] += 1
+                    summary['bytes_sent'] += size
+                else:
+                    summary['skipped'] += 1
+                    summary['bytes_skipped'] += size
+        summary['failed'] = len(failed)
+        self.logger.info(f'Uploaded files ({max_workers=}, {summary=})')
+        if failed:
+            raise BlobUploadError(f"{len(failed)} of {len(files)} files failed ({failed=}, {summary=})")
+        return summary
+
+    def _upload_if_changed(self, source, dest, blob):
+        size = os.path.getsize(source)
+        content_md5 = get_file_md5(source)
+        blob_md5 = blob.content_settings.content_md5 if blob is not None else None
+        if blob_md5 is not None and bytes(blob_md5) == content_md5:
+            self.logger.debug(f'Skipping unchanged {source}')
+            return False, size
+        # single files upload their blocks sequentially, the concurrency is across files
+        self.upload_file(source, dest, overwrite=True, content_md5=content_md5)
+        return True, size
+
+    def download(self, source, dest, max_workers=None, index=None):
+        '''
+        Download a file or directory to a path on the local filesystem,
+        the files of a directory are downloaded concurrently by max_workers threads
         '''
         if not dest:
             raise Exception('A destination must be provided')
 
-        blobs = self.ls_files(source, recursive=True)
+        blobs = self.ls_files(source, recursive=True, index=index)
         if blobs:
             # if source is a directory, dest must also be a directory
             if not source == '' and not source.endswith('/'):
@@ -57,59 +276,132 @@ class DirectoryClient:
             dest += os.path.basename(os.path.normpath(source)) + '/'
 
             blobs = [source + blob for blob in blobs]
-            for blob in blobs:
-                blob_dest = dest + os.path.relpath(blob, source)
-                self.download_file(blob, blob_dest)
+            files = [(blob, dest + os.path.relpath(blob, source)) for blob in blobs]
+            self.download_files(files, max_workers=max_workers)
         else:
             self.download_file(source, dest)
 
+    def download_files(self, files: List[Tuple[str, str]], max_workers=None):
+        '''
+        Download (source, dest) pairs concurrently, all files are attempted
+        before the failed ones are reported
+        '''
+        max_workers = max(1, min(max_workers or self.max_workers, len(files)))
+        failed = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                instrumentation.submit(executor, self.download_file, source, dest): source
+                for source, dest in files
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                source = futures[future]
+                try:
+                    future.result()
+                except Exception as ex:
+                    self.logger.error(f'Downloading {source} failed: {ex.__class__.__name__}: {ex}')
+                    failed.append(source)
+                self.logger.debug(f'Downloaded {done}/{len(files)} files')
+        self.logger.info(f'Downloaded {len(files) - len(failed)}/{len(files)} files ({max_workers=})')
+        if failed:
+            raise BlobDownloadError(f"{len(failed)} of {len(files)} files failed ({failed=})")
+
+    @instrumentation.timed('blob.download')
+    @throttling.throttled()
     def download_file(self, source, dest):
         '''
-        Download a single file to a path on the local filesystem
+        Download a single file to a path on the local filesystem,
+        the content is streamed to the file in chunks
         '''
         # dest is a directory if ending with '/' or '.', otherwise it's a file
         if dest.endswith('.'):
             dest += '/'
         blob_dest = dest + os.path.basename(source) if dest.endswith('/') else dest
 
-        print(f'Downloading {source} to {blob_dest}')
+        self.logger.debug(f'Downloading {source} to {blob_dest}')
         os.makedirs(os.path.dirname(blob_dest), exist_ok=True)
         bc = self.client.get_blob_client(blob=source)
-        if not dest.endswith('/'):
-            with open(blob_dest, 'wb') as file:
-                data = bc.download_blob()
-                file.write(data.readall())
+        with open(blob_dest, 'wb') as file:
+            bc.download_blob().readinto(file)
+
+    @instrumentation.timed('blob.download')
+    @throttling.throttled()
+    def download_stream(self, source: str, consume: Callable[[BinaryIO], T]) -> T:
+        '''
+        Download a blob with a single streamed GET and return consume(file object), the content
+        is read in chunks of DOWNLOAD_CHUNK_SIZE. A retry calls consume again from the start.
+        '''
+        self.logger.debug(f'Streaming {source}')
+        bc = self.client.get_blob_client(blob=source)
+        return consume(io.BufferedReader(ChunkReader(bc.download_blob().chunks())))
+
+    @instrumentation.timed('blob.get_properties')
+    @throttling.throttled()
+    def get_properties(self, path):
+        '''
+        Properties of a single blob, None when it does not exist
+        '''
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self.client.get_blob_client(path).get_blob_properties()
+        except ResourceNotFoundError:
+            return None
 
-    def ls_files(self, path, recursive=False):
+    @instrumentation.timed('blob.list')
+    @throttling.throttled()
+    def index(self, path):
+        '''
+        List all blobs under a path once and index them for ls_files, ls_dirs, download and rmdir
+        '''
+        path = _as_dir(path)
+        return BlobIndex(path, self.client.list_blobs(name_starts_with=path))
+
+    @instrumentation.timed('blob.list')
+    @throttling.throttled()
+    def _walk_blobs(self, path):
+        # the items of a single directory level, the listing is paged in by list()
+        return list(self.client.walk_blobs(name_starts_with=path, delimiter='/'))
+
+    def ls_files(self, path, recursive=False, index=None):
         '''
         List files under a path, optionally recursively
         '''
-        if not path == '' and not path.endswith('/'):
-            path += '/'
+        if index is not None:
+            return index.files(path, recursive=recursive)
+        path = _as_dir(path)
+        if not recursive:
+            from azure.storage.blob import BlobPrefix
 
-        blob_iter = self.client.list_blobs(name_starts_with=path)
-        files = []
-        for blob in blob_iter:
-            relative_path = os.path.relpath(blob.name, path)
-            if recursive or not '/' in relative_path:
-                files.append(relative_path)
-        return files
+            return [
+                item.name[len(path):]
+                for item in self._walk_blobs(path)
+                if not isinstance(item, BlobPrefix)
+            ]
+        return self.index(path).files(path, recursive=True)
 
-    def ls_dirs(self, path, recursive=False):
+    def ls_blobs(self, path, index=None):
         '''
-        List directories under a path, optionally recursively
+        List the properties (name, size, etag, last_modified) of all blobs under a path
         '''
-        if not path == '' and not path.endswith('/'):
-            path += '/'
+        index = index or self.index(path)
+        return index.blobs(path)
 
-        blob_iter = self.client.list_blobs(name_starts_with=path)
-        dirs = []
-        for blob in blob_iter:
-            relative_dir = os.path.dirname(os.path.relpath(blob.name, path))
-            if relative_dir and (recursive or not '/' in relative_dir) and not relative_dir in dirs:
-                dirs.append(relative_dir)
+    def ls_dirs(self, path, recursive=False, index=None):
+        '''
+        List directories under a path, optionally recursively
+        '''
+        if index is not None:
+            return index.dirs(path, recursive=recursive)
+        path = _as_dir(path)
+        if not recursive:
+            from azure.storage.blob import BlobPrefix
 
-        return dirs
+            return [
+                item.name[len(path):].rstrip('/')
+                for item in self._walk_blobs(path)
+                if isinstance(item, BlobPrefix)
+            ]
+        return self.index(path).dirs(path, recursive=True)
 
     def rm(self, path, recursive=False):
         '''
@@ -118,19 +410,56 @@ class DirectoryClient:
         if recursive:
             self.rmdir(path)
         else:
-            print(f'Deleting {path}')
-            self.client.delete_blob(path)
+            self.logger.info(f'Deleting {path}')
+            with instrumentation.span('blob.delete'):
+                self.throttle.call(lambda: self.client.delete_blob(path))
 
-    def rmdir(self, path):
+    def rmdir(self, path, index=None, max_workers=None):
         '''
-        Remove a directory and its contents recursively
+        Remove a directory and its contents recursively, the blobs are deleted
+        in batches of DELETE_BATCH_SIZE by max_workers threads
         '''
-        blobs = self.ls_files(path, recursive=True)
+        blobs = self.ls_files(path, recursive=True, index=index)
         if not blobs:
-            return
+            return 0
 
         if not path == '' and not path.endswith('/'):
             path += '/'
         blobs = [path + blob for blob in blobs]
-        print(f'Deleting {", ".join(blobs)}')
-        self.client.delete_blobs(*blobs)
+        batches = [blobs[i:i + DELETE_BATCH_SIZE] for i in range(0, len(blobs), DELETE_BATCH_SIZE)]
+        max_workers = max(1, min(max_workers or self.max_workers, len(batches)))
+        self.logger.info(f'Deleting {len(blobs)} blobs under {path} ({len(batches)} batches, {max_workers=})')
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [instrumentation.submit(executor, self._delete_batch, batch) for batch in batches]
+            for future in futures:
+                future.result()
+        return len(blobs)
+
+    @instrumentation.timed('blob.delete')
+    def _delete_batch(self, blobs):
+        '''
+        Delete a batch of blobs, only the sub-requests which failed are sent again
+        '''
+        remaining = list(blobs)
+
+        def delete_remaining():
+            self.logger.debug(f'Deleting {", ".join(remaining)}')
+            responses = self.client.delete_blobs(*remaining, raise_on_any_failure=False)
+            failed = [
+                (blob, response) for blob, response in zip(remaining, responses)
+                if response.status_code not in DELETED_STATUSES
+            ]
+            remaining[:] = [blob for blob, _ in failed]
+            if failed:
+                # a permanent failure is not retried, otherwise a throttled one sets the backoff
+                blob, response = min(failed, key=lambda item: (
+                    item[1].status_code in throttling.RETRY_STATUSES,
+                    item[1].status_code not in throttling.THROTTLING_STATUSES
+                ))
+                raise BlobBatchDeleteError(
+                    f'Deleting {len(failed)} blobs failed ({blob=}, status={response.status_code})',
+                    status=response.status_code,
+                    headers=response.headers
+                )
+
+        self.throttle.call(delete_remaining)
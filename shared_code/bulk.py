@@ -0,0 +1,138 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import Logger
+from typing import Any, Callable, Dict, List, Optional
+
+from shared_code import instrumentation
+from shared_code.logger import get_traceback
+
+RESULT_OK = 'ok'
+RESULT_FAILED = 'failed'
+RESULT_NOT_RUN = 'not_run'
+# the parameters of every tenant of a bulk request
+TENANT_PARAMS = ('dataproduct', 'dataproduct_version', 'tenant')
+
+
+def _run_item(worker: Callable[[int, Any], Any], index: int, item: Any, logger: Logger) -> Dict:
+    try:
+        worker(index, item)
+    except Exception as ex:
+        logger.error(f"Bulk item failed ({index=}): {get_traceback(ex)}")
+        return {'status': RESULT_FAILED, 'error': f"{ex.__class__.__name__}: {ex}"}
+    return {'status': RESULT_OK, 'error': None}
+
+
+def run_bulk(
+    items: List[Any],
+    worker: Callable[[int, Any], Any],
+    max_workers: int,
+    logger: Logger
+) -> List[Dict]:
+    '''
+    Run worker(index, item) for every item over a bounded thread pool.
+    A failing item is recorded in its result and does not abort the batch.
+    Results are returned in the order of the items.
+    '''
+    max_workers = max(1, min(max_workers, len(items) or 1))
+    logger.info(f"Running bulk ({len(items)} items, {max_workers=})")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            instrumentation.submit(executor, _run_item, worker, index, item, logger)
+            for index, item in enumerate(items)
+        ]
+        return [future.result() for future in futures]
+
+
+def run_bulk_until(
+    items: List[Any],
+    worker: Callable[[int, Any], Any],
+    max_workers: int,
+    logger: Logger,
+    stop: Callable[[List[Dict]], Optional[str]]
+) -> List[Dict]:
+    '''
+    Like run_bulk, but an item is started only when a worker is free, and after every finished
+    item stop(finished results) is asked for a reason to stop. Once stopping, the running items
+    finish and the items not started yet are marked not run.
+    '''
+    max_workers = max(1, min(max_workers, len(items) or 1))
+    logger.info(f"Running bulk ({len(items)} items, {max_workers=})")
+    results: List[Optional[Dict]] = [None] * len(items)
+    finished: List[Dict] = []
+    pending = iter(enumerate(items))
+    reason = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while True:
+            while reason is None and len(running) < max_workers:
+                index, item = next(pending, (None, None))
+                if index is None:
+                    break
+                running[instrumentation.submit(executor, _run_item, worker, index, item, logger)] = index
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+                finished.append(future.result())
+            if reason is None:
+                reason = stop(finished)
+                if reason is not None:
+                    logger.error(f"Stopping bulk ({reason=}, running={len(running)})")
+    return [
+        result if result is not None else {'status': RESULT_NOT_RUN, 'error': reason}
+        for result in results
+    ]
+
+
+def summarize(results: List[Dict]) -> Dict:
+    succeeded = sum(1 for result in results if result['status'] == RESULT_OK)
+    not_run = sum(1 for result in results if result['status'] == RESULT_NOT_RUN)
+    summary = {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded - not_run,
+        'results': results
+    }
+    if not_run:
+        summary['not_run'] = not_run
+    return summary
+
+
+def parse_tenants(body: Any) -> List[Dict]:
+    '''
+    Accept either a list of tenants or {"tenants": [...]} as the bulk request body
+    '''
+    tenants = body.get('tenants') if isinstance(body, dict) else body
+    if not isinstance(tenants, list):
+        raise ValueError('The request body must be a list of tenants or {"tenants": [...]}')
+    return tenants
+
+
+def get_flag(body: Any, name: str, default: bool = False) -> bool:
+    '''
+    Boolean option of the bulk request body (or of one of its tenants),
+    it must be a JSON boolean when given
+    '''
+    value = body.get(name, default) if isinstance(body, dict) else default
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be true or false, got {value!r}")
+    return value
+
+
+def get_max_workers(body: Any) -> Optional[int]:
+    '''
+    max_workers of the bulk request body, a positive JSON integer when given
+    '''
+    value = body.get('max_workers') if isinstance(body, dict) else None
+    if value is None:
+        return None
+    # bool is an int, true is not a number of workers
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"max_workers must be a positive integer, got {value!r}")
+    return value
+
+
+def get_missing_params(tenant: Any) -> List[str]:
+    if not isinstance(tenant, dict):
+        return list(TENANT_PARAMS)
+    return [param for param in TENANT_PARAMS if not tenant.get(param)]
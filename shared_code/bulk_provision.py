@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+from typing import Dict, FrozenSet, List, Optional
+
+from shared_code import (app_config, bulk, execution_log_buffer, fce_config,
+                         logger, metadata_storage)
+from shared_code.bulk import TENANT_PARAMS, get_flag, get_missing_params
+from shared_code.provision_tenant_analytics import ProvisionTenant
+from shared_code.tenant_scenario import get_clients
+
+
+class BulkProvisionTenant:
+    def __init__(
+        self,
+        tenants: List[Dict],
+        max_workers: Optional[int] = None,
+        force: bool = False,
+        correlation_id: Optional[str] = None
+    ) -> None:
+        self.logger = logger.get_logger(fce_config.SCENARIO)
+        self.tenants = tenants
+        self.force = force
+        # shared by the execution_log entries of all tenants of the batch when given
+        self.correlation_id = correlation_id
+        self.max_workers = max_workers or app_config.get_bulk_max_workers()
+        self.clients = get_clients(self.logger)
+        self.created_user_groups: FrozenSet[str] = frozenset()
+
+    def provision(self, tenant: Dict) -> None:
+        missing_params = get_missing_params(tenant)
+        if missing_params:
+            raise ValueError(f"{missing_params=}")
+        args = SimpleNamespace(**{param: tenant[param] for param in TENANT_PARAMS})
+        args.force = get_flag(tenant, 'force', default=self.force)
+        args.correlation_id = self.correlation_id
+        # the execution_log entries of the whole batch are flushed together
+        ProvisionTenant(
+            args,
+            clients=self.clients,
+            flush_execution_log=False,
+            created_user_groups=self.created_user_groups
+        ).main()
+
+    def create_user_groups(self) -> None:
+        '''
+        Create the user groups of the whole batch up front,
+        the create_user_groups step of every tenant then skips them
+        '''
+        user_group_ids = []
+        for tenant in self.tenants:
+            if get_missing_params(tenant):
+                continue
+            fcc_args = SimpleNamespace(**{param: tenant[param] for param in TENANT_PARAMS})
+            user_group_ids.extend(
+                usergroup.id for usergroup in fce_config.FceConfig(fcc_args).default_usergroups
+            )
+        if user_group_ids:
+            try:
+                self.clients.gdata.create_or_update_user_groups(user_group_ids=user_group_ids)
+                self.created_user_groups = frozenset(user_group_ids)
+            except Exception as ex:
+                # every tenant retries its own user groups in its create_user_groups step
+                self.logger.error(f"Batch user group creation failed: {logger.get_traceback(ex)}")
+
+    def prefetch_metadata(self) -> None:
+        '''
+        Read the metadata of the whole batch with one query, the get_metadata
+        step of every tenant then finds its rows in the metadata cache
+        '''
+        keys = [
+            tuple(tenant[param] for param in ('tenant', 'dataproduct', 'dataproduct_version'))
+            for tenant in self.tenants if not get_missing_params(tenant)
+        ]
+        if not keys or self.force:
+            return
+        try:
+            storage = metadata_storage.MetadataStorage(
+                app_config.get_metadata_storage_config(
+                    tenant=None, scenario=fce_config.SCENARIO, logger=self.logger
+                )
+            )
+            storage.fetch_provisioning_metadata(keys)
+        except Exception as ex:
+            # every tenant reads its own metadata in its get_metadata step
+            self.logger.error(f"Batch metadata lookup failed: {logger.get_traceback(ex)}")
+
+    def main(self) -> Dict:
+        self.prefetch_metadata()
+        self.create_user_groups()
+        try:
+            results = bulk.run_bulk(
+                items=self.tenants,
+                worker=lambda index, tenant: self.provision(tenant),
+                max_workers=self.max_workers,
+                logger=self.logger
+            )
+        finally:
+            execution_log_buffer.flush_all()
+        results = [
+            {**{param: tenant.get(param) for param in TENANT_PARAMS}, **result}
+            if isinstance(tenant, dict) else result
+            for tenant, result in zip(self.tenants, results)
+        ]
+        summary = bulk.summarize(results)
+        self.logger.info(
+            f"Bulk provisioning finished (total={summary['total']}, failed={summary['failed']})"
+        )
+        return summary
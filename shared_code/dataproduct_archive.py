@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tarfile
+import zlib
+from typing import BinaryIO, Dict, Tuple
+
+from shared_code.exceptions import DataproductArchiveError
+
+# a packaged dataproduct is stored next to its loose-blob directory:
+#   <storage_path>.tar.gz and <storage_path>.manifest.json
+ARCHIVE_SUFFIX = '.tar.gz'
+MANIFEST_SUFFIX = '.manifest.json'
+ARCHIVE_FORMAT = 1
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_archive_name(storage_path: str) -> str:
+    return storage_path.strip('/') + ARCHIVE_SUFFIX
+
+
+def get_manifest_name(storage_path: str) -> str:
+    return storage_path.strip('/') + MANIFEST_SUFFIX
+
+
+class HashingReader:
+    '''
+    File object reading from raw and hashing everything read, so the archive can be
+    verified against its manifest while it is extracted from the stream
+    '''
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self.sha256.update(data)
+        return data
+
+    def drain(self) -> None:
+        while self.read(COPY_BUFFER_SIZE):
+            pass
+
+
+def build_archive(src_dir: str, archive_path: str) -> Dict:
+    '''
+    Pack the files under src_dir into a tar.gz at archive_path and return its manifest.
+    The archive is reproducible (sorted names, no timestamps or owners), so an unchanged
+    dataproduct packs into the same bytes and its sha256 tells whether to upload it.
+    '''
+    paths = []
+    for root, dirs, names in os.walk(src_dir):
+        dirs.sort()
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            paths.append((os.path.relpath(file_path, src_dir).replace(os.sep, '/'), file_path))
+    size = 0
+    with open(archive_path, 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as compressed:
+            with tarfile.open(fileobj=compressed, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                for name, file_path in paths:
+                    member = tarfile.TarInfo(name)
+                    member.size = os.path.getsize(file_path)
+                    member.mode = 0o644
+                    with open(file_path, 'rb') as file:
+                        tar.addfile(member, file)
+                    size += member.size
+    sha256 = hashlib.sha256()
+    with open(archive_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(COPY_BUFFER_SIZE), b''):
+            sha256.update(chunk)
+    return {
+        'format': ARCHIVE_FORMAT,
+        'sha256': sha256.hexdigest(),
+        'archive_size': os.path.getsize(archive_path),
+        'files': len(paths),
+        'size': size
+    }
+
+
+def _member_path(dest_dir: str, name: str) -> str:
+    parts = name.split('/')
+    if name.startswith('/') or '..' in parts or '\\' in name or ':' in parts[0]:
+        raise DataproductArchiveError(f"Archive member outside of the dataproduct ({name=})")
+    path = os.path.realpath(os.path.join(dest_dir, *filter(None, parts)))
+    if os.path.commonpath([dest_dir, path]) != dest_dir or path == dest_dir:
+        raise DataproductArchiveError(f"Archive member outside of the dataproduct ({name=})")
+    return path
+
+
+def extract_archive(stream: BinaryIO, dest_dir: str, manifest: Dict) -> Tuple[int, int]:
+    '''
+    Extract a packaged dataproduct from a stream into dest_dir in a single pass, the archive
+    is never held in memory or on disk. Only regular files and directories are accepted, their
+    paths must stay inside dest_dir, and the archive must match the sha256, the file count and
+    the size of its manifest. Returns (size, files) of the extracted content.
+    '''
+    if manifest.get('format') != ARCHIVE_FORMAT:
+        raise DataproductArchiveError(f"Unsupported dataproduct archive (format={manifest.get('format')})")
+    dest_dir = os.path.realpath(dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
+    reader = HashingReader(stream)
+    size = files = 0
+    try:
+        with tarfile.open(fileobj=reader, mode='r|gz') as tar:
+            for member in tar:
+                path = _member_path(dest_dir, member.name)
+                if member.isdir():
+                    os.makedirs(path, exist_ok=True)
+                    continue
+                if not member.isfile():
+                    raise DataproductArchiveError(f"Unsupported archive member ({member.name=}, {member.type=})")
+                size += member.size
+                files += 1
+                # the manifest bounds the extracted size, a corrupt or hostile archive cannot fill the disk
+                if size > manifest['size'] or files > manifest['files']:
+                    raise DataproductArchiveError(f"The archive is larger than its manifest ({size=}, {files=})")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as file:
+                    shutil.copyfileobj(tar.extractfile(member), file, COPY_BUFFER_SIZE)
+        reader.drain()
+    except (tarfile.TarError, EOFError, gzip.BadGzipFile, zlib.error) as ex:
+        raise DataproductArchiveError(f"Corrupt dataproduct archive: {ex.__class__.__name__}: {ex}") from ex
+    if reader.sha256.hexdigest() != manifest['sha256'] or (size, files) != (manifest['size'], manifest['files']):
+        raise DataproductArchiveError(
+            f"The archive does not match its manifest (sha256={reader.sha256.hexdigest()},"
+            f" {size=}, {files=}, {manifest=})"
+        )
+    return size, files
+
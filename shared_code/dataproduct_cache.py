@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from logging import Logger
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MANIFEST_FILE_NAME = '.manifest.json'
+TMP_PREFIX = '.tmp-'
+TRASH_PREFIX = '.trash-'
+# entries used recently are never evicted, other processes may still be reading them
+EVICTION_GRACE_SECONDS = 600
+
+_KEY_LOCKS: Dict[str, threading.Lock] = {}
+_KEY_LOCKS_LOCK = threading.Lock()
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _KEY_LOCKS_LOCK:
+        return _KEY_LOCKS.setdefault(key, threading.Lock())
+
+
+def get_fingerprint(blobs: List[Any], prefix: str) -> str:
+    '''
+    Fingerprint of a blob listing, it changes whenever any blob is added, removed or modified
+    '''
+    digest = hashlib.sha256()
+    for blob in sorted(blobs, key=lambda b: b.name):
+        last_modified = blob.last_modified.isoformat() if blob.last_modified else ''
+        digest.update(
+            f"{blob.name[len(prefix):]}\0{blob.etag}\0{last_modified}\0{blob.size}\n".encode('utf-8')
+        )
+    return digest.hexdigest()
+
+
+class DataproductCache:
+    '''
+    Local directory cache of declarative dataproducts shared by all invocations on a worker.
+    Every entry is immutable and lives in <cache_dir>/<storage path key>/<listing fingerprint>,
+    so a changed dataproduct gets a new entry and the stale one ages out of the LRU.
+    '''
+    def __init__(self, cache_dir: str, max_size_bytes: int, logger: Logger) -> None:
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.logger = logger
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, storage_path: str, fingerprint: str) -> str:
+        key = hashlib.sha256(storage_path.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.cache_dir, key, fingerprint)
+
+    def get(
+        self,
+        storage_path: str,
+        blobs: List[Any],
+        populate: Callable[[List[Tuple[str, str]]], None]
+    ) -> SimpleNamespace:
+        '''
+        Return the cache entry for the listed blobs of storage_path, populate(files) is called
+        with (blob name, local path) pairs to download the blobs on a cache miss
+        '''
+        prefix = storage_path.strip('/') + '/'
+
+        def fill(entry_path: str) -> Tuple[int, int]:
+            populate([(blob.name, os.path.join(entry_path, blob.name[len(prefix):])) for blob in blobs])
+            return sum(blob.size or 0 for blob in blobs), len(blobs)
+        return self._get(storage_path, get_fingerprint(blobs, prefix), fill)
+
+    def get_packaged(
+        self,
+        storage_path: str,
+        manifest: Any,
+        extract: Callable[[str], Tuple[int, int]]
+    ) -> SimpleNamespace:
+        '''
+        Return the cache entry for the manifest blob of a packaged dataproduct,
+        extract(entry path) unpacks the archive on a cache miss and returns its (size, files)
+        '''
+        return self._get(storage_path, get_fingerprint([manifest], ''), extract)
+
+    def _get(
+        self, storage_path: str, fingerprint: str, fill: Callable[[str], Tuple[int, int]]
+    ) -> SimpleNamespace:
+        entry_path = self._entry_path(storage_path, fingerprint)
+        with _key_lock(os.path.dirname(entry_path)):
+            if self._is_valid(entry_path):
+                self.logger.info(f"Dataproduct cache hit ({storage_path=}, {fingerprint=})")
+                os.utime(os.path.join(entry_path, MANIFEST_FILE_NAME))
+            else:
+                self.logger.info(f"Dataproduct cache miss ({storage_path=}, {fingerprint=})")
+                self._populate(storage_path, fingerprint, entry_path, fill)
+        self.evict(keep=entry_path)
+        return SimpleNamespace(path=entry_path, fingerprint=fingerprint)
+
+    def _is_valid(self, entry_path: str) -> bool:
+        return os.path.isfile(os.path.join(entry_path, MANIFEST_FILE_NAME))
+
+    def _populate(
+        self,
+        storage_path: str,
+        fingerprint: str,
+        entry_path: str,
+        fill: Callable[[str], Tuple[int, int]]
+    ) -> None:
+        parent_dir = os.path.dirname(entry_path)
+        os.makedirs(parent_dir, exist_ok=True)
+        tmp_path = os.path.join(parent_dir, f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp_path)
+            size, files = fill(tmp_path)
+            manifest = {
+                'storage_path': storage_path,
+                'fingerprint': fingerprint,
+                'size': size,
+                'files': files
+            }
+            with open(os.path.join(tmp_path, MANIFEST_FILE_NAME), 'w', encoding='utf-8') as file:
+                json.dump(manifest, file)
+            try:
+                os.rename(tmp_path, entry_path)
+            except OSError:
+                # another process has published the same entry in the meantime
+                if not self._is_valid(entry_path):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            key_dir = os.path.join(self.cache_dir, key)
+            if not os.path.isdir(key_dir):
+                continue
+            for fingerprint in os.listdir(key_dir):
+                if fingerprint.startswith((TMP_PREFIX, TRASH_PREFIX)):
+                    self._remove_abandoned(os.path.join(key_dir, fingerprint))
+                    continue
+                manifest_file = os.path.join(key_dir, fingerprint, MANIFEST_FILE_NAME)
+                try:
+                    with open(manifest_file, encoding='utf-8') as file:
+                        size = json.load(file)['size']
+                    last_used = os.path.getmtime(manifest_file)
+                except (OSError, ValueError, KeyError):
+                    continue
+                entries.append((last_used, size, os.path.join(key_dir, fingerprint)))
+        return entries
+
+    def _remove_abandoned(self, path: str) -> None:
+        # leftovers of a crashed population or eviction
+        try:
+            if time.time() - os.path.getmtime(path) > EVICTION_GRACE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        '''
+        Remove the least recently used entries until the cache fits into max_size_bytes
+        '''
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        now = time.time()
+        for last_used, size, entry_path in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if entry_path == keep or now - last_used < EVICTION_GRACE_SECONDS:
+                continue
+            self.logger.info(f"Evicting dataproduct cache entry ({entry_path=}, {size=})")
+            trash_path = os.path.join(
+                os.path.dirname(entry_path), f"{TRASH_PREFIX}{uuid.uuid4().hex}"
+            )
+            try:
+                os.rename(entry_path, trash_path)
+            except OSError:
+                continue
+            shutil.rmtree(trash_path, ignore_errors=True)
+            total_size -= size
@@ -1,7 +1,15 @@
-from pathlib import Path
+import json
+import os
+import tempfile
 from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
 
+from shared_code import dataproduct_archive
 from shared_code.azure_blob_storage import DirectoryClient
+from shared_code.dataproduct_cache import DataproductCache
+from shared_code.exceptions import DataproductNotFoundError
+
+CACHE_DIR_NAME = 'dataproduct_cache'
 
 
 class DataproductRepository:
@@ -9,18 +17,82 @@ class DataproductRepository:
         self.logger = config.logger
         self._client = self._get_client(
             config=config.config,
-            masked_config=config.config_masked
+            masked_config=config.config_masked,
+            options=config.options,
+            throttling=config.throttling
+        )
+        self._cache = DataproductCache(
+            cache_dir=config.options.cache_dir or os.path.join(tempfile.gettempdir(), CACHE_DIR_NAME),
+            max_size_bytes=config.options.cache_max_size_mb * 1024 * 1024,
+            logger=self.logger
         )
 
-    def _get_client(self, config: SimpleNamespace, masked_config: str) -> DirectoryClient:
+    def _get_client(
+        self,
+        config: SimpleNamespace,
+        masked_config: str,
+        options: SimpleNamespace,
+        throttling: SimpleNamespace
+    ) -> DirectoryClient:
         self.logger.info(f"Connecting to dataproduct_repository {masked_config}")
         return DirectoryClient(connection_string=config.connection_string,
-                               container_name=config.container_name)
+                               container_name=config.container_name,
+                               logger=self.logger,
+                               max_workers=options.max_workers,
+                               throttling_options=throttling)
+
+    def _extract_archive(
+        self, storage_path: str, dest_path: str, manifest: Optional[Dict] = None
+    ) -> Tuple[int, int]:
+        if manifest is None:
+            manifest = self._client.download_stream(
+                dataproduct_archive.get_manifest_name(storage_path), json.load
+            )
+        self.logger.info(f"Extracting dataproduct archive ({storage_path=}, {manifest=})")
+        return self._client.download_stream(
+            dataproduct_archive.get_archive_name(storage_path),
+            lambda stream: dataproduct_archive.extract_archive(stream, dest_path, manifest)
+        )
 
-    def get_declarative_dataproduct(self, storage_path: str, dest_path: str) -> None:
-        dest = Path(dest_path)
-        dirs = self._client.ls_dirs(path=storage_path, recursive=True)
-        subdirs = set(map(lambda relpath: relpath.split('/')[0], dirs))
+    def get_cached_dataproduct(self, storage_path: str) -> SimpleNamespace:
+        '''
+        Return the local cache entry (path, fingerprint) of the dataproduct, the blobs are
+        looked up once to validate the entry and downloaded only when they have changed.
+        A packaged dataproduct (an archive with its manifest) is validated by one request
+        and streamed and extracted on a miss, otherwise every loose blob is downloaded.
+        '''
+        storage_path = storage_path.strip('/')
         self.logger.info(f"Getting dataproduct from dataproduct_repository ({storage_path=})")
-        for directory in subdirs:
-            self._client.download(source=f"{storage_path}/{directory}", dest=str(dest))
+        # the manifest holds the sha256 of the archive and is uploaded after it, so its properties
+        # alone identify the archive. It is a sibling of the directory looked up by name, the lookup
+        # does not include other paths sharing the prefix (e.g. v10 of v1)
+        manifest = self._client.get_properties(dataproduct_archive.get_manifest_name(storage_path))
+        if manifest is not None:
+            return self._cache.get_packaged(
+                storage_path,
+                manifest,
+                extract=lambda entry_path: self._extract_archive(storage_path, entry_path)
+            )
+        blobs = self._client.index(storage_path).blobs(storage_path)
+        if not blobs:
+            raise DataproductNotFoundError(f"{storage_path=}")
+        return self._cache.get(storage_path, blobs, populate=self._client.download_files)
+
+    def delete(self, storage_path: str) -> int:
+        '''
+        Delete all blobs under storage_path and its archive, returns the number of deleted blobs
+        '''
+        storage_path = storage_path.strip('/')
+        self.logger.info(f"Deleting from dataproduct_repository ({storage_path=})")
+        # the manifest goes first, a reader never finds it without its archive
+        packaged = [
+            name for name in (
+                dataproduct_archive.get_manifest_name(storage_path),
+                dataproduct_archive.get_archive_name(storage_path)
+            )
+            if self._client.get_properties(name) is not None
+        ]
+        for name in packaged:
+            self._client.rm(name)
+        return self._client.rmdir(storage_path) + len(packaged)
+
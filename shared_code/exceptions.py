@@ -1,8 +1,58 @@
+from typing import Any, Optional
+
+
 class NotFoundInMetadataStorageError(Exception):
     """The metadata_storage query did not return any data"""
 
 class UnknownWorkspaceTypeError(Exception):
     """Unknown Workspace Type"""
 
+class UnknownWorkspaceTopologyError(Exception):
+    """Unknown Workspace Topology"""
+
 class MissingEnvironmentVariablesError(Exception):
     """Missing Environment Variables Detected"""
+
+class ConnectionPoolExhaustedError(Exception):
+    """No Connection Available In The Connection Pool"""
+
+class InvalidStepGraphError(Exception):
+    """Invalid Step Dependency Graph"""
+
+class BlobDownloadError(Exception):
+    """Downloading Blobs From The Container Failed"""
+
+class DataproductNotFoundError(Exception):
+    """The Dataproduct Was Not Found In The Dataproduct Repository"""
+
+class DataproductArchiveError(Exception):
+    """The Dataproduct Archive Is Invalid Or Does Not Match Its Manifest"""
+
+class InvalidFceConfigError(Exception):
+    """Invalid Function Configuration File"""
+
+class CopyAbortedError(Exception):
+    """The COPY Was Aborted Before All Records Were Sent"""
+
+class BlobUploadError(Exception):
+    """Uploading Files To The Container Failed"""
+
+class BlobBatchDeleteError(Exception):
+    """Deleting Some Blobs Of A Batch Failed"""
+
+    def __init__(self, message: str, status: int, headers: Any = None) -> None:
+        super().__init__(message)
+        # of the failed sub-request deciding whether and when the rest are retried
+        self.status = status
+        self.headers = headers
+
+class RolloutStoppedError(Exception):
+    """The Rollout Was Stopped Before All Tenants Were Upgraded"""
+
+    def __init__(self, message: str, result: Optional[dict] = None) -> None:
+        super().__init__(message)
+        # the summary of the stopped rollout, stored as the result of its job
+        self.result = result
+
+class SharedDatasourceMismatchError(Exception):
+    """The Datasource Of The Tenant Differs From The Shared Datasource"""
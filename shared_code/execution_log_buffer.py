@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import atexit
+import threading
+from logging import Logger
+from typing import Any, Dict, List
+
+from shared_code.logger import get_traceback
+from shared_code.postgres import Postgres
+
+# duration_ms and correlation_id are added by migrations/001_execution_log_timing_columns.sql
+EXECUTION_LOG_COLUMNS = (
+    'scenario_type', 'scenario_task', 'process_step_id', 'execution_timestamp', 'tenant_id', 'result',
+    'duration_ms', 'correlation_id'
+)
+
+_BUFFERS: Dict[Any, ExecutionLogBuffer] = {}
+_BUFFERS_LOCK = threading.Lock()
+
+
+class ExecutionLogBuffer:
+    '''
+    Collects execution_log entries in memory and writes them with one COPY,
+    when max_entries are buffered, every flush_interval_seconds from a background thread,
+    or when flush() is called. Entries of a failed flush are kept for the next one, up to
+    max_buffered_entries, the oldest entries past it are dropped and logged.
+    '''
+    def __init__(
+        self,
+        db: Postgres,
+        logger: Logger,
+        max_entries: int,
+        flush_interval_seconds: float,
+        max_buffered_entries: int
+    ) -> None:
+        self._db = db
+        self.logger = logger
+        self.max_entries = max_entries
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_buffered_entries = max(max_buffered_entries, max_entries)
+        self.dropped = 0
+        self._entries: List[tuple] = []
+        self._lock = threading.Lock()
+        # serializes the flushes, so the entries are written in the order they were buffered
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _start(self) -> None:
+        # called with self._lock held
+        if self._thread is None and self.flush_interval_seconds > 0:
+            self._thread = threading.Thread(
+                target=self._run, name='execution_log_buffer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as ex:
+                self.logger.error(f"Flushing execution_log failed: {get_traceback(ex)}")
+
+    def _drop_overflow(self) -> None:
+        # called with self._lock held, keeps a worker whose flushes keep failing bounded
+        overflow = len(self._entries) - self.max_buffered_entries
+        if overflow <= 0:
+            return
+        dropped, self._entries = self._entries[:overflow], self._entries[overflow:]
+        self.dropped += overflow
+        self.logger.error(
+            f"Dropped the oldest {overflow} execution_log entries, the buffer is full"
+            f" (max_buffered_entries={self.max_buffered_entries}, total_dropped={self.dropped}):"
+            f" {dropped}"
+        )
+
+    def append(self, entry: tuple) -> None:
+        with self._lock:
+            self._entries.append(entry)
+            self._drop_overflow()
+            self._start()
+            full = len(self._entries) >= self.max_entries
+        if full:
+            if self._thread is None:
+                self.flush()
+            else:
+                self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+            if not entries:
+                return
+            try:
+                # a single COPY is one transaction, a failed flush writes none of the entries
+                self._db.copy_records('execution_log', entries, EXECUTION_LOG_COLUMNS)
+            except Exception:
+                with self._lock:
+                    self._entries[:0] = entries
+                    self._drop_overflow()
+                raise
+            self.logger.info(f"Flushed {len(entries)} execution_log entries")
+
+
+def get_buffer(db: Postgres, logger: Logger, options: Any) -> ExecutionLogBuffer:
+    '''
+    One buffer per metadata_storage connection pool, shared by all tenants of the process
+    '''
+    with _BUFFERS_LOCK:
+        buffer = _BUFFERS.get(db.pool)
+        if buffer is None:
+            buffer = ExecutionLogBuffer(
+                db,
+                logger,
+                max_entries=options.log_buffer_size,
+                flush_interval_seconds=options.log_flush_interval_seconds,
+                max_buffered_entries=options.log_buffer_max_entries
+            )
+            _BUFFERS[db.pool] = buffer
+        return buffer
+
+
+@atexit.register
+def flush_all() -> None:
+    with _BUFFERS_LOCK:
+        buffers = list(_BUFFERS.values())
+    for buffer in buffers:
+        try:
+            buffer.flush()
+        except Exception as ex:
+            buffer.logger.error(f"Flushing execution_log failed: {get_traceback(ex)}")
@@ -0,0 +1,249 @@
+import functools
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from shared_code import app_config, exceptions, logger
+from shared_code.mocks import Mocks
+
+SCENARIO = "CreateTenant"
+FCE_CONFIG_FILE_NAME = 'fce_config.yaml'
+FCE_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), FCE_CONFIG_FILE_NAME)
+WORKSPACE_TYPES = ('child', 'parent')
+
+REQUIRED_ENVIRON_FCE = {'datasource_password': 'datasource_password'}
+REQUIRED_ENVIRON = {
+    **app_config.REQUIRED_ENVIRON_METADATA_STORAGE,
+    **app_config.REQUIRED_ENVIRON_GOODDATA,
+    **app_config.REQUIRED_ENVIRON_DATAPRODUCT_REPOSITORY,
+    **REQUIRED_ENVIRON_FCE
+}
+
+
+@dataclass(frozen=True)
+class UsergroupTemplate:
+    __slots__ = ('name',)
+    name: str
+
+
+@dataclass(frozen=True)
+class UsergroupPermissionTemplate:
+    __slots__ = ('usergroup', 'permission')
+    usergroup: str
+    permission: str
+
+
+@dataclass(frozen=True)
+class WorkspacePermissionTemplate:
+    __slots__ = ('workspace', 'usergroups')
+    workspace: str
+    usergroups: Tuple[UsergroupPermissionTemplate, ...]
+
+
+@dataclass(frozen=True)
+class FceConfigModel:
+    '''
+    Tenant independent content of fce_config.yaml, the ids are resolved per tenant by FceConfig
+    '''
+    __slots__ = ('default_usergroups', 'workspace_permissions', 'default_usergroup_for_default_users')
+    default_usergroups: Tuple[UsergroupTemplate, ...]
+    workspace_permissions: Tuple[WorkspacePermissionTemplate, ...]
+    default_usergroup_for_default_users: str
+
+
+@dataclass(frozen=True)
+class Usergroup:
+    __slots__ = ('name', 'id')
+    name: str
+    id: str
+
+
+@dataclass(frozen=True)
+class UsergroupPermission:
+    __slots__ = ('usergroup', 'permission', 'id')
+    usergroup: str
+    permission: str
+    id: str
+
+
+@dataclass(frozen=True)
+class WorkspacePermission:
+    __slots__ = ('workspace', 'workspace_id', 'usergroups')
+    workspace: str
+    workspace_id: str
+    usergroups: Tuple[UsergroupPermission, ...]
+
+
+def parse_config(dct: Any) -> FceConfigModel:
+    try:
+        model = FceConfigModel(
+            default_usergroups=tuple(
+                UsergroupTemplate(name=str(usergroup['name']))
+                for usergroup in dct['default_usergroups']
+            ),
+            workspace_permissions=tuple(
+                WorkspacePermissionTemplate(
+                    workspace=permission['workspace'],
+                    usergroups=tuple(
+                        UsergroupPermissionTemplate(
+                            usergroup=str(usergroup['usergroup']),
+                            permission=str(usergroup['permission'])
+                        )
+                        for usergroup in permission['usergroups']
+                    )
+                )
+                for permission in dct['workspace_permissions']
+            ),
+            default_usergroup_for_default_users=str(dct['default_usergroup_for_default_users'])
+        )
+    except (KeyError, TypeError) as ex:
+        raise exceptions.InvalidFceConfigError(f"{ex.__class__.__name__}: {ex}") from ex
+    for permission in model.workspace_permissions:
+        if permission.workspace not in WORKSPACE_TYPES:
+            raise exceptions.UnknownWorkspaceTypeError(f"workspace_type={permission.workspace!r}")
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def load_config(config_file: str = FCE_CONFIG_PATH) -> FceConfigModel:
+    '''
+    Parse and validate the config file once per process
+    '''
+    import yaml
+
+    with open(config_file, 'r', encoding='utf-8') as file:
+        return parse_config(yaml.safe_load(file))
+
+
+class FceConfig:
+    def __init__(
+        self, args: Any, scenario: str = SCENARIO, required_environ: Optional[Dict] = None
+    ):
+        self.scenario = scenario
+        self.check_required_environ(REQUIRED_ENVIRON if required_environ is None else required_environ)
+        self.logger = logger.get_logger(scenario)
+        self.dataproduct = args.dataproduct
+        self.dataproduct_version = args.dataproduct_version
+        self.tenant = args.tenant
+        self.force = getattr(args, 'force', False)
+        self.default_users = Mocks(args).default_users
+        self.child_workspace_id = app_config.get_child_workspace_id(
+            data_product_id=args.dataproduct,
+            tenant_id=args.tenant
+        )
+        self.workspace_topology = app_config.get_workspace_topology_config()
+        if self.workspace_topology.topology not in app_config.WORKSPACE_TOPOLOGIES:
+            raise exceptions.UnknownWorkspaceTopologyError(f"topology={self.workspace_topology.topology}")
+        # one parent workspace and datasource per dataproduct version, tenants are isolated
+        # in their child workspaces by a workspace data filter
+        self.shared_parent = self.workspace_topology.topology == app_config.WORKSPACE_TOPOLOGY_SHARED
+        if self.shared_parent:
+            self.parent_workspace_id = app_config.get_shared_parent_workspace_id(
+                data_product_id=args.dataproduct,
+                data_product_version=args.dataproduct_version
+            )
+            self.datasource_id = app_config.get_shared_datasource_id(
+                data_product_id=args.dataproduct,
+                data_product_version=args.dataproduct_version
+            )
+            self.workspace_data_filter_id = app_config.get_workspace_data_filter_id(
+                parent_workspace_id=self.parent_workspace_id,
+                column_name=self.workspace_topology.data_filter_column
+            )
+        else:
+            self.parent_workspace_id = app_config.get_parent_workspace_id(
+                data_product_id=args.dataproduct,
+                tenant_id=args.tenant
+            )
+            self.datasource_id = app_config.get_datasource_id(
+                data_product_id=args.dataproduct,
+                tenant_id=args.tenant
+            )
+            self.workspace_data_filter_id = None
+        self.metadata_storage_config = app_config.get_metadata_storage_config(
+            tenant=args.tenant,
+            scenario=scenario,
+            logger=self.logger,
+            dataproduct=args.dataproduct,
+            force=self.force
+        )
+
+    @functools.cached_property
+    def gooddata_config(self) -> Any:
+        return app_config.get_gooddata_config(logger=self.logger)
+
+    @functools.cached_property
+    def dataproduct_repository_config(self) -> Any:
+        return app_config.get_dataproduct_repository_config(logger=self.logger)
+
+    @property
+    def config(self) -> FceConfigModel:
+        return load_config()
+
+    @functools.cached_property
+    def default_usergroups(self) -> Tuple[Usergroup, ...]:
+        return tuple(
+            Usergroup(name=usergroup.name, id=self.get_usergroup_id(usergroup.name))
+            for usergroup in self.config.default_usergroups
+        )
+
+    @property
+    def shared_scope(self) -> Optional[str]:
+        '''
+        The provisioning_state owner of the steps shared by the tenants of the parent workspace
+        '''
+        return self.parent_workspace_id if self.shared_parent else None
+
+    @functools.cached_property
+    def workspace_permissions(self) -> Tuple[WorkspacePermission, ...]:
+        permissions = self.config.workspace_permissions
+        if self.shared_parent:
+            # the shared parent is not filtered, its permissions would expose the data of all tenants
+            skipped = [permission for permission in permissions if permission.workspace == 'parent']
+            if skipped:
+                self.logger.warning(f"Skipping parent workspace permissions of the shared topology ({skipped=})")
+            permissions = tuple(permission for permission in permissions if permission.workspace != 'parent')
+        return tuple(
+            WorkspacePermission(
+                workspace=permission.workspace,
+                workspace_id=self.get_workspace_id(permission.workspace),
+                usergroups=tuple(
+                    UsergroupPermission(
+                        usergroup=usergroup.usergroup,
+                        permission=usergroup.permission,
+                        id=self.get_usergroup_id(usergroup.usergroup)
+                    )
+                    for usergroup in permission.usergroups
+                )
+            )
+            for permission in permissions
+        )
+
+    def get_usergroup_id(self, usrgroup_name: str) -> str:
+        return app_config.get_usergroup_id(
+            data_product_id=self.dataproduct,
+            tenant_id=self.tenant,
+            usergroup=usrgroup_name
+        )
+
+    def get_workspace_id(self, workspace_type: str) -> str:
+        if workspace_type == 'child':
+            return self.child_workspace_id
+        elif workspace_type == 'parent':
+            return self.parent_workspace_id
+        raise exceptions.UnknownWorkspaceTypeError(f"{workspace_type=}")
+
+    def get_default_usergroup_for_default_users(self):
+        return self.get_usergroup_id(
+            usrgroup_name=self.config.default_usergroup_for_default_users
+        )
+
+    def check_required_environ(self, required_environ: Dict):
+        missing_environ = []
+        for var in required_environ:
+            value = os.getenv(var)
+            if value is None:
+                missing_environ.append(var)
+
+        if missing_environ:
+            raise exceptions.MissingEnvironmentVariablesError(f"scenario={self.scenario}, {missing_environ=}")
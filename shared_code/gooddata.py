@@ -1,12 +1,107 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from shared_code import app_config, instrumentation, throttling
+
+# gooddata_sdk and its generated API clients are slow to import, they are imported
+# on first use so a cold start does not pay for them before a request needs them
+if TYPE_CHECKING:
+    from gooddata_sdk import CatalogDeclarativeModel, CatalogUser, GoodDataSdk
+
+
+class DeclarativeModelCache:
+    '''
+    Process-wide LRU cache of declarative models parsed from disk.
+    The cached models are shared templates and must never be modified in place.
+    '''
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        # called with self._lock held
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+        return False, None
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        # concurrent requests of the same key wait for a single load
+        with key_lock:
+            with self._lock:
+                found, value = self._lookup(key)
+            if found:
+                return value
+            try:
+                value = loader()
+                with self._lock:
+                    self._entries[key] = value
+                    while len(self._entries) > max(self.max_size, 0):
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
 
-from gooddata_sdk import (BasicCredentials, CatalogDataSourcePostgres,
-                          CatalogUser, CatalogUserGroup, CatalogWorkspace,
-                          GoodDataSdk, PostgresAttributes)
-from gooddata_sdk.catalog.permission.declarative_model.permission import \
-    CatalogDeclarativeWorkspacePermissions
+
+_MODEL_CACHE = DeclarativeModelCache(max_size=app_config.get_model_cache_size())
+
+# the workspace data filter settings are entities of the child workspaces, the pinned
+# entities API only reads them
+WORKSPACE_DATA_FILTER_SETTINGS_PATH = '/api/v1/entities/workspaces/{workspaceId}/workspaceDataFilterSettings'
+JSON_API_CONTENT_TYPE = 'application/vnd.gooddata.api+json'
+
+_SDKS: Dict[Tuple[str, str], GoodDataSdk] = {}
+_SDKS_LOCK = threading.Lock()
+SDK_API_CLIENTS = ('_api_client', '_metadata_client', '_scan_client', '_afm_client')
+
+
+def set_http_pool_size(sdk: GoodDataSdk, pool_size: int) -> None:
+    '''
+    Size the keep-alive connection pools of the generated API clients, the pools
+    are created on the first request so this has to be called before it
+    '''
+    for client_name in SDK_API_CLIENTS:
+        api_client = getattr(sdk._client, client_name, None)
+        if api_client is not None:
+            api_client.rest_client.pool_manager.connection_pool_kw['maxsize'] = pool_size
+
+
+def remap_ldm_data_source(ldm: CatalogDeclarativeModel, datasource_id: str) -> CatalogDeclarativeModel:
+    '''
+    Copy of ldm with every dataset mapped to datasource_id, only the changed
+    objects are copied, the rest is shared with ldm
+    '''
+    import attr
+
+    if ldm.ldm is None:
+        return ldm
+    datasets = [
+        attr.evolve(
+            dataset,
+            data_source_table_id=attr.evolve(
+                dataset.data_source_table_id, data_source_id=datasource_id
+            )
+        ) if dataset.data_source_table_id is not None and dataset.data_source_table_id.data_source_id else dataset
+        for dataset in ldm.ldm.datasets
+    ]
+    return attr.evolve(ldm, ldm=attr.evolve(ldm.ldm, datasets=datasets))
 
 
 class GoodData:
@@ -14,17 +109,42 @@ class GoodData:
         self.logger = gooddata_config.logger
         self.sdk = self.get_sdk(
             config=gooddata_config.config,
-            config_masked=gooddata_config.config_masked
+            config_masked=gooddata_config.config_masked,
+            http_pool_size=gooddata_config.options.http_pool_size
         )
+        self.host = gooddata_config.config.host
+        self.throttle = throttling.get_throttle(self.host, gooddata_config.throttling)
 
-    def get_sdk(self, config: SimpleNamespace, config_masked: str) -> GoodDataSdk:
-        self.logger.info(
-            f"Connecting to GoodData ({config_masked})"
-        )
-        sdk = GoodDataSdk.create(config.host, config.token)
+    def _load_model(
+        self, model_type: str, loader: Callable[[], Any], cache_key: Optional[Tuple]
+    ) -> Any:
+        if cache_key is None:
+            return loader()
+        return _MODEL_CACHE.get((*cache_key, model_type), loader)
+
+    def get_sdk(
+        self, config: SimpleNamespace, config_masked: str, http_pool_size: int
+    ) -> GoodDataSdk:
+        from gooddata_sdk import GoodDataSdk
+
+        # one sdk (and one keep-alive HTTP connection pool) per host and token and process
+        with _SDKS_LOCK:
+            sdk = _SDKS.get((config.host, config.token))
+            if sdk is None:
+                self.logger.info(
+                    f"Connecting to GoodData ({config_masked})"
+                )
+                sdk = GoodDataSdk.create(config.host, config.token)
+                set_http_pool_size(sdk, http_pool_size)
+                _SDKS[(config.host, config.token)] = sdk
         return sdk
 
+    @instrumentation.timed('gooddata.create_or_update_data_source')
+    @throttling.throttled()
     def create_or_update_data_source(self, config: Any) -> None:
+        from gooddata_sdk import (BasicCredentials, CatalogDataSourcePostgres,
+                                  PostgresAttributes)
+
         masked_config = {k:v for k,v in config.__dict__.items() if k != 'password'}
         self.logger.info(f"Creating datasource (config={masked_config})")
 
@@ -45,12 +165,16 @@ class GoodData:
             data_source=data_source
         )
 
+    @instrumentation.timed('gooddata.create_or_update_workspace')
+    @throttling.throttled()
     def create_or_update_workspace(
         self,
         workspace_id: str,
         name: str,
         parent_id: Optional[str] = None
     ) -> None:
+        from gooddata_sdk import CatalogWorkspace
+
         if parent_id:
             self.logger.info(f"Creating workspace ({workspace_id=}, {parent_id=})")
             workspace = CatalogWorkspace(workspace_id=workspace_id, name=name, parent_id=parent_id)
@@ -59,54 +183,82 @@ class GoodData:
             workspace = CatalogWorkspace(workspace_id=workspace_id, name=name)
         self.sdk.catalog_workspace.create_or_update(workspace=workspace)
 
+    @instrumentation.timed('gooddata.put_declarative_pdm')
+    @throttling.throttled()
     def put_declarative_pdm(
         self,
         src_dir: Path,
-        datasource_id: str
+        datasource_id: str,
+        cache_key: Optional[Tuple] = None
     ) -> None:
         self.logger.info(f"Putting pdm (tgt_datasource={datasource_id}, {src_dir=})")
-        pdm = self.sdk.catalog_data_source.load_pdm_from_disk(path=src_dir)
+        pdm = self._load_model(
+            'pdm', lambda: self.sdk.catalog_data_source.load_pdm_from_disk(path=src_dir), cache_key
+        )
         self.sdk.catalog_data_source.put_declarative_pdm(
             data_source_id=datasource_id,
             declarative_tables=pdm
         )
 
+    @instrumentation.timed('gooddata.put_declarative_ldm')
+    @throttling.throttled()
     def put_declarative_ldm(
         self,
         src_dir: Path,
         workspace_id: str,
-        datasource_id: str
+        datasource_id: str,
+        cache_key: Optional[Tuple] = None
     ) -> None:
         self.logger.info(f"Putting ldm (tgt_ws={workspace_id}, {src_dir=}, {datasource_id=})")
-        ldm = self.sdk.catalog_workspace_content.load_ldm_from_disk(path=src_dir)
-
-        if ldm_object := ldm.to_dict().get("ldm"):
-            if datasets := ldm_object.get("datasets"):
-                data_source_mapping = {}
-                for dataset in datasets:
-                    if data_source_table_id := dataset.get('dataSourceTableId'):
-                        if disk_datasource_id := data_source_table_id.get('dataSourceId'):
-                            data_source_mapping[disk_datasource_id] = datasource_id
-                ldm.modify_mapped_data_source(data_source_mapping)
-
+        ldm = self._load_model(
+            'ldm', lambda: self.sdk.catalog_workspace_content.load_ldm_from_disk(path=src_dir), cache_key
+        )
         self.sdk.catalog_workspace_content.put_declarative_ldm(
-            workspace_id=workspace_id, ldm=ldm
+            workspace_id=workspace_id, ldm=remap_ldm_data_source(ldm, datasource_id)
         )
 
-    def put_declarative_am(self, src_dir: Path, workspace_id: str) -> None:
+    @instrumentation.timed('gooddata.put_declarative_am')
+    @throttling.throttled()
+    def put_declarative_am(
+        self,
+        src_dir: Path,
+        workspace_id: str,
+        cache_key: Optional[Tuple] = None
+    ) -> None:
         self.logger.info(f"Putting am  (tgt_ws={workspace_id}, {src_dir=})")
-        am = self.sdk.catalog_workspace_content.load_analytics_model_from_disk(
-            path=src_dir
+        am = self._load_model(
+            'am',
+            lambda: self.sdk.catalog_workspace_content.load_analytics_model_from_disk(path=src_dir),
+            cache_key
         )
         self.sdk.catalog_workspace_content.put_declarative_analytics_model(
             workspace_id=workspace_id,
             analytics_model=am
         )
 
-    def create_or_update_user_group(self, user_group_id: str) -> None:
-        self.logger.info(f"Creating user group ({user_group_id=})")
-        user_group = CatalogUserGroup.init(user_group_id=user_group_id)
-        self.sdk.catalog_user.create_or_update_user_group(user_group=user_group)
+    @instrumentation.timed('gooddata.create_or_update_user_groups')
+    def create_or_update_user_groups(self, user_group_ids: List[str]) -> None:
+        '''
+        Create the user groups that do not exist yet, one entity request per group.
+        The existing user groups (including their parents) are kept as they are, so
+        concurrent instances creating groups of other tenants cannot overwrite each other.
+        '''
+        from gooddata_api_client.exceptions import ApiException
+        from gooddata_api_client.model.json_api_user_group_in import JsonApiUserGroupIn
+        from gooddata_api_client.model.json_api_user_group_in_document import JsonApiUserGroupInDocument
+
+        self.logger.info(f"Creating user groups ({user_group_ids=})")
+        for user_group_id in dict.fromkeys(user_group_ids):
+            document = JsonApiUserGroupInDocument(data=JsonApiUserGroupIn(id=user_group_id))
+            try:
+                # a retried create that got through the first time conflicts too, it is idempotent
+                self.throttle.call(
+                    lambda: self.sdk.client.entities_api.create_entity_user_groups(document)
+                )
+            except ApiException as ex:
+                if ex.status != 409:
+                    raise
+                self.logger.info(f"User group already exists ({user_group_id=})")
 
     def _build_permission(
             self, assignee_id: str, assignee_type: str, name: str
@@ -127,9 +279,14 @@ class GoodData:
                 "permissions": perm
             }
 
+    @instrumentation.timed('gooddata.assign_workspace_usergoup_permissions')
+    @throttling.throttled()
     def assign_workspace_usergoup_permissions(
             self, workspace_id: str, usergroups: Any
     ) -> None:
+        from gooddata_sdk.catalog.permission.declarative_model.permission import \
+            CatalogDeclarativeWorkspacePermissions
+
         permissions = [self._build_permission(assignee_id=g.id, assignee_type='userGroup', name=g.permission) for g in usergroups]
         workspace_perm =  self._build_workspace_permissions(perm=permissions)
         self.logger.info(f"Assigning workspace permissions ({workspace_id=}, {workspace_perm=})")
@@ -141,13 +298,207 @@ class GoodData:
             declarative_workspace_permissions=catalog_perm
         )
 
+    @instrumentation.timed('gooddata.get_user')
+    @throttling.throttled()
+    def get_user(self, user_id: str) -> Optional[CatalogUser]:
+        from gooddata_api_client.exceptions import NotFoundException
+
+        try:
+            return self.sdk.catalog_user.get_user(user_id=user_id)
+        except NotFoundException:
+            return None
+
+    def assign_workspaces_usergroup_permissions(self, workspace_permissions: Any) -> None:
+        '''
+        Assign the usergroup permissions of many workspace permission entries,
+        the entries of the same workspace are merged into one declarative request
+        '''
+        usergroups_by_workspace: Dict[str, List] = {}
+        for permission in workspace_permissions:
+            usergroups_by_workspace.setdefault(permission.workspace_id, []).extend(permission.usergroups)
+        for workspace_id, usergroups in usergroups_by_workspace.items():
+            self.assign_workspace_usergoup_permissions(workspace_id=workspace_id, usergroups=usergroups)
+
+    def _call_entities_api(
+        self, method: str, resource_path: str, path_params: Dict[str, str], body: Optional[Dict] = None
+    ) -> None:
+        '''
+        JSON:API request of an entity endpoint the generated entities API has no method for,
+        sent by its API client so it shares the keep-alive pool and the authentication
+        '''
+        self.sdk.client.entities_api.api_client.call_api(
+            resource_path,
+            method,
+            path_params=path_params,
+            header_params={'Accept': JSON_API_CONTENT_TYPE, 'Content-Type': JSON_API_CONTENT_TYPE},
+            body=body,
+            auth_settings=[],
+            _return_http_data_only=True,
+            _check_type=False
+        )
+
+    @instrumentation.timed('gooddata.create_workspace_data_filter')
+    @throttling.throttled()
+    def create_workspace_data_filter(self, filter_id: str, column_name: str, parent_workspace_id: str) -> None:
+        '''
+        Create the workspace data filter on column_name of the parent workspace,
+        an existing filter is kept as it is
+        '''
+        from gooddata_api_client.exceptions import ApiException
+        from gooddata_api_client.model.json_api_workspace_data_filter_in import JsonApiWorkspaceDataFilterIn
+        from gooddata_api_client.model.json_api_workspace_data_filter_in_attributes import \
+            JsonApiWorkspaceDataFilterInAttributes
+        from gooddata_api_client.model.json_api_workspace_data_filter_in_document import \
+            JsonApiWorkspaceDataFilterInDocument
+
+        document = JsonApiWorkspaceDataFilterInDocument(
+            data=JsonApiWorkspaceDataFilterIn(
+                id=filter_id,
+                attributes=JsonApiWorkspaceDataFilterInAttributes(column_name=column_name, title=filter_id)
+            )
+        )
+        self.logger.info(f"Creating workspace data filter ({filter_id=}, {column_name=}, {parent_workspace_id=})")
+        try:
+            self.sdk.client.entities_api.create_entity_workspace_data_filters(parent_workspace_id, document)
+        except ApiException as ex:
+            if ex.status != 409:
+                raise
+            self.logger.info(f"Workspace data filter already exists ({filter_id=})")
+
+    @instrumentation.timed('gooddata.set_workspace_data_filter')
+    @throttling.throttled()
+    def set_workspace_data_filter(self, filter_id: str, workspace_id: str, filter_values: List[str]) -> None:
+        '''
+        Filter the data of workspace (a child of the filter's workspace) to the rows whose column is
+        one of filter_values. The setting is an entity of the workspace, an existing one is replaced,
+        the settings of the other workspaces are not touched.
+        '''
+        from gooddata_api_client.exceptions import ApiException
+
+        document = {
+            'data': {
+                'id': workspace_id,
+                'type': 'workspaceDataFilterSetting',
+                'attributes': {'title': workspace_id, 'filterValues': list(filter_values)},
+                'relationships': {
+                    'workspaceDataFilter': {'data': {'id': filter_id, 'type': 'workspaceDataFilter'}}
+                }
+            }
+        }
+        self.logger.info(f"Setting workspace data filter ({filter_id=}, {workspace_id=}, {filter_values=})")
+        try:
+            self._call_entities_api(
+                'POST', WORKSPACE_DATA_FILTER_SETTINGS_PATH, {'workspaceId': workspace_id}, body=document
+            )
+        except ApiException as ex:
+            # a retried create that got through the first time conflicts too
+            if ex.status != 409:
+                raise
+            self._call_entities_api(
+                'PUT',
+                f"{WORKSPACE_DATA_FILTER_SETTINGS_PATH}/{{objectId}}",
+                {'workspaceId': workspace_id, 'objectId': workspace_id},
+                body=document
+            )
+
+    @instrumentation.timed('gooddata.remove_workspace_data_filters')
+    @throttling.throttled()
+    def remove_workspace_data_filters(self, workspace_id: str) -> None:
+        '''
+        Remove the workspace data filter settings of workspace, the filters are kept.
+        A missing workspace has none.
+        '''
+        from gooddata_api_client.exceptions import NotFoundException
+
+        try:
+            settings = self.sdk.client.entities_api.get_all_entities_workspace_data_filter_settings(
+                workspace_id, origin='NATIVE', _check_return_type=False
+            ).data
+        except NotFoundException:
+            settings = []
+        if not settings:
+            self.logger.info(f"No workspace data filters set ({workspace_id=})")
+            return
+        self.logger.info(f"Removing workspace data filters ({workspace_id=}, removed={len(settings)})")
+        for setting in settings:
+            try:
+                self._call_entities_api(
+                    'DELETE',
+                    f"{WORKSPACE_DATA_FILTER_SETTINGS_PATH}/{{objectId}}",
+                    {'workspaceId': workspace_id, 'objectId': setting['id']}
+                )
+            except NotFoundException:
+                pass
+
+    @instrumentation.timed('gooddata.delete_workspace')
+    @throttling.throttled()
+    def delete_workspace(self, workspace_id: str) -> None:
+        '''
+        Delete a workspace, its child workspaces must be deleted first.
+        Deleting a missing workspace succeeds.
+        '''
+        from gooddata_api_client.exceptions import NotFoundException
+
+        self.logger.info(f"Deleting workspace ({workspace_id=})")
+        # catalog_workspace.delete_workspace lists all the workspaces of the organization
+        # on every call, the entity API deletes directly
+        try:
+            self.sdk.client.entities_api.delete_entity_workspaces(workspace_id)
+        except NotFoundException:
+            self.logger.info(f"Workspace does not exist ({workspace_id=})")
+
+    @instrumentation.timed('gooddata.delete_data_source')
+    @throttling.throttled()
+    def delete_data_source(self, datasource_id: str) -> None:
+        from gooddata_api_client.exceptions import NotFoundException
+
+        self.logger.info(f"Deleting datasource ({datasource_id=})")
+        try:
+            self.sdk.catalog_data_source.delete_data_source(data_source_id=datasource_id)
+        except NotFoundException:
+            self.logger.info(f"Datasource does not exist ({datasource_id=})")
+
+    @instrumentation.timed('gooddata.delete_user_group')
+    @throttling.throttled()
+    def delete_user_group(self, user_group_id: str) -> None:
+        from gooddata_api_client.exceptions import NotFoundException
+
+        self.logger.info(f"Deleting user group ({user_group_id=})")
+        try:
+            self.sdk.catalog_user.delete_user_group(user_group_id=user_group_id)
+        except NotFoundException:
+            self.logger.info(f"User group does not exist ({user_group_id=})")
+
+    @instrumentation.timed('gooddata.create_or_update_user')
+    @throttling.throttled()
     def create_or_update_user(self, config: Any) -> None:
-        users = self.sdk.catalog_user.list_users()
-        user_exist  = next((u for u in users if u.id == config.user_id), None)
-        if user_exist:
-            user_group_ids = list(set(user_exist.get_user_groups + config.user_group_ids))
-        else:
-            user_group_ids = config.user_group_ids
+        '''
+        Create the user or add config.user_group_ids to its user groups. The user is read once,
+        it is then created or updated by one entity request, or left as it is when it has the groups.
+        '''
+        from gooddata_api_client.exceptions import ApiException
+        from gooddata_sdk import CatalogUser
+        from gooddata_sdk.catalog.user.entity_model.user import CatalogUserDocument
+
+        existing = self.get_user(config.user_id)
+        if existing is not None and set(config.user_group_ids) <= set(existing.get_user_groups):
+            self.logger.info(f"User already exists ({config.user_id=})")
+            return
+        user_group_ids = list(dict.fromkeys(
+            (existing.get_user_groups if existing is not None else []) + list(config.user_group_ids)
+        ))
         user = CatalogUser.init(user_id=config.user_id, user_group_ids=user_group_ids)
+        document = CatalogUserDocument(data=user).to_api()
+        entities_api = self.sdk.client.entities_api
+        if existing is not None:
+            self.logger.info(f"Updating user ({user=})")
+            entities_api.update_entity_users(id=user.id, json_api_user_in_document=document)
+            return
         self.logger.info(f"Creating user ({user=})")
-        self.sdk.catalog_user.create_or_update_user(user=user)
+        try:
+            entities_api.create_entity_users(json_api_user_in_document=document)
+        except ApiException as ex:
+            if ex.status != 409:
+                raise
+            # created meanwhile, e.g. by another tenant sharing the user, its groups are merged
+            self.create_or_update_user(config)
@@ -0,0 +1,30 @@
+import json
+import logging
+import urllib.parse
+
+import azure.functions as func
+
+from shared_code import app_config, job_queue
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def accepted(req: func.HttpRequest, job_id: str) -> func.HttpResponse:
+    '''
+    202 response of a queued job pointing to its provisioning_status
+    '''
+    url = urllib.parse.urlsplit(req.url)
+    status_url = f"{url.scheme}://{url.netloc}/api/provisioning_status?job_id={job_id}"
+    return func.HttpResponse(
+        json.dumps({'job_id': job_id, 'status_url': status_url}),
+        mimetype='application/json',
+        status_code=202,
+        headers={'Location': status_url}
+    )
+
+
+def get_job_queue() -> job_queue.LocalJobQueue:
+    return job_queue.get_queue(
+        max_workers=app_config.get_job_queue_max_workers(),
+        logger=logging.getLogger(__name__)
+    )
@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import functools
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+EXPORT_PATH_ENVIRON = 'instrumentation_export_path'
+COLLECTOR_ADDRESS_ENVIRON = 'instrumentation_collector_address'
+MAX_RECENT_SPANS = 10000
+# upper bounds of the histogram buckets in milliseconds, the last bucket is unbounded
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+_CORRELATION_ID: contextvars.ContextVar = contextvars.ContextVar('correlation_id', default=None)
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_correlation_id() -> Optional[str]:
+    return _CORRELATION_ID.get()
+
+
+@contextmanager
+def correlation_scope(correlation_id: Optional[str] = None) -> Iterator[str]:
+    '''
+    Set the correlation id of all spans recorded in this context (and in the
+    contexts copied from it), a new id is generated when none is given
+    '''
+    correlation_id = correlation_id or new_correlation_id()
+    token = _CORRELATION_ID.set(correlation_id)
+    try:
+        yield correlation_id
+    finally:
+        _CORRELATION_ID.reset(token)
+
+
+def submit(executor: Any, func: Callable, *args, **kwargs) -> Any:
+    '''
+    executor.submit which runs func in a copy of the current context, so the
+    correlation id follows the work into the worker thread
+    '''
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def add(self, duration_ms: float, error: bool) -> None:
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.errors += int(error)
+        self.sum_ms += duration_ms
+        self.min_ms = duration_ms if self.min_ms is None else min(self.min_ms, duration_ms)
+        self.max_ms = duration_ms if self.max_ms is None else max(self.max_ms, duration_ms)
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'sum_ms': self.sum_ms,
+            'mean_ms': self.sum_ms / self.count if self.count else None,
+            'min_ms': self.min_ms,
+            'max_ms': self.max_ms,
+            'buckets_ms': list(HISTOGRAM_BUCKETS_MS) + ['+Inf'],
+            'counts': list(self.counts)
+        }
+
+
+class Recorder:
+    '''
+    Process-wide sink of finished spans, keeps the recent spans and a latency histogram
+    per operation and hands every span to the registered exporters
+    '''
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._spans: Deque[Dict] = deque(maxlen=MAX_RECENT_SPANS)
+        self._exporters: List[Callable[[Dict], None]] = []
+        self._environ_exporters_added = False
+
+    def add_exporter(self, exporter: Callable[[Dict], None]) -> None:
+        with self._lock:
+            self._exporters.append(exporter)
+
+    def _add_environ_exporters(self) -> None:
+        # called with self._lock held
+        self._environ_exporters_added = True
+        if export_path := os.getenv(EXPORT_PATH_ENVIRON):
+            self._exporters.append(JsonLinesExporter(export_path))
+        if collector_address := os.getenv(COLLECTOR_ADDRESS_ENVIRON):
+            host, port = collector_address.rsplit(':', 1)
+            self._exporters.append(UdpExporter(host, int(port)))
+
+    def record(self, span: Dict) -> None:
+        with self._lock:
+            if not self._environ_exporters_added:
+                self._add_environ_exporters()
+            histogram = self._histograms.setdefault(span['operation'], Histogram())
+            histogram.add(span['duration_ms'], error=span['error'] is not None)
+            self._spans.append(span)
+            exporters = list(self._exporters)
+        for exporter in exporters:
+            try:
+                exporter(span)
+            except Exception:
+                # instrumentation must never break the instrumented call
+                pass
+
+    def get_spans(self, correlation_id: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            return [
+                span for span in self._spans
+                if correlation_id is None or span['correlation_id'] == correlation_id
+            ]
+
+    def get_histograms(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {operation: h.to_dict() for operation, h in self._histograms.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._spans.clear()
+
+
+class JsonLinesExporter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Dict) -> None:
+        line = json.dumps(span) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(line)
+
+
+class UdpExporter:
+    '''
+    Sends every span as one JSON datagram to a collector, typically on localhost
+    '''
+    def __init__(self, host: str, port: int) -> None:
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, span: Dict) -> None:
+        self._socket.sendto(json.dumps(span).encode('utf-8'), self.address)
+
+
+RECORDER = Recorder()
+
+
+@contextmanager
+def span(operation: str, **attributes) -> Iterator[Dict]:
+    '''
+    Time the enclosed block as a span of the current correlation id
+    '''
+    record = {
+        'correlation_id': get_correlation_id(),
+        'operation': operation,
+        'start_time': time.time(),
+        'duration_ms': None,
+        'error': None,
+        'thread': threading.current_thread().name,
+        **attributes
+    }
+    start = time.monotonic()
+    try:
+        yield record
+    except BaseException as ex:
+        record['error'] = ex.__class__.__name__
+        raise
+    finally:
+        record['duration_ms'] = (time.monotonic() - start) * 1000
+        RECORDER.record(record)
+
+
+def timed(operation: str):
+    '''
+    Decorator recording every call of the function as a span of the operation
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper_timed(*args, **kwargs):
+            with span(operation):
+                return func(*args, **kwargs)
+        return wrapper_timed
+    return decorator
+
+
+def add_exporter(exporter: Callable[[Dict], None]) -> None:
+    RECORDER.add_exporter(exporter)
+
+
+def get_spans(correlation_id: Optional[str] = None) -> List[Dict]:
+    return RECORDER.get_spans(correlation_id)
+
+
+def get_histograms() -> Dict[str, Dict]:
+    return RECORDER.get_histograms()
+
+
+def summarize_spans(spans: List[Dict]) -> Dict[str, Dict]:
+    '''
+    Number of calls and total milliseconds per operation
+    '''
+    summary: Dict[str, Dict] = {}
+    for span in spans:
+        operation = summary.setdefault(span['operation'], {'count': 0, 'total_ms': 0.0})
+        operation['count'] += 1
+        operation['total_ms'] = round(operation['total_ms'] + span['duration_ms'], 3)
+    return summary
@@ -0,0 +1,137 @@
+import datetime
+import queue
+import threading
+from collections import OrderedDict
+from logging import Logger
+from typing import Any, Callable, Dict, List, Optional
+
+from shared_code import instrumentation
+from shared_code.logger import get_traceback
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+# finished jobs kept for status requests, the oldest are forgotten first
+MAX_FINISHED_JOBS = 1000
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class LocalJobQueue:
+    '''
+    In-process job queue drained by max_workers threads, a stand-in for a durable queue.
+    The job id is also the correlation id of the job, so its execution_log entries
+    can be found by it from any instance. Jobs queued on an instance which is
+    recycled before they run are lost.
+    '''
+    def __init__(self, max_workers: int, logger: Logger) -> None:
+        self.max_workers = max(1, max_workers)
+        self.logger = logger
+        self._queue: queue.Queue = queue.Queue()
+        self._jobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+
+    def _start_workers(self) -> None:
+        # called with self._lock held
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._run, name=f"job_queue_{len(self._workers)}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job_type: str, handler: Callable[[], Any], job_id: Optional[str] = None) -> str:
+        job_id = job_id or instrumentation.new_correlation_id()
+        job = {
+            'job_id': job_id,
+            'job_type': job_type,
+            'status': JOB_QUEUED,
+            'submitted_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._start_workers()
+        self._queue.put((job_id, handler))
+        self.logger.info(f"Queued job ({job_id=}, {job_type=}, queued={self._queue.qsize()})")
+        return job_id
+
+    def _update(self, job_id: str, **changes) -> None:
+        with self._lock:
+            self._jobs[job_id].update(changes)
+            if changes.get('finished_at'):
+                self._jobs.move_to_end(job_id)
+                self._forget_finished()
+
+    def _forget_finished(self) -> None:
+        # called with self._lock held
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job['status'] in (JOB_SUCCEEDED, JOB_FAILED)
+        ]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self) -> None:
+        while True:
+            job_id, handler = self._queue.get()
+            self._update(job_id, status=JOB_RUNNING, started_at=_now())
+            try:
+                with instrumentation.correlation_scope(job_id):
+                    result = handler()
+            except Exception as ex:
+                self.logger.error(f"Job failed ({job_id=}): {get_traceback(ex)}")
+                # an error may carry the partial result of the job, e.g. a stopped rollout's summary
+                self._update(
+                    job_id,
+                    status=JOB_FAILED,
+                    finished_at=_now(),
+                    result=getattr(ex, 'result', None),
+                    error=f"{ex.__class__.__name__}: {ex}"
+                )
+            else:
+                self._update(job_id, status=JOB_SUCCEEDED, finished_at=_now(), result=result)
+            finally:
+                self._queue.task_done()
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def join(self) -> None:
+        '''
+        Wait until every queued job has finished
+        '''
+        self._queue.join()
+
+
+_QUEUE: Optional[LocalJobQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_queue(max_workers: int, logger: Logger) -> LocalJobQueue:
+    '''
+    The job queue of the process, max_workers of the first call is used
+    '''
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = LocalJobQueue(max_workers, logger)
+        return _QUEUE
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    '''
+    The job record if the job was queued by this process
+    '''
+    with _QUEUE_LOCK:
+        job_queue = _QUEUE
+    return job_queue.get_job(job_id) if job_queue is not None else None
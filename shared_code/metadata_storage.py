@@ -1,15 +1,108 @@
 from __future__ import annotations
 
+import datetime
 import functools
+import hashlib
+import json
 import os
+import threading
 import time
+from contextlib import contextmanager
 from types import SimpleNamespace
-from typing import Any
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 
+from shared_code import app_config, execution_log_buffer, instrumentation
 from shared_code.exceptions import NotFoundInMetadataStorageError
 from shared_code.logger import get_traceback
 from shared_code.postgres import Postgres
 
+STEP_SKIPPED = 'skipped'
+
+PROVISIONING_STATE_DDL = """
+              CREATE TABLE provisioning_state (
+                  tenant_id VARCHAR NOT NULL,
+                  data_product_id VARCHAR NOT NULL,
+                  scenario_type VARCHAR NOT NULL,
+                  scenario_task VARCHAR NOT NULL,
+                  fingerprint VARCHAR NOT NULL,
+                  updated_at TIMESTAMP NOT NULL,
+                  PRIMARY KEY (tenant_id, data_product_id, scenario_type, scenario_task)
+              )"""
+_PROVISIONING_STATE_READY = threading.Event()
+# steps shared by many tenants, keyed by (provisioning_state owner, step)
+_SCOPE_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+_SCOPE_LOCKS_LOCK = threading.Lock()
+# advisory locks by name, the threads of the process queue here so one connection waits per name
+_ADVISORY_LOCKS: Dict[str, threading.Lock] = {}
+_ADVISORY_LOCKS_LOCK = threading.Lock()
+
+# the entities in the order their absence is reported
+METADATA_ENTITIES = ('datasource', 'dataproduct', 'tenant')
+DATASOURCE_COLUMNS = ('host', 'db_name', 'port', 'schema', 'username')
+PROVISIONING_METADATA_SQL = """
+              SELECT req.tenant_id, req.data_product_id, req.data_product_version,
+                     tds.tenant_id IS NOT NULL AS datasource_found,
+                     tds.host, tds.database AS db_name, tds.port, tds.schema, tds.username,
+                     dpc.id IS NOT NULL AS dataproduct_found,
+                     dpc.name AS dataproduct_name, dpc.storage_path,
+                     t.id IS NOT NULL AS tenant_found,
+                     t.name AS tenant_name
+                FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[])
+                     AS req (tenant_id, data_product_id, data_product_version)
+                LEFT JOIN tenant_data_source tds
+                       ON tds.tenant_id = req.tenant_id
+                      AND tds.data_product_id = req.data_product_id
+                      AND tds.data_product_version = req.data_product_version
+                LEFT JOIN data_product_catalog dpc
+                       ON dpc.id = req.data_product_id
+                      AND dpc.version = req.data_product_version
+                LEFT JOIN tenant t
+                       ON t.id = req.tenant_id"""
+
+
+class MetadataCache:
+    '''
+    Process-wide cache of slowly changing metadata_storage rows, every entry
+    expires after ttl_seconds and can be invalidated explicitly
+    '''
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple, Tuple[float, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, row = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return row
+
+    def put(self, key: Tuple, row: Dict) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, row)
+
+    def invalidate(self, tenant: str | None = None, dataproduct: str | None = None) -> None:
+        '''
+        Drop the entries of a tenant and/or a dataproduct, or all entries
+        '''
+        with self._lock:
+            for key in list(self._entries):
+                if (tenant is None or key[0] == tenant) and (dataproduct is None or key[1] == dataproduct):
+                    del self._entries[key]
+
+
+_METADATA_CACHE = MetadataCache(ttl_seconds=app_config.get_metadata_cache_ttl_seconds())
+
+
+def invalidate_metadata_cache(tenant: str | None = None, dataproduct: str | None = None) -> None:
+    _METADATA_CACHE.invalidate(tenant=tenant, dataproduct=dataproduct)
+
 
 class MetadataStorage:
     def __init__(self, metadata_storage_config: SimpleNamespace):
@@ -18,22 +111,31 @@ class MetadataStorage:
         self.scenario = metadata_storage_config.scenario
         self._db = self._get_db(
             db_config=metadata_storage_config.db_config,
-            db_config_masked=metadata_storage_config.db_config_masked
+            db_config_masked=metadata_storage_config.db_config_masked,
+            pool_config=metadata_storage_config.pool_config
         )
         self.step_uuid = time.time()
+        self._log_buffer = execution_log_buffer.get_buffer(
+            self._db, self.logger, metadata_storage_config.options
+        )
+        self.dataproduct = metadata_storage_config.dataproduct
+        self.force = metadata_storage_config.force
+        # the step fingerprints of every provisioning_state owner (the tenant or a shared scope) read so far
+        self._fingerprints: Dict[str, Dict[str, str]] = {}
+        self._fingerprints_lock = threading.Lock()
 
-    def _get_db(self, db_config, db_config_masked) -> Postgres:
+    def _get_db(self, db_config, db_config_masked, pool_config) -> Postgres:
         self.logger.info(f"Connecting to metadata_storage config={db_config_masked}")
-        return Postgres(self.logger, db_config)
+        return Postgres(self.logger, db_config, pool_config)
 
     def _get_datasource_credentials(self) -> str | None:
         return os.getenv('datasource_password')
 
-    def _get_metadata(self, sql: str, entity: str) -> Any:
-        self.logger.info(f"Getting {entity} config from metadata_storage {sql=}")
-        data = self._db.execute_query_fetch_results(query=sql, include_header=True)
+    def _get_metadata(self, sql: str, params: tuple, entity: str) -> Any:
+        self.logger.info(f"Getting {entity} config from metadata_storage {sql=}, {params=}")
+        data = self._db.execute_param_query_fetch_results(sql, params, include_header=True)
         if len(data) < 2:
-            raise NotFoundInMetadataStorageError(f"{entity} ({sql=})")
+            raise NotFoundInMetadataStorageError(f"{entity} ({sql=}, {params=})")
         config = SimpleNamespace(**dict(zip(data[0],data[1])))
         return config
 
@@ -44,10 +146,12 @@ class MetadataStorage:
         sql = """
               SELECT host, database AS db_name, port, schema, username
                 FROM tenant_data_source
-               WHERE tenant_id = '{}'
-                 AND data_product_id = '{}'
-                 AND data_product_version = '{}'""".format(tenant, dataproduct, dataproduct_version)
-        metadata = self._get_metadata(sql, entity='datasource')
+               WHERE tenant_id = %s
+                 AND data_product_id = %s
+                 AND data_product_version = %s"""
+        metadata = self._get_metadata(
+            sql, (tenant, dataproduct, dataproduct_version), entity='datasource'
+        )
         metadata.password = self._get_datasource_credentials()
         metadata.id = datasource_id
         metadata.name = datasource_id
@@ -60,9 +164,9 @@ class MetadataStorage:
         sql = """
               SELECT name, storage_path
                 FROM data_product_catalog
-               WHERE id = '{}'
-                 AND version = '{}'""".format(dataproduct, dataproduct_version)
-        metadata = self._get_metadata(sql, entity='dataproduct')
+               WHERE id = %s
+                 AND version = %s"""
+        metadata = self._get_metadata(sql, (dataproduct, dataproduct_version), entity='dataproduct')
         metadata.storage_path = metadata.storage_path.strip("/")
         return metadata
 
@@ -70,30 +174,245 @@ class MetadataStorage:
         sql = """
               SELECT name
                 FROM tenant
-               WHERE id = '{}'""".format(tenant)
-        return self._get_metadata(sql, entity='tenant')
+               WHERE id = %s"""
+        return self._get_metadata(sql, (tenant,), entity='tenant')
 
-    def execution_log_insert(self, scenario_task:str, result: str):
+    def get_dataproduct_tenants(
+        self, dataproduct: str, dataproduct_version: str, from_version: str | None = None
+    ) -> List[str]:
+        '''
+        The tenants with a datasource for the dataproduct version, only those also having
+        a datasource for from_version when given, ordered by the tenant id
+        '''
         sql = """
-              INSERT INTO execution_log (scenario_type, scenario_task, process_step_id, execution_timestamp, tenant_id, result) 
-                   VALUES (%s, %s, %s, now(), %s, %s)"""
-        params = (self.scenario, scenario_task, self.step_uuid, self.tenant, result)
+              SELECT DISTINCT tds.tenant_id
+                FROM tenant_data_source tds
+               WHERE tds.data_product_id = %s
+                 AND tds.data_product_version = %s"""
+        params: Tuple = (dataproduct, dataproduct_version)
+        if from_version is not None:
+            sql += """
+                 AND EXISTS (SELECT 1
+                               FROM tenant_data_source prev
+                              WHERE prev.tenant_id = tds.tenant_id
+                                AND prev.data_product_id = tds.data_product_id
+                                AND prev.data_product_version = %s)"""
+            params += (from_version,)
+        sql += """
+               ORDER BY tds.tenant_id"""
+        self.logger.info(f"Getting dataproduct tenants from metadata_storage ({params=})")
+        return [row[0] for row in self._db.execute_param_query_fetch_results(sql, params)]
+
+    def fetch_provisioning_metadata(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple, Dict]:
+        '''
+        Read the tenant, dataproduct and datasource rows of many
+        (tenant, dataproduct, dataproduct_version) keys with one query,
+        the complete rows are kept in the metadata cache
+        '''
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        self.logger.info(f"Getting provisioning metadata from metadata_storage ({len(keys)} keys)")
+        params = tuple(list(column) for column in zip(*keys))
+        data = self._db.execute_param_query_fetch_results(
+            PROVISIONING_METADATA_SQL, params, include_header=True
+        )
+        rows: Dict[Tuple, Dict] = {}
+        for values in data[1:]:
+            row = dict(zip(data[0], values))
+            key = (row['tenant_id'], row['data_product_id'], row['data_product_version'])
+            # the first row wins, like the previous single entity lookups
+            rows.setdefault(key, row)
+        for key, row in rows.items():
+            if all(row[f"{entity}_found"] for entity in METADATA_ENTITIES):
+                _METADATA_CACHE.put(key, row)
+        return rows
+
+    def get_provisioning_metadata(
+        self, tenant: str, dataproduct: str, dataproduct_version: str,
+        datasource_id: str
+    ) -> SimpleNamespace:
+        '''
+        Datasource, dataproduct and tenant metadata with one round-trip,
+        or none when the rows are cached and the storage is not forced
+        '''
+        key = (tenant, dataproduct, dataproduct_version)
+        row = None if self.force else _METADATA_CACHE.get(key)
+        if row is None:
+            row = self.fetch_provisioning_metadata([key]).get(key)
+        else:
+            self.logger.info(f"Provisioning metadata cache hit ({key=})")
+        for entity in METADATA_ENTITIES:
+            if row is None or not row[f"{entity}_found"]:
+                raise NotFoundInMetadataStorageError(f"{entity} ({key=})")
+
+        datasource = SimpleNamespace(**{column: row[column] for column in DATASOURCE_COLUMNS})
+        datasource.password = self._get_datasource_credentials()
+        datasource.id = datasource_id
+        datasource.name = datasource_id
+        return SimpleNamespace(
+            datasource=datasource,
+            dataproduct=SimpleNamespace(
+                name=row['dataproduct_name'],
+                storage_path=row['storage_path'].strip("/")
+            ),
+            tenant=SimpleNamespace(name=row['tenant_name'])
+        )
+
+    def execution_log_insert(self, scenario_task:str, result: str, duration_ms: float | None = None):
+        # buffered, the entries are written by flush_execution_log or by the buffer thresholds
+        execution_timestamp = datetime.datetime.now(datetime.timezone.utc)
+        entry = (
+            self.scenario, scenario_task, self.step_uuid, execution_timestamp, self.tenant, result,
+            duration_ms, instrumentation.get_correlation_id()
+        )
+        self._log_buffer.append(entry)
+
+    def flush_execution_log(self) -> None:
+        self._log_buffer.flush()
+
+    def get_execution_log(self, correlation_id: str) -> List[Dict]:
+        '''
+        The execution_log entries of one invocation (or job) in the order they were logged
+        '''
+        sql = """
+              SELECT tenant_id, scenario_type, scenario_task, result, execution_timestamp, duration_ms
+                FROM execution_log
+               WHERE correlation_id = %s
+               ORDER BY execution_timestamp"""
+        data = self._db.execute_param_query_fetch_results(sql, (correlation_id,), include_header=True)
+        return [dict(zip(data[0], row)) for row in data[1:]]
+
+    def _ensure_provisioning_state(self) -> None:
+        if not _PROVISIONING_STATE_READY.is_set():
+            self._db.create_table_if_not_exists(PROVISIONING_STATE_DDL, 'provisioning_state')
+            _PROVISIONING_STATE_READY.set()
+
+    def get_step_fingerprint(self, scenario_task: str, owner: str | None = None) -> str | None:
+        '''
+        Fingerprint of the desired state of the last successful run of the step, the fingerprints
+        of all steps of the owner (the tenant by default) are read with one query
+        '''
+        owner = owner or self.tenant
+        with self._fingerprints_lock:
+            # the fingerprints of a shared owner are re-read, other tenants update them concurrently
+            if owner not in self._fingerprints or owner != self.tenant:
+                self._ensure_provisioning_state()
+                sql = """
+                      SELECT scenario_task, fingerprint
+                        FROM provisioning_state
+                       WHERE tenant_id = %s
+                         AND data_product_id = %s
+                         AND scenario_type = %s"""
+                params = (owner, self.dataproduct or '', self.scenario)
+                rows = self._db.execute_param_query_fetch_results(sql, params)
+                self._fingerprints[owner] = dict(rows)
+            return self._fingerprints[owner].get(scenario_task)
+
+    def set_step_fingerprint(self, scenario_task: str, fingerprint: str, owner: str | None = None) -> None:
+        owner = owner or self.tenant
+        self._ensure_provisioning_state()
+        sql = """
+              INSERT INTO provisioning_state (tenant_id, data_product_id, scenario_type, scenario_task, fingerprint, updated_at)
+                   VALUES (%s, %s, %s, %s, %s, now())
+              ON CONFLICT (tenant_id, data_product_id, scenario_type, scenario_task)
+              DO UPDATE SET fingerprint = EXCLUDED.fingerprint, updated_at = EXCLUDED.updated_at"""
+        params = (owner, self.dataproduct or '', self.scenario, scenario_task, fingerprint)
         self._db.execute_param_query(sql, params)
+        with self._fingerprints_lock:
+            if owner in self._fingerprints:
+                self._fingerprints[owner][scenario_task] = fingerprint
+
+    @contextmanager
+    def advisory_lock(self, name: str) -> Iterator[None]:
+        '''
+        Hold the session advisory lock of name, it serializes a critical section across all
+        instances sharing the metadata storage. The pooled connection is held until the lock is
+        released, the server releases it as well when the connection is lost.
+        '''
+        with _ADVISORY_LOCKS_LOCK:
+            process_lock = _ADVISORY_LOCKS.setdefault(name, threading.Lock())
+        with process_lock, self._db.cursor() as cur:
+            self.logger.info(f"Waiting for advisory lock ({name=})")
+            cur.execute('SELECT pg_advisory_lock(hashtext(%s))', (name,))
+            try:
+                yield
+            finally:
+                cur.execute('SELECT pg_advisory_unlock(hashtext(%s))', (name,))
+
+    def clear_provisioning_state(self) -> None:
+        '''
+        Forget the step fingerprints of the tenant and dataproduct in all scenarios,
+        the next provisioning runs every step
+        '''
+        self._ensure_provisioning_state()
+        sql = """
+              DELETE FROM provisioning_state
+               WHERE tenant_id = %s
+                 AND data_product_id = %s"""
+        self._db.execute_param_query(sql, (self.tenant, self.dataproduct or ''))
+        with self._fingerprints_lock:
+            self._fingerprints.pop(self.tenant, None)
+
+def get_fingerprint(desired_state: Any) -> str:
+    dump = json.dumps(desired_state, sort_keys=True, default=str)
+    return hashlib.sha256(dump.encode('utf-8')).hexdigest()
+
+def _scope_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _SCOPE_LOCKS_LOCK:
+        return _SCOPE_LOCKS.setdefault(key, threading.Lock())
+
+def skip_unchanged(desired_state: Callable[..., Any], scope: Callable[..., str | None] | None = None):
+    '''
+    Skip the step when the fingerprint of desired_state(self, *args, **kwargs) matches
+    the last successful run, unless the metadata storage is forced.
+    scope(self, *args, **kwargs) names the owner of a step shared by many tenants, None means the tenant.
+    Shared steps run one at a time per process, the next tenant then finds them unchanged.
+    Apply it below @execution_log, a skipped step is logged as skipped.
+    '''
+    def decorator(func):
+        def run(self, storage, fingerprint, owner, *args, **kwargs):
+            if not storage.force and storage.get_step_fingerprint(func.__name__, owner) == fingerprint:
+                storage.logger.info(f"Skipping unchanged step {func.__name__} ({owner=}, {fingerprint=})")
+                return STEP_SKIPPED
+            value = func(self, *args, **kwargs)
+            storage.set_step_fingerprint(func.__name__, fingerprint, owner)
+            return value
+
+        @functools.wraps(func)
+        def wrapper_skip_unchanged(self, *args, **kwargs):
+            storage = self.metadata_storage
+            fingerprint = get_fingerprint(desired_state(self, *args, **kwargs))
+            owner = scope(self, *args, **kwargs) if scope is not None else None
+            if owner is None:
+                return run(self, storage, fingerprint, None, *args, **kwargs)
+            with _scope_lock((owner, func.__name__)):
+                return run(self, storage, fingerprint, owner, *args, **kwargs)
+        return wrapper_skip_unchanged
+    return decorator
 
 def execution_log(func):
     @functools.wraps(func)
     def wrapper_metadata_storage_log(self, *args, **kwargs):
+        start = time.monotonic()
         try:
-            value = func(self, *args, **kwargs)
+            with instrumentation.span(f"step.{func.__name__}"):
+                value = func(self, *args, **kwargs)
         except Exception as ex:
             traceback = get_traceback(ex)
             self.metadata_storage.execution_log_insert(
                 scenario_task=func.__name__,
-                result=traceback
+                result=traceback,
+                duration_ms=(time.monotonic() - start) * 1000
             )
             raise ex
         else:
-            self.metadata_storage.execution_log_insert(scenario_task=func.__name__, result='ok')
+            result = STEP_SKIPPED if value == STEP_SKIPPED else 'ok'
+            self.metadata_storage.execution_log_insert(
+                scenario_task=func.__name__,
+                result=result,
+                duration_ms=(time.monotonic() - start) * 1000
+            )
 
         return value
     return wrapper_metadata_storage_log
@@ -0,0 +1,158 @@
+import datetime
+import json
+import queue
+import struct
+import uuid
+from typing import Any, Callable, Iterable, Iterator, List, Sequence
+
+from shared_code.exceptions import CopyAbortedError
+
+COPY_FORMATS = ('csv', 'binary')
+BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+BINARY_TRAILER = struct.pack('!h', -1)
+NULL_FIELD = struct.pack('!i', -1)
+POSTGRES_EPOCH = datetime.datetime(2000, 1, 1)
+POSTGRES_EPOCH_DATE = POSTGRES_EPOCH.date()
+POSTGRES_EPOCH_UTC = POSTGRES_EPOCH.replace(tzinfo=datetime.timezone.utc)
+
+
+def _csv_field(value: Any) -> str:
+    # an unquoted empty field is NULL, a quoted one is an empty string
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, (bytes, bytearray)):
+        value = '\\x' + bytes(value).hex()
+    elif isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def encode_csv(records: Iterable[Sequence[Any]]) -> bytes:
+    return ''.join(
+        ','.join(_csv_field(value) for value in record) + '\n' for record in records
+    ).encode('utf-8')
+
+
+def _text(value: Any) -> bytes:
+    return str(value).encode('utf-8')
+
+
+def _json(value: Any) -> bytes:
+    return (value if isinstance(value, str) else json.dumps(value)).encode('utf-8')
+
+
+def _timestamp(value: datetime.datetime) -> bytes:
+    delta = value - POSTGRES_EPOCH
+    return struct.pack('!q', (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _timestamptz(value: datetime.datetime) -> bytes:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    delta = value - POSTGRES_EPOCH_UTC
+    return struct.pack('!q', (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+BINARY_ENCODERS = {
+    'bool': lambda value: struct.pack('!?', value),
+    'int2': lambda value: struct.pack('!h', value),
+    'int4': lambda value: struct.pack('!i', value),
+    'int8': lambda value: struct.pack('!q', value),
+    'float4': lambda value: struct.pack('!f', value),
+    'float8': lambda value: struct.pack('!d', value),
+    'text': _text,
+    'varchar': _text,
+    'bytea': bytes,
+    'json': _json,
+    'jsonb': lambda value: b'\x01' + _json(value),
+    'uuid': lambda value: (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).bytes,
+    'date': lambda value: struct.pack('!i', (value - POSTGRES_EPOCH_DATE).days),
+    'timestamp': _timestamp,
+    'timestamptz': _timestamptz
+}
+
+
+def get_binary_encoder(column_types: Sequence[str]) -> Callable[[Iterable[Sequence[Any]]], bytes]:
+    '''
+    Encoder of records into binary COPY tuples, column_types are the postgres
+    type names of the columns (int4, int8, text, jsonb, timestamptz, ...)
+    '''
+    unknown = [column_type for column_type in column_types if column_type not in BINARY_ENCODERS]
+    if unknown:
+        raise ValueError(f"Unsupported binary COPY column types {unknown=}")
+    encoders = [BINARY_ENCODERS[column_type] for column_type in column_types]
+    field_count = struct.pack('!h', len(encoders))
+
+    def encode(records: Iterable[Sequence[Any]]) -> bytes:
+        chunks = []
+        for record in records:
+            chunks.append(field_count)
+            for encoder, value in zip(encoders, record):
+                if value is None:
+                    chunks.append(NULL_FIELD)
+                else:
+                    data = encoder(value)
+                    chunks.append(struct.pack('!i', len(data)))
+                    chunks.append(data)
+        return b''.join(chunks)
+    return encode
+
+
+def batches(records: Iterable[Any], batch_rows: int) -> Iterator[List[Any]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def drain(chunks: queue.Queue) -> Iterator[bytes]:
+    '''
+    Encoded batches taken from a queue until a None sentinel,
+    a CopyAbortedError taken from the queue is raised
+    '''
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        if isinstance(chunk, CopyAbortedError):
+            raise chunk
+        yield chunk
+
+
+class CopyStream:
+    '''
+    Read-only file object handed to copy_expert, it pulls encoded batches from an iterable
+    as COPY reads, so COPY streams without the data ever being materialized.
+    An error raised by the iterable makes the COPY fail.
+    '''
+    def __init__(self, chunks: Iterable[bytes], header: bytes = b'', trailer: bytes = b'') -> None:
+        self._chunks = iter(chunks)
+        self._buffer = bytearray(header)
+        self._trailer = trailer
+        self._finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._finished = True
+                self._buffer += self._trailer
+            else:
+                self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
@@ -1,16 +1,198 @@
 from __future__ import annotations
 
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from logging import Logger
 from pathlib import Path
-from typing import Any
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-import psycopg2
-from psycopg2 import errorcodes, errors
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from shared_code import instrumentation, pg_copy
+from shared_code.exceptions import ConnectionPoolExhaustedError, CopyAbortedError
+
+# psycopg2 is imported on first use, so importing this module stays cheap on a cold start
+
+DEFAULT_POOL_CONFIG = SimpleNamespace(
+    min_size=1,
+    max_size=10,
+    max_idle_seconds=300,
+    health_check_after_seconds=30,
+    timeout_seconds=30
+)
+
+_POOLS: Dict[Tuple, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+class ConnectionPool:
+    '''
+    Thread safe pool of physical connections, shared by all Postgres instances
+    with the same connection parameters for the lifetime of the process
+    '''
+    def __init__(self, logger: Logger, connect: Callable[[], Any], pool_config: Any):
+        self.logger = logger
+        self._connect = connect
+        self.min_size = pool_config.min_size
+        self.max_size = max(pool_config.max_size, pool_config.min_size, 1)
+        self.max_idle_seconds = pool_config.max_idle_seconds
+        self.health_check_after_seconds = pool_config.health_check_after_seconds
+        self.timeout_seconds = pool_config.timeout_seconds
+        self._idle: List[Tuple[Any, float]] = []
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def _open(self) -> Any:
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, conn: Any) -> None:
+        import psycopg2
+
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn: Any, idle_since: float) -> bool:
+        import psycopg2
+
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _evict_idle(self) -> List[Any]:
+        # called with self._cond held, the most recently used connections are at the end
+        now = time.monotonic()
+        evicted = []
+        while len(self._idle) > 0 and self._size > self.min_size:
+            conn, idle_since = self._idle[0]
+            if now - idle_since < self.max_idle_seconds:
+                break
+            self._idle.pop(0)
+            self._size -= 1
+            evicted.append(conn)
+        return evicted
+
+    def getconn(self) -> Any:
+        deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            with self._cond:
+                evicted = self._evict_idle()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ConnectionPoolExhaustedError(
+                            f"No connection available in {self.timeout_seconds}s ({self.max_size=})"
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._size += 1
+            for evicted_conn in evicted:
+                evicted_conn.close()
+            if conn is None:
+                return self._open()
+            if self._is_healthy(conn, idle_since):
+                return conn
+            self.logger.info('Discarding broken metadata_storage connection')
+            self._discard(conn)
+
+    def putconn(self, conn: Any, discard: bool = False) -> None:
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        import psycopg2
+
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
+
+
+def get_pool(logger: Logger, config: Any, pool_config: Any = None) -> ConnectionPool:
+    pool_config = pool_config or DEFAULT_POOL_CONFIG
+    key = (config.host, config.port, config.user, config.password, config.db_name, config.schema)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            logger.info(
+                f"Creating metadata_storage connection pool "
+                f"(min_size={pool_config.min_size}, max_size={pool_config.max_size})"
+            )
+            pool = ConnectionPool(logger, lambda: connect(config), pool_config)
+            _POOLS[key] = pool
+        return pool
+
+
+def close_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def connect(config: Any) -> Any:
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+    conn = psycopg2.connect(
+        user=config.user,
+        password=config.password,
+        host=config.host,
+        port=config.port,
+        database=config.db_name
+    )
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    # search_path is a session setting, it is set once per physical connection
+    with conn.cursor() as cur:
+        cur.execute(f'SET SEARCH_PATH TO {config.schema}')
+    return conn
 
 
 class Postgres:
-    def __init__(self, logger: Logger, config: Any):
+    def __init__(self, logger: Logger, config: Any, pool_config: Any = None):
         self.logger = logger
         self.host = config.host
         self.port = config.port
@@ -18,39 +200,48 @@ class Postgres:
         self.password = config.password
         self.name = config.db_name
         self.schema = config.schema
-        self._conn = self.get_connection()
-        self._cur = self._conn.cursor()
-        self.execute_query(f'SET SEARCH_PATH TO {self.schema}')
+        self._pool = get_pool(logger, config, pool_config)
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return self._pool
 
     def close_connections(self) -> None:
-        if self._conn:
-            self._conn.close()
-
-    def get_connection(self) -> Any:
-        conn = psycopg2.connect(
-            user=self.user,
-            password=self.password,
-            host=self.host,
-            port=self.port,
-            database=self.name
-        )
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        return conn
+        # connections are borrowed from the pool per query, no connection is held between queries
+        pass
+
+    @contextmanager
+    def cursor(self) -> Iterator[Any]:
+        # the span covers waiting for a pooled connection as well as the query round-trips
+        with instrumentation.span('postgres.query'):
+            with self._pool.connection() as conn:
+                with conn.cursor() as cur:
+                    yield cur
 
     def execute_query(self, query: str) -> None:
-        self._cur.execute(query)
+        with self.cursor() as cur:
+            cur.execute(query)
 
     def execute_param_query(self, query: str, params: tuple) -> None:
-        self._cur.execute(query, params)
+        with self.cursor() as cur:
+            cur.execute(query, params)
 
     def execute_query_fetch_results(self, query: str, include_header: bool = False) -> list[Any]:
-        self.execute_query(query)
-        data = self._cur.fetchall()
-        if include_header:
-            data.insert(0, [x.name for x in self._cur.description])
+        return self.execute_param_query_fetch_results(query, None, include_header=include_header)
+
+    def execute_param_query_fetch_results(
+        self, query: str, params: tuple | None, include_header: bool = False
+    ) -> list[Any]:
+        with self.cursor() as cur:
+            cur.execute(query, params)
+            data = cur.fetchall()
+            if include_header:
+                data.insert(0, [x.name for x in cur.description])
         return data
 
     def create_table_if_not_exists(self, sql_stmt: str, table_name: str) -> bool:
+        from psycopg2 import errorcodes, errors
+
         table_created = False
         try:
             self.execute_query(sql_stmt)
@@ -65,4 +256,101 @@ class Postgres:
             COPY {table_name} FROM STDIN CSV QUOTE e'\\x01' DELIMITER e'\\x02'
         """
         with open(file, encoding="utf-8") as fle:
-            self._cur.copy_expert(stmt, fle)
+            with self.cursor() as cur:
+                cur.copy_expert(stmt, fle)
+
+    def copy_records(
+        self,
+        table_name: str,
+        records: Iterable[Sequence[Any]],
+        columns: Sequence[str],
+        copy_format: str = 'csv',
+        column_types: Optional[Sequence[str]] = None,
+        parallel: int = 1,
+        batch_rows: int = 1000,
+        max_buffered_batches: Optional[int] = None
+    ) -> int:
+        '''
+        Stream records (sequences of column values) from any iterable into table_name with COPY,
+        without temp files. The records are encoded in batches of batch_rows as COPY reads them,
+        binary COPY needs the postgres type of every column in column_types. With parallel > 1
+        the batches pass a bounded queue, so only about max_buffered_batches batches are held
+        in memory, and are spread over several pooled connections. Every connection commits
+        its own COPY, so a failed parallel load may leave the rows of the other connections loaded.
+        Returns the number of records sent.
+        '''
+        if copy_format not in pg_copy.COPY_FORMATS:
+            raise ValueError(f"{copy_format=} must be one of {pg_copy.COPY_FORMATS}")
+        if copy_format == 'binary':
+            if column_types is None or len(column_types) != len(columns):
+                raise ValueError('Binary COPY needs a column type for every column')
+            encode = pg_copy.get_binary_encoder(column_types)
+            header, trailer = pg_copy.BINARY_HEADER, pg_copy.BINARY_TRAILER
+        else:
+            encode = pg_copy.encode_csv
+            header, trailer = b'', b''
+        stmt = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT {copy_format})"
+        parallel = max(1, parallel)
+        self.logger.info(f"Copying records into {table_name} ({copy_format=}, {parallel=})")
+        if parallel == 1:
+            # a single COPY pulls the batches on the calling thread, no worker threads are needed,
+            # so it also works at interpreter exit
+            with instrumentation.span('postgres.copy', table_name=table_name):
+                rows = 0
+
+                def encoded() -> Iterator[bytes]:
+                    nonlocal rows
+                    for batch in pg_copy.batches(records, batch_rows):
+                        yield encode(batch)
+                        rows += len(batch)
+
+                with self.cursor() as cur:
+                    cur.copy_expert(stmt, pg_copy.CopyStream(encoded(), header, trailer))
+            self.logger.info(f"Copied {rows} records into {table_name}")
+            return rows
+        chunks: queue.Queue = queue.Queue(maxsize=max(1, max_buffered_batches or 2 * parallel))
+        failed = threading.Event()
+        futures: List[Future] = []
+
+        def copy() -> None:
+            try:
+                with self.cursor() as cur:
+                    cur.copy_expert(stmt, pg_copy.CopyStream(pg_copy.drain(chunks), header, trailer))
+            except BaseException:
+                failed.set()
+                raise
+
+        def put(chunk: Any) -> bool:
+            while True:
+                try:
+                    chunks.put(chunk, timeout=0.1)
+                    return True
+                except queue.Full:
+                    if all(future.done() for future in futures):
+                        return False
+
+        rows = 0
+        producer_error = None
+        with instrumentation.span('postgres.copy', table_name=table_name):
+            with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='postgres_copy') as executor:
+                futures.extend(instrumentation.submit(executor, copy) for _ in range(parallel))
+                try:
+                    for batch in pg_copy.batches(records, batch_rows):
+                        if failed.is_set() or not put(encode(batch)):
+                            break
+                        rows += len(batch)
+                except BaseException as ex:
+                    producer_error = ex
+                if producer_error is not None or failed.is_set():
+                    end = CopyAbortedError(f"COPY into {table_name} aborted after {rows} records")
+                else:
+                    end = None
+                for _ in futures:
+                    put(end)
+            if producer_error is not None:
+                raise producer_error
+            for future in futures:
+                if future.exception() is not None:
+                    raise future.exception()
+        self.logger.info(f"Copied {rows} records into {table_name}")
+        return rows
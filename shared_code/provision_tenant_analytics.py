@@ -0,0 +1,243 @@
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import AbstractSet, List, Optional
+
+from shared_code import app_config, fce_config, metadata_storage
+from shared_code.exceptions import SharedDatasourceMismatchError
+from shared_code.step_scheduler import Step, StepScheduler
+from shared_code.tenant_scenario import TenantScenario
+
+
+class ProvisionTenant(TenantScenario):
+    def __init__(
+        self,
+        args,
+        clients: Optional[SimpleNamespace] = None,
+        flush_execution_log: bool = True,
+        created_user_groups: AbstractSet[str] = frozenset()
+    ) -> None:
+        super().__init__(args, fce_config.FceConfig(args), clients, flush_execution_log)
+        # the user groups already created by the caller, e.g. for a whole batch of tenants
+        self.created_user_groups = created_user_groups
+        self.metadata = SimpleNamespace()
+
+    def _datasource_desired_state(self) -> dict:
+        desired_state = {k: v for k, v in self.metadata.datasource.__dict__.items() if k != 'password'}
+        password = self.metadata.datasource.password or ''
+        desired_state['password_sha256'] = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return desired_state
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: self._datasource_desired_state(), scope=lambda self: self.fcc.shared_scope
+    )
+    def create_datasource(self) -> None:
+        if self.fcc.shared_scope is not None:
+            self._create_shared_datasource()
+            return
+        self.gdata.create_or_update_data_source(config=self.metadata.datasource)
+
+    def _create_shared_datasource(self) -> None:
+        '''
+        The datasource shared by the tenants of the parent workspace is created from the row of
+        the first tenant provisioned, a tenant whose row differs fails instead of repointing the
+        datasource of all tenants. force rewrites it on purpose, e.g. once all rows were changed.
+        '''
+        owner = self.fcc.shared_scope
+        fingerprint = metadata_storage.get_fingerprint(self._datasource_desired_state())
+        # the check and the write must not interleave with another instance's first write
+        with self.metadata_storage.advisory_lock(f"provisioning_state.{owner}.create_datasource"):
+            recorded = self.metadata_storage.get_step_fingerprint('create_datasource', owner)
+            if recorded not in (None, fingerprint) and not self.metadata_storage.force:
+                raise SharedDatasourceMismatchError(
+                    f"datasource_id={self.fcc.datasource_id}, tenant={self.fcc.tenant}, {owner=}"
+                )
+            self.gdata.create_or_update_data_source(config=self.metadata.datasource)
+            self.metadata_storage.set_step_fingerprint('create_datasource', fingerprint, owner)
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: {'workspace_id': self.fcc.parent_workspace_id},
+        scope=lambda self: self.fcc.shared_scope
+    )
+    def create_empty_parent(self) -> None:
+        workspace_id = self.fcc.parent_workspace_id
+        self.gdata.create_or_update_workspace(workspace_id=workspace_id, name=workspace_id)
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self, parent_id: {'workspace_id': self.fcc.child_workspace_id, 'parent_id': parent_id}
+    )
+    def create_empty_child(self, parent_id: str) -> None:
+        workspace_id = self.fcc.child_workspace_id
+        self.gdata.create_or_update_workspace(
+            workspace_id=workspace_id,
+            name=workspace_id,
+            parent_id=parent_id
+        )
+
+    @metadata_storage.execution_log
+    def get_metadata(self) -> None:
+        metadata = self.metadata_storage.get_provisioning_metadata(
+             tenant=self.fcc.tenant,
+             dataproduct=self.fcc.dataproduct,
+             dataproduct_version=self.fcc.dataproduct_version,
+             datasource_id=self.fcc.datasource_id
+        )
+        self.metadata.datasource = metadata.datasource
+        self.metadata.dataproduct = metadata.dataproduct
+        self.metadata.tenant = metadata.tenant
+
+    @metadata_storage.execution_log
+    def get_dataproduct(self) -> None:
+        self.metadata.declarative_dataproduct = self.dataproduct_repository.get_cached_dataproduct(
+            self.metadata.dataproduct.storage_path
+        )
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self, datasource_id, workspace_id: {
+            'dataproduct_fingerprint': self.metadata.declarative_dataproduct.fingerprint,
+            'datasource_id': datasource_id,
+            'workspace_id': workspace_id
+        },
+        scope=lambda self, datasource_id, workspace_id: self.fcc.shared_scope
+    )
+    def deploy_dataproduct(self, datasource_id: str, workspace_id: str) -> None:
+        declarative_dataproduct = self.metadata.declarative_dataproduct
+        src_dir = Path(declarative_dataproduct.path)
+        cache_key = (
+            self.fcc.dataproduct, self.fcc.dataproduct_version, declarative_dataproduct.fingerprint
+        )
+        self.gdata.put_declarative_pdm(src_dir, datasource_id, cache_key=cache_key)
+        self.gdata.put_declarative_ldm(src_dir, workspace_id, datasource_id, cache_key=cache_key)
+        self.gdata.put_declarative_am(src_dir, workspace_id, cache_key=cache_key)
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: {
+            'filter_id': self.fcc.workspace_data_filter_id,
+            'column_name': self.fcc.workspace_topology.data_filter_column,
+            'parent_workspace_id': self.fcc.parent_workspace_id
+        },
+        scope=lambda self: self.fcc.shared_scope
+    )
+    def create_workspace_data_filter(self) -> None:
+        # created once per shared parent workspace, the tenants only add their settings
+        self.gdata.create_workspace_data_filter(
+            filter_id=self.fcc.workspace_data_filter_id,
+            column_name=self.fcc.workspace_topology.data_filter_column,
+            parent_workspace_id=self.fcc.parent_workspace_id
+        )
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: {
+            'filter_id': self.fcc.workspace_data_filter_id,
+            'workspace_id': self.fcc.child_workspace_id,
+            'filter_values': [self.fcc.tenant]
+        }
+    )
+    def assign_workspace_data_filter(self) -> None:
+        self.gdata.set_workspace_data_filter(
+            filter_id=self.fcc.workspace_data_filter_id,
+            workspace_id=self.fcc.child_workspace_id,
+            filter_values=[self.fcc.tenant]
+        )
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: [usergroup.id for usergroup in self.fcc.default_usergroups]
+    )
+    def create_user_groups(self) -> None:
+        user_group_ids = [
+            usergroup.id for usergroup in self.fcc.default_usergroups
+            if usergroup.id not in self.created_user_groups
+        ]
+        if user_group_ids:
+            self.gdata.create_or_update_user_groups(user_group_ids=user_group_ids)
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: [
+            [permission.workspace_id, [[g.id, g.permission] for g in permission.usergroups]]
+            for permission in self.fcc.workspace_permissions
+        ]
+    )
+    def assign_workspace_permissions(self) -> None:
+        self.gdata.assign_workspaces_usergroup_permissions(
+            workspace_permissions=self.fcc.workspace_permissions
+        )
+
+    @metadata_storage.execution_log
+    @metadata_storage.skip_unchanged(
+        lambda self: {
+            'user_group': self.fcc.get_default_usergroup_for_default_users(),
+            'users': [user.user_id for user in self.fcc.default_users]
+        }
+    )
+    def provision_default_users(self) -> None:
+        user_group = self.fcc.get_default_usergroup_for_default_users()
+        for user in self.fcc.default_users:
+            user.user_group_ids = [user_group]
+            self.gdata.create_or_update_user(config=user)
+
+    def steps(self) -> List[Step]:
+        parent_workspace_id = self.fcc.parent_workspace_id
+        # in the shared topology nobody gets access to the child before its data is filtered
+        permissions_requires = ['user_groups', 'parent_workspace', 'child_workspace']
+        if self.fcc.shared_parent:
+            permissions_requires.append('workspace_data_filter')
+        steps = [
+            Step('get_metadata', self.get_metadata,
+                 provides=['datasource_metadata', 'dataproduct_metadata', 'tenant_metadata']),
+            Step('get_dataproduct', self.get_dataproduct,
+                 requires=['dataproduct_metadata'],
+                 provides=['declarative_dataproduct']),
+            Step('create_datasource', self.create_datasource,
+                 requires=['datasource_metadata'],
+                 provides=['datasource']),
+            Step('create_empty_parent', self.create_empty_parent,
+                 provides=['parent_workspace']),
+            Step('create_empty_child', lambda: self.create_empty_child(parent_id=parent_workspace_id),
+                 requires=['parent_workspace'],
+                 provides=['child_workspace']),
+            Step('deploy_dataproduct',
+                 lambda: self.deploy_dataproduct(
+                     datasource_id=self.fcc.datasource_id,
+                     workspace_id=parent_workspace_id
+                 ),
+                 requires=['declarative_dataproduct', 'datasource', 'parent_workspace'],
+                 provides=['parent_model']),
+            Step('create_user_groups', self.create_user_groups,
+                 provides=['user_groups']),
+            Step('assign_workspace_permissions', self.assign_workspace_permissions,
+                 requires=permissions_requires,
+                 provides=['workspace_permissions']),
+            Step('provision_default_users', self.provision_default_users,
+                 requires=['user_groups'],
+                 provides=['default_users']),
+        ]
+        if self.fcc.shared_parent:
+            steps += [
+                Step('create_workspace_data_filter', self.create_workspace_data_filter,
+                     requires=['parent_workspace'],
+                     provides=['workspace_data_filter_definition']),
+                Step('assign_workspace_data_filter', self.assign_workspace_data_filter,
+                     requires=['parent_model', 'child_workspace', 'workspace_data_filter_definition'],
+                     provides=['workspace_data_filter']),
+            ]
+        return steps
+
+    @metadata_storage.execution_log
+    def provision_tenant(self) -> None:
+        # logged after all the steps as PROVISION_TASK, its entry marks the end of the invocation
+        StepScheduler(
+            self.steps(),
+            max_workers=app_config.get_step_max_workers(),
+            logger=self.fcc.logger
+        ).run()
+
+    def run(self) -> None:
+        self.provision_tenant()
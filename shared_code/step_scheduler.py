@@ -0,0 +1,104 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from logging import Logger
+from typing import Callable, Dict, Iterable, List, Set
+
+from shared_code import instrumentation
+from shared_code.exceptions import InvalidStepGraphError
+
+
+class Step:
+    '''
+    A unit of work in a step graph. A step can start once every step
+    providing one of its required resources has finished.
+    '''
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], None],
+        requires: Iterable[str] = (),
+        provides: Iterable[str] = ()
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.provides = tuple(provides)
+
+    def __repr__(self) -> str:
+        return f"Step({self.name!r}, requires={self.requires}, provides={self.provides})"
+
+
+def resolve_dependencies(steps: List[Step]) -> Dict[str, Set[str]]:
+    '''
+    Map every step name to the names of the steps it depends on
+    '''
+    providers = {}
+    for step in steps:
+        for resource in step.provides:
+            if resource in providers:
+                raise InvalidStepGraphError(
+                    f"{resource=} is provided by {providers[resource]} and {step.name}"
+                )
+            providers[resource] = step.name
+
+    dependencies = {}
+    for step in steps:
+        missing = [resource for resource in step.requires if resource not in providers]
+        if missing:
+            raise InvalidStepGraphError(f"{step.name} requires {missing=} which no step provides")
+        dependencies[step.name] = {providers[resource] for resource in step.requires}
+
+    resolved: Set[str] = set()
+    pending = set(dependencies)
+    while pending:
+        ready = {name for name in pending if dependencies[name] <= resolved}
+        if not ready:
+            raise InvalidStepGraphError(f"Cycle detected between steps {sorted(pending)}")
+        resolved |= ready
+        pending -= ready
+    return dependencies
+
+
+class StepScheduler:
+    '''
+    Run a graph of steps, each step starts as soon as all its dependencies finished.
+    The first failure stops scheduling new steps, the running ones are awaited
+    and the failure is re-raised.
+    '''
+    def __init__(self, steps: List[Step], max_workers: int, logger: Logger) -> None:
+        self.steps = {step.name: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise InvalidStepGraphError('Step names must be unique')
+        self.dependencies = resolve_dependencies(steps)
+        self.max_workers = max(1, max_workers)
+        self.logger = logger
+
+    def _ready(self, finished: Set[str], started: Set[str]) -> List[str]:
+        return [
+            name for name in self.steps
+            if name not in started and self.dependencies[name] <= finished
+        ]
+
+    def run(self) -> None:
+        finished: Set[str] = set()
+        started: Set[str] = set()
+        running: Dict[Future, str] = {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                if failure is None:
+                    for name in self._ready(finished, started):
+                        self.logger.info(f"Starting step {name}")
+                        started.add(name)
+                        running[instrumentation.submit(executor, self.steps[name].func)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    exception = future.exception()
+                    if exception is None:
+                        finished.add(name)
+                    elif failure is None:
+                        failure = exception
+        if failure is not None:
+            raise failure
@@ -0,0 +1,75 @@
+from logging import Logger
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from shared_code import (app_config, dataproduct_repository, gooddata,
+                         instrumentation, logger, metadata_storage)
+
+# the execution_log tasks logged when the whole invocation of a tenant has finished
+PROVISION_TASK = 'provision_tenant'
+DELETE_TASK = 'delete_tenant'
+
+
+def get_clients(log: Logger) -> SimpleNamespace:
+    '''
+    Create the tenant independent clients, these can be shared by many TenantScenario instances
+    '''
+    clients = SimpleNamespace()
+    clients.gdata = gooddata.GoodData(app_config.get_gooddata_config(logger=log))
+    clients.dataproduct_repository = dataproduct_repository.DataproductRepository(
+        app_config.get_dataproduct_repository_config(logger=log)
+    )
+    return clients
+
+
+class TenantScenario:
+    '''
+    Base of the scenarios run for one tenant (ProvisionTenant, DeleteTenant), run executes
+    the steps and main wraps it with the correlation scope, the timings and the execution_log flush
+    '''
+    def __init__(
+        self,
+        args: Any,
+        fcc: Any,
+        clients: Optional[SimpleNamespace] = None,
+        flush_execution_log: bool = True
+    ) -> None:
+        self.fcc = fcc
+        self.flush_execution_log = flush_execution_log
+        clients = clients or get_clients(self.fcc.logger)
+        self.gdata = clients.gdata
+        self.metadata_storage = metadata_storage.MetadataStorage(self.fcc.metadata_storage_config)
+        self.dataproduct_repository = clients.dataproduct_repository
+        # ties the execution_log entries and the timing spans of one invocation together
+        self.correlation_id = (
+            getattr(args, 'correlation_id', None) or instrumentation.new_correlation_id()
+        )
+
+    def run(self) -> None:
+        raise NotImplementedError
+
+    def main(self):
+        with instrumentation.correlation_scope(self.correlation_id):
+            try:
+                self.run()
+                print("The execution finished successfully")
+            except Exception as ex:
+                traceback = logger.get_traceback(ex)
+                self.fcc.logger.error(traceback)
+                print(f"The execution failed (exeption={ex.__class__.__name__})")
+                raise
+            finally:
+                self._log_timings()
+                if self.flush_execution_log:
+                    self._flush_execution_log()
+
+    def _log_timings(self) -> None:
+        timings = instrumentation.summarize_spans(instrumentation.get_spans(self.correlation_id))
+        self.fcc.logger.info(f"Timings (correlation_id={self.correlation_id}, {timings=})")
+
+    def _flush_execution_log(self) -> None:
+        try:
+            self.metadata_storage.flush_execution_log()
+        except Exception as ex:
+            # the entries stay buffered and are retried by the next flush, the step failure is not masked
+            self.fcc.logger.error(f"Flushing execution_log failed: {logger.get_traceback(ex)}")
@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import datetime
+import email.utils
+import functools
+import logging
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar('T')
+
+# the statuses a request is retried on, the throttling ones also shrink the concurrency
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+THROTTLING_STATUSES = (429, 503)
+# errors of the http clients raised before a response was received, matched by class name
+# so neither the GoodData nor the Azure client has to be imported to classify them
+TRANSIENT_ERROR_NAMES = (
+    'ServiceRequestError', 'ServiceResponseError', 'IncompleteReadError',
+    'MaxRetryError', 'NewConnectionError', 'ProtocolError', 'ReadTimeoutError'
+)
+RETRY_AFTER_HEADERS = ('retry-after-ms', 'x-ms-retry-after-ms', 'retry-after')
+# the concurrency is halved at most once per interval, a burst of throttled responses
+# to requests sent together is one congestion signal
+DECREASE_INTERVAL_SECONDS = 1.0
+
+# conservative limits of an unknown host, rate None does not pace the requests at all
+DEFAULT_OPTIONS = SimpleNamespace(
+    rate=50.0,
+    burst=100,
+    max_concurrency=32,
+    min_concurrency=2,
+    max_attempts=5,
+    backoff_base_seconds=0.5,
+    backoff_max_seconds=30.0
+)
+
+_logger = logging.getLogger(__name__)
+# the throttles whose call is running in this context, their nested calls pass through
+_ACTIVE: contextvars.ContextVar = contextvars.ContextVar('throttling_active', default=frozenset())
+
+
+def _get_header(headers: Any, name: str) -> Optional[str]:
+    if headers is None:
+        return None
+    for key, value in dict(headers).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def get_retry_after(headers: Any) -> Optional[float]:
+    '''
+    Seconds to wait by the Retry-After (or retry-after-ms) header, in seconds or as an http date
+    '''
+    for name in RETRY_AFTER_HEADERS:
+        value = _get_header(headers, name)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+            return max(0.0, seconds / 1000 if name.endswith('-ms') else seconds)
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            continue
+        return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    return None
+
+
+def classify_error(ex: Exception) -> Tuple[bool, bool, Optional[float]]:
+    '''
+    (retryable, throttled, retry_after) of an error of the GoodData or Azure clients,
+    the status and headers are read from the ApiException and HttpResponseError shapes
+    '''
+    if isinstance(ex, (ConnectionError, TimeoutError)) or any(
+        cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(ex).__mro__
+    ):
+        return True, False, None
+    status = getattr(ex, 'status', None) or getattr(ex, 'status_code', None)
+    if status not in RETRY_STATUSES:
+        return False, False, None
+    headers = getattr(ex, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(ex, 'response', None), 'headers', None)
+    return True, status in THROTTLING_STATUSES, get_retry_after(headers)
+
+
+class HostThrottle:
+    '''
+    Client-side limit of the requests to one host, shared by all threads and event loops
+    of the process. A token bucket paces the requests to rate per second (when set), the number of
+    requests in flight is adjusted AIMD-style between min_concurrency and max_concurrency:
+    every success adds 1/limit, a throttled response halves it. A Retry-After pauses the
+    whole host. Failed idempotent calls are retried with full jitter exponential backoff.
+    '''
+    def __init__(self, host: str, options: SimpleNamespace) -> None:
+        self.host = host
+        self.options = options
+        self._limit = float(options.max_concurrency)
+        self._in_flight = 0
+        self._tokens = float(options.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _try_acquire(self) -> Optional[float]:
+        '''
+        Take a slot and a token, returns 0 when taken, the seconds until a token (or the end
+        of a pause) otherwise, or None when all slots are taken. Called with the condition held.
+        '''
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= self.limit:
+            return None
+        if self.options.rate is None:
+            self._in_flight += 1
+            return 0
+        self._tokens = min(
+            float(self.options.burst), self._tokens + (now - self._refilled_at) * self.options.rate
+        )
+        self._refilled_at = now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.options.rate
+        self._tokens -= 1
+        self._in_flight += 1
+        return 0
+
+    def acquire(self) -> None:
+        with self._condition:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return
+                # released slots notify, the timeout covers the token refill and pauses
+                self._condition.wait(timeout=wait)
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def release(self, throttled: bool = False, retry_after: Optional[float] = None) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._decreased_at >= DECREASE_INTERVAL_SECONDS:
+                    self._decreased_at = now
+                    self._limit = max(float(self.options.min_concurrency), self._limit / 2)
+                    _logger.warning(f"Throttled by {self.host}, concurrency limit lowered to {self.limit}")
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            else:
+                self._limit = min(float(self.options.max_concurrency), self._limit + 1 / self._limit)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            # the host is paused until then, the jitter spreads the retries after the pause
+            return retry_after + random.uniform(0, self.options.backoff_base_seconds)
+        ceiling = min(self.options.backoff_max_seconds, self.options.backoff_base_seconds * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def _failed(self, ex: Exception, attempt: int, idempotent: bool) -> Optional[float]:
+        '''
+        Release the slot of a failed attempt, returns the delay before the retry or None
+        '''
+        retryable, throttled, retry_after = classify_error(ex)
+        self.release(throttled=throttled, retry_after=retry_after)
+        # a 429 was rejected before it was processed, only then a non idempotent call is sent again
+        status = getattr(ex, 'status', None) or getattr(ex, 'status_code', None)
+        if not retryable or not (idempotent or status == 429) or attempt + 1 >= self.options.max_attempts:
+            return None
+        delay = self._backoff(attempt, retry_after)
+        _logger.warning(
+            f"Retrying a request to {self.host} in {delay:.2f}s"
+            f" (attempt={attempt + 1}, error={ex.__class__.__name__}: {ex})"
+        )
+        return delay
+
+    def call(self, func: Callable[[], T], idempotent: bool = True) -> T:
+        '''
+        Run func once a slot and a token are free, retrying it on transient errors
+        '''
+        active = _ACTIVE.get()
+        if self in active:
+            return func()
+        token = _ACTIVE.set(active | {self})
+        try:
+            attempt = 0
+            while True:
+                self.acquire()
+                try:
+                    result = func()
+                except Exception as ex:
+                    delay = self._failed(ex, attempt, idempotent)
+                    if delay is None:
+                        raise
+                else:
+                    self.release()
+                    return result
+                attempt += 1
+                time.sleep(delay)
+        finally:
+            _ACTIVE.reset(token)
+
+    async def call_async(self, func: Callable[[], Awaitable[T]], idempotent: bool = True) -> T:
+        '''
+        Awaitable variant of call for coroutine clients, func returns a new awaitable for every attempt
+        '''
+        active = _ACTIVE.get()
+        if self in active:
+            return await func()
+        token = _ACTIVE.set(active | {self})
+        try:
+            attempt = 0
+            while True:
+                await self.acquire_async()
+                try:
+                    result = await func()
+                except Exception as ex:
+                    delay = self._failed(ex, attempt, idempotent)
+                    if delay is None:
+                        raise
+                else:
+                    self.release()
+                    return result
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            _ACTIVE.reset(token)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_THROTTLES: Dict[str, HostThrottle] = {}
+_THROTTLES_LOCK = threading.Lock()
+
+
+def get_throttle(host: str, options: Optional[SimpleNamespace] = None) -> HostThrottle:
+    '''
+    The throttle of the host shared by the process, options of the first call are used
+    '''
+    with _THROTTLES_LOCK:
+        throttle = _THROTTLES.get(host)
+        if throttle is None:
+            throttle = HostThrottle(host, options or DEFAULT_OPTIONS)
+            _THROTTLES[host] = throttle
+        return throttle
+
+
+def throttled(idempotent: Union[bool, Callable[..., bool]] = True) -> Callable:
+    '''
+    Run a method of a client with a throttle attribute through the throttle, idempotent is
+    a bool or a callable of the method's arguments. The calls the method makes run through
+    the same throttle directly, so it must not fan them out to other threads.
+    '''
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            is_idempotent = idempotent(self, *args, **kwargs) if callable(idempotent) else idempotent
+            return self.throttle.call(lambda: func(self, *args, **kwargs), idempotent=is_idempotent)
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+import importlib
+from logging import Logger
+
+from shared_code import app_config, fce_config, logger
+from shared_code.postgres import Postgres
+from shared_code.tenant_scenario import get_clients
+
+# imported lazily by the shared code, a warm-up imports them ahead of the first request
+HEAVY_MODULES = ('gooddata_sdk', 'azure.storage.blob', 'psycopg2.extras', 'yaml')
+
+
+def warm_up(log: Logger = None) -> None:
+    '''
+    Import the heavy dependencies and create the process-wide clients (GoodData sdk,
+    blob container client, metadata_storage connection pool) ahead of the first request
+    '''
+    log = log or logger.get_logger(fce_config.SCENARIO)
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+    fce_config.load_config()
+    try:
+        get_clients(log)
+        storage_config = app_config.get_metadata_storage_config(
+            tenant=None, scenario=fce_config.SCENARIO, logger=log
+        )
+        # opens the first pooled connection
+        Postgres(log, storage_config.db_config, storage_config.pool_config).execute_query('SELECT 1')
+    except Exception as ex:
+        # the clients are created by the first request instead
+        log.warning(f"Warm-up of the clients failed: {logger.get_traceback(ex)}")
+    else:
+        log.info('Warm-up finished')
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+from shared_code.azure_blob_storage import BlobIndex
+
+
+@pytest.fixture
+def index():
+    names = ['ldm/datasets/a.yaml', 'ldm/datasets/b.yaml', 'ldm/date_instances/d.yaml', 'pdm.yaml']
+    return BlobIndex('dataproducts/dp/v1', [SimpleNamespace(name=f'dataproducts/dp/v1/{name}') for name in names])
+
+
+def test_files(index):
+    assert index.files('dataproducts/dp/v1') == ['pdm.yaml']
+    assert sorted(index.files('dataproducts/dp/v1/ldm/datasets/')) == ['a.yaml', 'b.yaml']
+    assert sorted(index.files('dataproducts/dp/v1/ldm', recursive=True)) == [
+        'datasets/a.yaml', 'datasets/b.yaml', 'date_instances/d.yaml'
+    ]
+
+
+def test_dirs(index):
+    assert index.dirs('dataproducts/dp/v1') == ['ldm']
+    assert sorted(index.dirs('dataproducts/dp/v1', recursive=True)) == [
+        'ldm', 'ldm/datasets', 'ldm/date_instances'
+    ]
+
+
+def test_blobs(index):
+    assert sorted(blob.name for blob in index.blobs('dataproducts/dp/v1/ldm/datasets')) == [
+        'dataproducts/dp/v1/ldm/datasets/a.yaml', 'dataproducts/dp/v1/ldm/datasets/b.yaml'
+    ]
+    assert len(index.blobs('dataproducts/dp/v1')) == 4
+
+
+def test_missing_directory_is_empty(index):
+    assert index.files('dataproducts/dp/v1/analytics_model', recursive=True) == []
+    assert index.dirs('dataproducts/dp/v1/analytics_model') == []
+    assert index.blobs('dataproducts/dp/v1/analytics_model') == []
+
+
+def test_path_outside_of_the_root(index):
+    with pytest.raises(ValueError, match='outside'):
+        index.files('dataproducts/dp/v2')
@@ -0,0 +1,120 @@
+import hashlib
+import io
+import os
+import tarfile
+
+import pytest
+
+from shared_code import dataproduct_archive
+from shared_code.dataproduct_archive import _member_path, build_archive, extract_archive
+from shared_code.exceptions import DataproductArchiveError
+
+
+def make_archive(members):
+    '''
+    A tar.gz with the (TarInfo, data) members and a manifest matching it
+    '''
+    raw = io.BytesIO()
+    with tarfile.open(fileobj=raw, mode='w:gz') as tar:
+        for member, data in members:
+            tar.addfile(member, io.BytesIO(data) if data is not None else None)
+    files = [member for member, _ in members if member.isfile()]
+    manifest = {
+        'format': dataproduct_archive.ARCHIVE_FORMAT,
+        'sha256': hashlib.sha256(raw.getvalue()).hexdigest(),
+        'files': len(files),
+        'size': sum(member.size for member in files)
+    }
+    return raw.getvalue(), manifest
+
+
+def file_member(name, data):
+    member = tarfile.TarInfo(name)
+    member.size = len(data)
+    return member, data
+
+
+@pytest.fixture
+def dest_dir(tmp_path):
+    return os.path.realpath(tmp_path / 'dest')
+
+
+@pytest.mark.parametrize('name', [
+    '../escape.yaml',
+    'ldm/../../escape.yaml',
+    '/etc/passwd',
+    'C:/windows/escape.yaml',
+    'ldm\\..\\escape.yaml',
+    '.',
+])
+def test_member_path_rejects_paths_outside_of_the_destination(dest_dir, name):
+    with pytest.raises(DataproductArchiveError):
+        _member_path(dest_dir, name)
+
+
+def test_member_path_rejects_a_symlinked_directory(dest_dir, tmp_path):
+    os.makedirs(dest_dir)
+    os.symlink(tmp_path, os.path.join(dest_dir, 'ldm'))
+    with pytest.raises(DataproductArchiveError):
+        _member_path(dest_dir, 'ldm/escape.yaml')
+
+
+def test_member_path_stays_inside_the_destination(dest_dir):
+    assert _member_path(dest_dir, 'ldm/datasets/a.yaml') == os.path.join(dest_dir, 'ldm', 'datasets', 'a.yaml')
+    assert _member_path(dest_dir, 'ldm//a.yaml') == os.path.join(dest_dir, 'ldm', 'a.yaml')
+
+
+def test_build_and_extract_round_trip(tmp_path, dest_dir):
+    src_dir = tmp_path / 'src'
+    (src_dir / 'ldm' / 'datasets').mkdir(parents=True)
+    (src_dir / 'ldm' / 'datasets' / 'a.yaml').write_text('id: a\n')
+    (src_dir / 'pdm.yaml').write_text('tables: []\n')
+    manifest = build_archive(str(src_dir), str(tmp_path / 'dp.tar.gz'))
+
+    with open(tmp_path / 'dp.tar.gz', 'rb') as stream:
+        assert extract_archive(stream, dest_dir, manifest) == (manifest['size'], 2)
+    with open(os.path.join(dest_dir, 'ldm', 'datasets', 'a.yaml')) as file:
+        assert file.read() == 'id: a\n'
+    # the archive is reproducible
+    assert build_archive(str(src_dir), str(tmp_path / 'again.tar.gz'))['sha256'] == manifest['sha256']
+
+
+def test_extract_rejects_a_traversing_member(dest_dir, tmp_path):
+    archive, manifest = make_archive([file_member('../escape.yaml', b'x')])
+    with pytest.raises(DataproductArchiveError):
+        extract_archive(io.BytesIO(archive), dest_dir, manifest)
+    assert not os.path.exists(tmp_path / 'escape.yaml')
+
+
+def test_extract_rejects_a_symlink_member(dest_dir):
+    link = tarfile.TarInfo('ldm')
+    link.type = tarfile.SYMTYPE
+    link.linkname = '/etc'
+    archive, manifest = make_archive([(link, None)])
+    with pytest.raises(DataproductArchiveError, match='Unsupported archive member'):
+        extract_archive(io.BytesIO(archive), dest_dir, manifest)
+
+
+def test_extract_stops_at_the_manifest_size(dest_dir):
+    archive, manifest = make_archive([file_member('a.yaml', b'a' * 10), file_member('b.yaml', b'b' * 10)])
+    with pytest.raises(DataproductArchiveError, match='larger than its manifest'):
+        extract_archive(io.BytesIO(archive), dest_dir, {**manifest, 'size': 15})
+    assert not os.path.exists(os.path.join(dest_dir, 'b.yaml'))
+
+
+def test_extract_checks_the_sha256(dest_dir):
+    archive, manifest = make_archive([file_member('a.yaml', b'a')])
+    with pytest.raises(DataproductArchiveError, match='does not match its manifest'):
+        extract_archive(io.BytesIO(archive), dest_dir, {**manifest, 'sha256': '0' * 64})
+
+
+def test_extract_rejects_a_corrupt_archive(dest_dir):
+    archive, manifest = make_archive([file_member('a.yaml', b'a')])
+    with pytest.raises(DataproductArchiveError, match='Corrupt'):
+        extract_archive(io.BytesIO(archive[:len(archive) // 2]), dest_dir, manifest)
+
+
+def test_extract_rejects_an_unknown_format(dest_dir):
+    archive, manifest = make_archive([file_member('a.yaml', b'a')])
+    with pytest.raises(DataproductArchiveError, match='Unsupported'):
+        extract_archive(io.BytesIO(archive), dest_dir, {**manifest, 'format': 2})
@@ -0,0 +1,102 @@
+import datetime
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from shared_code import dataproduct_cache
+from shared_code.dataproduct_cache import DataproductCache
+
+logger = logging.getLogger(__name__)
+
+
+def blob(name, etag='1', size=10):
+    return SimpleNamespace(
+        name=name, etag=etag, size=size, last_modified=datetime.datetime(2024, 1, 1)
+    )
+
+
+class Populate:
+    '''
+    Writes size bytes for every blob a cache miss asks for
+    '''
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, files):
+        self.calls += 1
+        for _, path in files:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'x' * 10)
+
+
+def age(entry, seconds):
+    manifest_file = os.path.join(entry.path, dataproduct_cache.MANIFEST_FILE_NAME)
+    used_at = time.time() - seconds
+    os.utime(manifest_file, (used_at, used_at))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DataproductCache(str(tmp_path), max_size_bytes=25, logger=logger)
+
+
+def test_hit_does_not_populate(cache):
+    populate = Populate()
+    blobs = [blob('dp/v1/ldm/a.yaml'), blob('dp/v1/pdm.yaml')]
+    entry = cache.get('dp/v1', blobs, populate)
+    assert cache.get('dp/v1', list(reversed(blobs)), populate) == entry
+    assert populate.calls == 1
+    assert sorted(os.listdir(entry.path)) == [dataproduct_cache.MANIFEST_FILE_NAME, 'ldm', 'pdm.yaml']
+
+
+def test_changed_blob_gets_a_new_entry(cache):
+    populate = Populate()
+    entry = cache.get('dp/v1', [blob('dp/v1/pdm.yaml')], populate)
+    changed = cache.get('dp/v1', [blob('dp/v1/pdm.yaml', etag='2')], populate)
+    assert changed.fingerprint != entry.fingerprint
+    assert populate.calls == 2
+
+
+def test_failed_population_leaves_no_entry(cache):
+    def populate(files):
+        raise OSError('download failed')
+    with pytest.raises(OSError):
+        cache.get('dp/v1', [blob('dp/v1/pdm.yaml')], populate)
+    populate_again = Populate()
+    cache.get('dp/v1', [blob('dp/v1/pdm.yaml')], populate_again)
+    assert populate_again.calls == 1
+
+
+def test_evicts_the_least_recently_used(cache):
+    populate = Populate()
+    oldest = cache.get('dp/a', [blob('dp/a/pdm.yaml')], populate)
+    older = cache.get('dp/b', [blob('dp/b/pdm.yaml')], populate)
+    age(oldest, dataproduct_cache.EVICTION_GRACE_SECONDS + 20)
+    age(older, dataproduct_cache.EVICTION_GRACE_SECONDS + 10)
+    newest = cache.get('dp/c', [blob('dp/c/pdm.yaml')], populate)
+    # 30 bytes do not fit into 25, removing the oldest entry is enough
+    assert not os.path.exists(oldest.path)
+    assert os.path.exists(older.path)
+    assert os.path.exists(newest.path)
+
+
+def test_keeps_entries_used_recently(cache):
+    populate = Populate()
+    entries = [cache.get(f'dp/{name}', [blob(f'dp/{name}/pdm.yaml')], populate) for name in 'abcd']
+    # over max_size_bytes, but other processes may still be reading the entries
+    assert all(os.path.exists(entry.path) for entry in entries)
+
+
+def test_removes_abandoned_temporary_directories(cache):
+    populate = Populate()
+    entry = cache.get('dp/a', [blob('dp/a/pdm.yaml')], populate)
+    abandoned = os.path.join(os.path.dirname(entry.path), f'{dataproduct_cache.TMP_PREFIX}crashed')
+    os.makedirs(abandoned)
+    used_at = time.time() - dataproduct_cache.EVICTION_GRACE_SECONDS - 1
+    os.utime(abandoned, (used_at, used_at))
+    cache.evict()
+    assert not os.path.exists(abandoned)
@@ -0,0 +1,98 @@
+import datetime
+import queue
+import struct
+import uuid
+
+import pytest
+
+from shared_code import pg_copy
+from shared_code.exceptions import CopyAbortedError
+
+
+def test_encode_csv():
+    records = [
+        (1, 2.5, True, None, ''),
+        ('say "hi"', {'a': [1]}, b'\x01\xff', datetime.date(2024, 1, 2), 'line\nbreak')
+    ]
+    assert pg_copy.encode_csv(records) == (
+        '1,2.5,true,,""\n'
+        '"say ""hi""","{""a"": [1]}","\\x01ff","2024-01-02","line\nbreak"\n'
+    ).encode('utf-8')
+
+
+def fields(data):
+    '''
+    The fields of one binary COPY tuple, None for NULL
+    '''
+    count, = struct.unpack('!h', data[:2])
+    offset, values = 2, []
+    for _ in range(count):
+        length, = struct.unpack('!i', data[offset:offset + 4])
+        offset += 4
+        if length == -1:
+            values.append(None)
+            continue
+        values.append(data[offset:offset + length])
+        offset += length
+    assert offset == len(data)
+    return values
+
+
+def test_binary_encoder():
+    encode = pg_copy.get_binary_encoder(['int4', 'int8', 'text', 'jsonb', 'bool', 'uuid', 'date'])
+    value = uuid.uuid4()
+    assert fields(encode([(7, -1, 'ä', {'a': 1}, True, str(value), datetime.date(2000, 1, 3))])) == [
+        struct.pack('!i', 7),
+        struct.pack('!q', -1),
+        'ä'.encode('utf-8'),
+        b'\x01{"a": 1}',
+        b'\x01',
+        value.bytes,
+        struct.pack('!i', 2)
+    ]
+    assert fields(encode([(None,) * 7])) == [None] * 7
+
+
+def test_binary_timestamps_count_from_the_postgres_epoch():
+    encode = pg_copy.get_binary_encoder(['timestamp', 'timestamptz'])
+    utc_plus_one = datetime.timezone(datetime.timedelta(hours=1))
+    record = (
+        datetime.datetime(2000, 1, 1, 0, 0, 1, 5),
+        datetime.datetime(2000, 1, 1, 1, 0, 0, tzinfo=utc_plus_one)
+    )
+    assert fields(encode([record])) == [struct.pack('!q', 1000005), struct.pack('!q', 0)]
+
+
+def test_binary_encoder_rejects_unknown_types():
+    with pytest.raises(ValueError, match='numeric'):
+        pg_copy.get_binary_encoder(['int4', 'numeric'])
+
+
+def test_batches():
+    assert list(pg_copy.batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(pg_copy.batches([], 2)) == []
+
+
+def test_copy_stream_reads_in_any_size():
+    stream = pg_copy.CopyStream(iter([b'abc', b'', b'defg']), header=b'<', trailer=b'>')
+    assert stream.read(2) == b'<a'
+    assert stream.read(4) == b'bcde'
+    assert stream.read() == b'fg>'
+    assert stream.read(10) == b''
+
+
+def test_drain_stops_at_the_sentinel():
+    chunks = queue.Queue()
+    for chunk in (b'a', b'b', None, b'c'):
+        chunks.put(chunk)
+    assert pg_copy.CopyStream(pg_copy.drain(chunks)).read() == b'ab'
+
+
+def test_drain_raises_an_abort():
+    chunks = queue.Queue()
+    chunks.put(b'a')
+    chunks.put(CopyAbortedError('aborted'))
+    stream = pg_copy.CopyStream(pg_copy.drain(chunks))
+    assert stream.read(1) == b'a'
+    with pytest.raises(CopyAbortedError):
+        stream.read(1)
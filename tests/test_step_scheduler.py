@@ -0,0 +1,94 @@
+import logging
+import threading
+
+import pytest
+
+from shared_code.exceptions import InvalidStepGraphError
+from shared_code.step_scheduler import Step, StepScheduler, resolve_dependencies
+
+logger = logging.getLogger(__name__)
+
+
+def noop():
+    pass
+
+
+def test_resolve_dependencies_maps_steps_to_their_providers():
+    steps = [
+        Step('datasource', noop, provides=['datasource']),
+        Step('parent', noop, provides=['parent']),
+        Step('child', noop, requires=['datasource', 'parent'], provides=['child']),
+        Step('users', noop)
+    ]
+    assert resolve_dependencies(steps) == {
+        'datasource': set(), 'parent': set(), 'child': {'datasource', 'parent'}, 'users': set()
+    }
+
+
+def test_resource_provided_twice():
+    steps = [Step('a', noop, provides=['ws']), Step('b', noop, provides=['ws'])]
+    with pytest.raises(InvalidStepGraphError, match='provided by a and b'):
+        resolve_dependencies(steps)
+
+
+def test_missing_requirement():
+    with pytest.raises(InvalidStepGraphError, match='no step provides'):
+        resolve_dependencies([Step('a', noop, requires=['ws'])])
+
+
+def test_cycle():
+    steps = [
+        Step('root', noop, provides=['root']),
+        Step('a', noop, requires=['root', 'b'], provides=['a']),
+        Step('b', noop, requires=['a'], provides=['b'])
+    ]
+    with pytest.raises(InvalidStepGraphError, match=r"Cycle detected between steps \['a', 'b'\]"):
+        resolve_dependencies(steps)
+
+
+def test_self_cycle():
+    with pytest.raises(InvalidStepGraphError, match='Cycle'):
+        resolve_dependencies([Step('a', noop, requires=['a'], provides=['a'])])
+
+
+def test_step_names_must_be_unique():
+    with pytest.raises(InvalidStepGraphError, match='unique'):
+        StepScheduler([Step('a', noop), Step('a', noop)], max_workers=2, logger=logger)
+
+
+def test_steps_start_after_their_dependencies():
+    finished = []
+    lock = threading.Lock()
+
+    def step(name):
+        def run():
+            with lock:
+                finished.append(name)
+        return Step(name, run, requires=requires[name], provides=[name])
+    requires = {'a': [], 'b': [], 'c': ['a', 'b'], 'd': ['c'], 'e': ['a']}
+
+    StepScheduler([step(name) for name in requires], max_workers=4, logger=logger).run()
+    assert sorted(finished) == sorted(requires)
+    for name, dependencies in requires.items():
+        assert all(finished.index(dependency) < finished.index(name) for dependency in dependencies)
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    steps = [Step('a', barrier.wait), Step('b', barrier.wait)]
+    StepScheduler(steps, max_workers=2, logger=logger).run()
+
+
+def test_failure_stops_the_dependent_steps_and_is_raised():
+    ran = []
+
+    def fail():
+        raise RuntimeError('datasource failed')
+    steps = [
+        Step('datasource', fail, provides=['datasource']),
+        Step('model', lambda: ran.append('model'), requires=['datasource']),
+        Step('users', lambda: ran.append('users'))
+    ]
+    with pytest.raises(RuntimeError, match='datasource failed'):
+        StepScheduler(steps, max_workers=1, logger=logger).run()
+    assert 'model' not in ran
@@ -0,0 +1,187 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from shared_code import throttling
+from shared_code.throttling import HostThrottle, classify_error, get_retry_after
+
+
+def options(**overrides):
+    return SimpleNamespace(**{
+        **vars(throttling.DEFAULT_OPTIONS),
+        'rate': None,
+        'backoff_base_seconds': 0.0,
+        **overrides
+    })
+
+
+class ApiError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f'status {status}')
+        self.status = status
+        self.headers = headers
+
+
+def failing(*errors, result='ok'):
+    '''
+    A call raising the errors one by one, then returning result
+    '''
+    calls = []
+
+    def call():
+        calls.append(len(calls))
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return call, calls
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    throttle = HostThrottle('host', options(rate=1.0, burst=2))
+    assert throttle._try_acquire() == 0
+    assert throttle._try_acquire() == 0
+    # the bucket is empty, the next token comes in about a second
+    assert throttle._try_acquire() == pytest.approx(1.0, abs=0.1)
+    assert throttle._in_flight == 2
+
+
+def test_token_bucket_refills_at_rate():
+    throttle = HostThrottle('host', options(rate=1.0, burst=2))
+    throttle._tokens = 0.0
+    throttle._refilled_at -= 1.5
+    assert throttle._try_acquire() == 0
+    # half a token is left
+    assert throttle._try_acquire() == pytest.approx(0.5, abs=0.1)
+
+
+def test_concurrency_limit_blocks_without_waiting_for_tokens():
+    throttle = HostThrottle('host', options(max_concurrency=2, min_concurrency=1))
+    assert throttle._try_acquire() == 0
+    assert throttle._try_acquire() == 0
+    assert throttle._try_acquire() is None
+    throttle.release()
+    assert throttle._try_acquire() == 0
+
+
+def test_throttled_response_halves_the_limit_once_per_interval():
+    throttle = HostThrottle('host', options(max_concurrency=32, min_concurrency=2))
+    throttle.acquire()
+    throttle.release(throttled=True)
+    assert throttle.limit == 16
+    # the other responses of the same burst are the same congestion signal
+    throttle.acquire()
+    throttle.release(throttled=True)
+    assert throttle.limit == 16
+    throttle._decreased_at -= throttling.DECREASE_INTERVAL_SECONDS
+    throttle.acquire()
+    throttle.release(throttled=True)
+    assert throttle.limit == 8
+
+
+def test_limit_stays_within_min_and_max_concurrency():
+    throttle = HostThrottle('host', options(max_concurrency=4, min_concurrency=2))
+    for _ in range(5):
+        throttle._decreased_at = 0.0
+        throttle.acquire()
+        throttle.release(throttled=True)
+    assert throttle.limit == 2
+    for _ in range(100):
+        throttle.acquire()
+        throttle.release()
+    assert throttle.limit == 4
+
+
+def test_success_adds_one_over_the_limit():
+    throttle = HostThrottle('host', options(max_concurrency=32, min_concurrency=2))
+    throttle._limit = 4.0
+    for _ in range(4):
+        throttle.acquire()
+        throttle.release()
+    # 4 + 1/4 + 1/4.25 + ... is just below 5
+    assert throttle._limit == pytest.approx(4.92, abs=0.01)
+    throttle.acquire()
+    throttle.release()
+    assert throttle.limit == 5
+
+
+def test_retry_after_pauses_the_host():
+    throttle = HostThrottle('host', options())
+    throttle.acquire()
+    throttle.release(throttled=True, retry_after=5.0)
+    assert throttle._try_acquire() == pytest.approx(5.0, abs=0.1)
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Retry-After': '3'}, 3.0),
+    ({'retry-after-ms': '1500'}, 1.5),
+    ({'x-ms-retry-after-ms': '250'}, 0.25),
+    ({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, 0.0),
+    ({'Retry-After': 'soon'}, None),
+    ({}, None),
+    (None, None),
+])
+def test_get_retry_after(headers, expected):
+    assert get_retry_after(headers) == expected
+
+
+def test_classify_error():
+    assert classify_error(ApiError(429, {'Retry-After': '2'})) == (True, True, 2.0)
+    assert classify_error(ApiError(503)) == (True, True, None)
+    assert classify_error(ApiError(500)) == (True, False, None)
+    assert classify_error(ApiError(404)) == (False, False, None)
+    assert classify_error(ConnectionResetError()) == (True, False, None)
+    assert classify_error(ValueError()) == (False, False, None)
+
+
+def test_call_retries_transient_errors():
+    throttle = HostThrottle('host', options())
+    call, calls = failing(ApiError(500), ApiError(503))
+    assert throttle.call(call) == 'ok'
+    assert len(calls) == 3
+    assert throttle._in_flight == 0
+
+
+def test_call_gives_up_after_max_attempts():
+    throttle = HostThrottle('host', options(max_attempts=3))
+    call, calls = failing(*[ApiError(500)] * 3)
+    with pytest.raises(ApiError):
+        throttle.call(call)
+    assert len(calls) == 3
+    assert throttle._in_flight == 0
+
+
+def test_call_does_not_retry_other_errors():
+    throttle = HostThrottle('host', options())
+    call, calls = failing(ApiError(409))
+    with pytest.raises(ApiError):
+        throttle.call(call)
+    assert len(calls) == 1
+
+
+def test_non_idempotent_call_is_retried_only_when_rejected():
+    throttle = HostThrottle('host', options())
+    call, calls = failing(ApiError(500))
+    with pytest.raises(ApiError):
+        throttle.call(call, idempotent=False)
+    assert len(calls) == 1
+
+    call, calls = failing(ApiError(429, {'Retry-After': '0'}))
+    assert throttle.call(call, idempotent=False) == 'ok'
+    assert len(calls) == 2
+
+
+def test_nested_calls_pass_through():
+    throttle = HostThrottle('host', options(max_concurrency=1, min_concurrency=1))
+    assert throttle.call(lambda: throttle.call(lambda: throttle._in_flight)) == 1
+
+
+def test_call_async_retries():
+    throttle = HostThrottle('host', options())
+    call, calls = failing(ApiError(502))
+
+    async def attempt():
+        return call()
+    assert asyncio.run(throttle.call_async(attempt)) == 'ok'
+    assert len(calls) == 2
+    assert throttle._in_flight == 0
@@ -0,0 +1,10 @@
+import logging
+
+import azure.functions as func
+
+from shared_code.warmup import warm_up
+
+
+def main(warmupContext: func.Context) -> None:
+    logging.info('Warming up the instance.')
+    warm_up()